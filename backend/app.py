@@ -4,7 +4,10 @@ import logging
 from flask import Flask, jsonify, send_from_directory
 from flask_cors import CORS
 from models import db
-from config import DATABASE_URI, SECRET_KEY, UPLOAD_DIR, JOB_DIR, MATLAB_DIR
+from config import (
+    DATABASE_URI, SECRET_KEY, UPLOAD_DIR, JOB_DIR, MATLAB_DIR,
+    KNN_WORKER_POOL_SIZE, KNN_PLACEMENT,
+)
 
 # 配置日志
 logging.basicConfig(
@@ -49,6 +52,15 @@ def create_app():
         # 初始化默认管理员
         _ensure_admin()
 
+    # 登记常驻 KNN-DTW 工作进程池配置：本进程第一个检测任务时才启动
+    # （各进程预热 Numba 内核，任务间复用）；不运行任务的 WSGI 工作进程不创建进程池
+    if KNN_WORKER_POOL_SIZE > 0:
+        from runners.algorithm.worker_pool import configure_worker_pool
+        configure_worker_pool(KNN_WORKER_POOL_SIZE, KNN_PLACEMENT)
+
+    # KNN-DTW 执行后端标定不在 Web 进程中运行：由首个检测任务结束后（进程空闲时）
+    # 在独立的低优先级子进程中执行，见 runners/algorithm/autotune.py
+
     # ============= 静态文件服务 =============
 
     # React 构建输出目录
@@ -0,0 +1 @@
+# Performance benchmarks (run as scripts: python -m benchmarks.<name>)
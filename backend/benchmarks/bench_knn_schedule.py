@@ -0,0 +1,84 @@
+"""
+KNN-DTW chunk scheduling benchmark: fixed vs cost-balanced chunks.
+
+Builds a workload with spatially clustered cost variation (runs of all-NaN
+pixels, runs of heavily gapped short series, runs of full series) and
+reports makespan and tail latency (time between the first worker running
+out of work and the last one finishing) for each scheduling strategy.
+
+Usage:
+    cd backend
+    python -m benchmarks.bench_knn_schedule --pixels 40000 --bands 30 --workers 8
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runners.algorithm.sample_generator import creat_sample
+from runners.algorithm.scene_generator import synthesize_pixels
+from runners.algorithm.knn_dtw import _classify_chunked, _warmup_numba
+from runners.algorithm.worker_pool import start_worker_pool, shutdown_worker_pool
+
+
+def make_workload(n_pixels, n_bands, seed=0, run_length=2000):
+    """Pixels in runs of similar cost, like clouds/water/bare areas in a scene."""
+    rng = np.random.default_rng(seed)
+    samples = creat_sample([0.15, 0.75], n_bands, 0.8, 0.6)
+    labels = rng.integers(1, 50, size=n_pixels)
+    data = synthesize_pixels(rng, labels, samples[:, :-1], noise=0.02).astype(np.float64)
+
+    for start in range(0, n_pixels, run_length):
+        end = min(start + run_length, n_pixels)
+        kind = rng.choice(["empty", "gapped", "full"], p=[0.3, 0.3, 0.4])
+        if kind == "empty":
+            data[start:end] = np.nan
+        elif kind == "gapped":
+            gaps = rng.random((end - start, n_bands)) < 0.7
+            data[start:end][gaps] = np.nan
+    return samples[:, :-1], samples[:, -1], data
+
+
+def run(n_pixels, n_bands, n_workers, chunk_size, backend, repeats):
+    train, labels, data = make_workload(n_pixels, n_bands)
+    print(f"Workload: {n_pixels} pixels x {n_bands} bands, {n_workers} workers, "
+          f"backend={backend}, max chunk={chunk_size}")
+    print(f"{'schedule':<10} {'wall_s':>8} {'makespan':>9} {'tail_s':>8} {'tail%':>6} "
+          f"{'chunks':>7} {'chunk_max':>10}")
+
+    for schedule in ("fixed", "balanced"):
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            *_, summary = _classify_chunked(train, labels, data, n_bands, backend,
+                                            n_workers, chunk_size, schedule=schedule)
+            wall = time.perf_counter() - t0
+            print(f"{schedule:<10} {wall:8.3f} {summary['makespan_s']:9.3f} "
+                  f"{summary['tail_s']:8.3f} {100 * summary['tail_fraction']:5.1f}% "
+                  f"{summary['n_chunks']:7d} {summary['chunk_s_max']:10.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pixels", type=int, default=40000)
+    parser.add_argument("--bands", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--backend", choices=["processes", "threads"], default="processes")
+    parser.add_argument("--repeats", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    _warmup_numba()
+    if args.backend == "processes":
+        start_worker_pool(args.workers)
+    try:
+        run(args.pixels, args.bands, args.workers, args.chunk_size, args.backend, args.repeats)
+    finally:
+        shutdown_worker_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Tile encoding benchmark: bytes and milliseconds per tile for each encoder option.
+
+Builds synthetic 256x256 tiles for every result layer (patchy disturbance
+regions over an empty background, like real job output), colours them with
+the layer lookup tables and encodes each tile with:
+
+    png-optimize     RGBA PNG, optimize=True (previous behaviour)
+    png-rgba-<L>     RGBA PNG, zlib level L
+    png-palette-<L>  indexed PNG + tRNS, zlib level L
+    webp-<M>         lossless WebP, method M (if Pillow has libwebp)
+
+Usage:
+    cd backend
+    python -m benchmarks.bench_tile_encoding --tiles 50 --levels 1 6 9
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.tile_service import LAYER_COLORMAPS, colormap_lut, to_lut_index
+from services.tile_encoder import (
+    WEBP_AVAILABLE, encode_png_rgba, encode_png_palette, encode_webp,
+)
+
+LAYER_VALUES = {
+    "disturbance_mask": (1, 1),
+    "disturbance_year": (1986, 2022),
+    "recovery_year": (1990, 2024),
+    "potential_disturbance": (1, 400),
+    "res_disturbance_type": (1, 49),
+}
+
+
+def make_tiles(layer_name, n_tiles, seed=0):
+    """Index tiles with blobby regions covering roughly a third of the tile."""
+    rng = np.random.default_rng(seed)
+    lo, hi = LAYER_VALUES[layer_name]
+    vmax = float(hi) if LAYER_COLORMAPS[layer_name]["type"] == "continuous" else None
+    lut, scale = colormap_lut(layer_name, vmax)
+    tiles = []
+    for _ in range(n_tiles):
+        coarse = rng.integers(lo, hi + 1, size=(16, 16)).astype(np.float64)
+        coarse[rng.random((16, 16)) < 0.65] = 0
+        data = np.kron(coarse, np.ones((16, 16)))
+        tiles.append(to_lut_index(data, layer_name, None, scale))
+    return lut, tiles
+
+
+def _png_optimize(rgba):
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def encoders(levels, methods):
+    options = [("png-optimize", lambda index, lut: _png_optimize(lut[index]))]
+    for level in levels:
+        options.append((f"png-rgba-{level}", lambda index, lut, l=level: encode_png_rgba(lut[index], l)))
+        options.append((f"png-palette-{level}", lambda index, lut, l=level: encode_png_palette(index, lut, l)))
+    if WEBP_AVAILABLE:
+        for method in methods:
+            options.append((f"webp-{method}", lambda index, lut, m=method: encode_webp(lut[index], m)))
+    return options
+
+
+def run(n_tiles, levels, methods):
+    print(f"{n_tiles} tiles per layer")
+    print(f"{'layer':<22} {'encoder':<16} {'bytes/tile':>11} {'ms/tile':>8}")
+    for layer_name in LAYER_VALUES:
+        lut, tiles = make_tiles(layer_name, n_tiles)
+        for name, encode in encoders(levels, methods):
+            t0 = time.perf_counter()
+            sizes = []
+            for index in tiles:
+                data = encode(index, lut)
+                sizes.append(len(data) if data is not None else 0)
+            ms = 1000 * (time.perf_counter() - t0) / n_tiles
+            label = f"{np.mean(sizes):11.0f}" if all(sizes) else f"{'n/a':>11}"
+            print(f"{layer_name:<22} {name:<16} {label} {ms:8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tiles", type=int, default=50)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9])
+    parser.add_argument("--methods", type=int, nargs="+", default=[0, 4, 6])
+    args = parser.parse_args(argv)
+    run(args.tiles, args.levels, args.methods)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,74 @@ MATLAB_DIR = os.path.join(BASE_DIR, "matlab")
 # Detection engine: 'python' (default, no MATLAB needed) or 'matlab'
 DETECTION_ENGINE = os.environ.get('DETECTION_ENGINE', 'python')
 
+# ============= 计算资源配置 =============
+# KNN-DTW 常驻工作进程池大小（应用启动时创建并在任务间复用；0 = 每个任务临时创建 joblib 进程池）
+KNN_WORKER_POOL_SIZE = int(os.environ.get('KNN_WORKER_POOL_SIZE', os.cpu_count() or 1))
+# KNN-DTW 执行后端调优结果（每台主机/配置变化时重新标定）
+KNN_TUNING_PROFILE = os.environ.get('KNN_TUNING_PROFILE', os.path.join(DATA_DIR, 'knn_tuning.json'))
+KNN_AUTOTUNE = os.environ.get('KNN_AUTOTUNE', '1') == '1'
+# 工作进程 CPU 绑定策略：none（不绑定）/ cores（每进程绑定一个核心）/ numa（每个 NUMA 节点一个进程池）
+KNN_PLACEMENT = os.environ.get('KNN_PLACEMENT', 'none')
+
+# ============= 瓦片缓存配置 =============
+# 每个进程的内存瓦片缓存上限（字节）
+TILE_CACHE_MAX_BYTES = int(os.environ.get('TILE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# 是否启用任务目录下的共享磁盘瓦片缓存（各工作进程共用）
+TILE_DISK_CACHE = os.environ.get('TILE_DISK_CACHE', '1') == '1'
+# 每个线程保持打开的 GeoTIFF 句柄数上限（LRU 关闭）
+RASTER_POOL_SIZE = int(os.environ.get('RASTER_POOL_SIZE', 32))
+# 每个进程同时渲染的瓦片数上限；并发请求同一瓦片时只渲染一次，其余等待结果
+TILE_RENDER_CONCURRENCY = int(os.environ.get('TILE_RENDER_CONCURRENCY', os.cpu_count() or 4))
+# 等待渲染槽位或同一瓦片渲染结果的超时（秒），超时返回 503
+TILE_RENDER_TIMEOUT = float(os.environ.get('TILE_RENDER_TIMEOUT', 10))
+# 元瓦片边长：缓存未命中时一次渲染所在的 N×N 块并全部缓存（1 = 逐瓦片渲染）
+TILE_METATILE_SIZE = int(os.environ.get('TILE_METATILE_SIZE', 8))
+# 带版本参数（?v=）的瓦片/GeoJSON 浏览器缓存时长（秒，Cache-Control immutable；0 = 每次按 ETag 重新验证）
+TILE_HTTP_MAX_AGE = int(os.environ.get('TILE_HTTP_MAX_AGE', 365 * 24 * 3600))
+
+# ============= 瓦片金字塔配置 =============
+# 任务完成后生成对齐瓦片网格的 EPSG:3857 结果栅格（瓦片渲染无需重投影）
+MERCATOR_RASTERS_ENABLED = os.environ.get('MERCATOR_RASTERS_ENABLED', '1') == '1'
+# 任务完成后在后台预渲染 0..TILE_PYRAMID_MAX_ZOOM 级瓦片
+TILE_PYRAMID_ENABLED = os.environ.get('TILE_PYRAMID_ENABLED', '1') == '1'
+TILE_PYRAMID_MAX_ZOOM = int(os.environ.get('TILE_PYRAMID_MAX_ZOOM', 14))
+# 预渲染进程数与优先级（nice 值，越大优先级越低）
+TILE_PYRAMID_WORKERS = int(os.environ.get('TILE_PYRAMID_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+TILE_PYRAMID_NICE = int(os.environ.get('TILE_PYRAMID_NICE', 10))
+# 任务完成后建立瓦片覆盖索引，空瓦片不打开栅格直接返回
+TILE_COVERAGE_ENABLED = os.environ.get('TILE_COVERAGE_ENABLED', '1') == '1'
+# 空瓦片返回 204 No Content（否则返回共享的透明瓦片）
+TILE_EMPTY_204 = os.environ.get('TILE_EMPTY_204', '0') == '1'
+# 任务完成后为矢量图层建立多边形索引（矢量瓦片 /api/vtiles）
+VECTOR_TILES_ENABLED = os.environ.get('VECTOR_TILES_ENABLED', '1') == '1'
+# 结果栅格多边形化：分块边长（像元）、进程数（0 = 在当前线程执行）与简化级别数
+POLYGONIZE_TILE_SIZE = int(os.environ.get('POLYGONIZE_TILE_SIZE', 512))
+POLYGONIZE_WORKERS = int(os.environ.get('POLYGONIZE_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+POLYGON_SIMPLIFY_LEVELS = int(os.environ.get('POLYGON_SIMPLIFY_LEVELS', 4))
+# 任务完成后生成 NDJSON / 预压缩 GeoJSON / FlatGeobuf 结果文件
+GEOJSON_ARTIFACTS_ENABLED = os.environ.get('GEOJSON_ARTIFACTS_ENABLED', '1') == '1'
+# 预压缩 GeoJSON 的 brotli 压缩级别（0-11，需安装 brotli）
+GEOJSON_BROTLI_QUALITY = int(os.environ.get('GEOJSON_BROTLI_QUALITY', 9))
+
+# ============= 瓦片编码配置 =============
+# PNG zlib 压缩级别（0-9，越大越小越慢）
+TILE_PNG_COMPRESS_LEVEL = int(os.environ.get('TILE_PNG_COMPRESS_LEVEL', 6))
+# 颜色不超过 256 种的瓦片编码为调色板 PNG（带 tRNS 透明度）
+TILE_PALETTE_PNG = os.environ.get('TILE_PALETTE_PNG', '1') == '1'
+# 动态渲染的瓦片在浏览器 Accept 含 image/webp 时返回无损 WebP（默认关闭，
+# 预渲染金字塔层级始终返回 PNG）；method 0-6（越大越小越慢）
+TILE_WEBP_ENABLED = os.environ.get('TILE_WEBP_ENABLED', '0') == '1'
+TILE_WEBP_METHOD = int(os.environ.get('TILE_WEBP_METHOD', 4))
+
+# ============= 时间序列查询配置 =============
+# 批量时间序列接口单次请求的最大点数
+TIMESERIES_BATCH_MAX_POINTS = int(os.environ.get('TIMESERIES_BATCH_MAX_POINTS', 5000))
+# 上传 NDVI 后在后台生成像元优先的时间序列存储（每个像元的序列连续存放）与其块边长（像元）
+TIMESERIES_STORE_ENABLED = os.environ.get('TIMESERIES_STORE_ENABLED', '1') == '1'
+TIMESERIES_STORE_BLOCK = int(os.environ.get('TIMESERIES_STORE_BLOCK', 64))
+# 多边形统计保留全部像元值（精确百分位数）的内存上限（字节），超过后改用直方图近似
+POLYGON_STATS_MAX_BYTES = int(os.environ.get('POLYGON_STATS_MAX_BYTES', 256 * 1024 * 1024))
+
 # ============= 数据库配置 =============
 DATABASE_URI = os.environ.get('DATABASE_URI', f"sqlite:///{os.path.join(DATA_DIR, 'mining.db')}")
 
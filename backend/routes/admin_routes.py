@@ -6,6 +6,7 @@ from flask import Blueprint, request, jsonify
 from models import db, User, Job
 from decorators import admin_required
 from config import UPLOAD_DIR, JOB_DIR, DATA_DIR
+from services.tile_service import tile_cache, invalidate_job_tiles
 
 logger = logging.getLogger(__name__)
 admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
@@ -55,6 +56,7 @@ def stats():
                 "results": format_size(job_size),
                 "total": format_size(upload_size + job_size),
             },
+            "tile_cache": tile_cache.stats(),
         })
     except Exception as e:
         logger.error(f"统计异常: {str(e)}")
@@ -132,6 +134,8 @@ def delete_user(user_id):
         for job in user.jobs:
             upload_dir = os.path.join(UPLOAD_DIR, job.job_id)
             job_dir = os.path.join(JOB_DIR, job.job_id)
+            # 先释放缓存连接与栅格句柄，再删除目录（Windows 上打开的文件无法删除）
+            invalidate_job_tiles(job.job_id)
             if os.path.exists(upload_dir):
                 shutil.rmtree(upload_dir, ignore_errors=True)
             if os.path.exists(job_dir):
@@ -186,6 +190,8 @@ def admin_delete_job(job_id):
 
         upload_dir = os.path.join(UPLOAD_DIR, job_id)
         job_dir = os.path.join(JOB_DIR, job_id)
+        # 先释放缓存连接与栅格句柄，再删除目录（Windows 上打开的文件无法删除）
+        invalidate_job_tiles(job_id)
         if os.path.exists(upload_dir):
             shutil.rmtree(upload_dir, ignore_errors=True)
         if os.path.exists(job_dir):
@@ -6,15 +6,21 @@ import json
 import logging
 import zipfile
 from datetime import datetime, timezone
+import numpy as np
 from flask import Blueprint, request, jsonify, send_from_directory, send_file, g
+from werkzeug.security import safe_join
 from models import db, Job, JobFile
 from decorators import jwt_required
-from config import UPLOAD_DIR, JOB_DIR
+from config import UPLOAD_DIR, JOB_DIR, TIMESERIES_BATCH_MAX_POINTS
 from runners import get_runner
 from services.geo_service import (
     get_crs_info, get_geotiff_bounds, sample_timeseries,
-    sample_singleband, format_file_size,
+    sample_singleband, sample_points, format_file_size,
 )
+from services.tile_service import invalidate_job_tiles, tile_version, LAYER_FILES
+from services.job_postprocess import schedule_job_postprocess, schedule_upload_postprocess
+from services.zonal_stats import polygon_timeseries, zonal_disturbance, DEFAULT_PERCENTILES
+from services.http_cache import make_etag
 
 logger = logging.getLogger(__name__)
 job_bp = Blueprint("job", __name__)
@@ -30,6 +36,44 @@ OUTPUT_FILES = [
     ("year_recovery_raw.tif", "原始恢复年份"),
 ]
 
+# 任务后处理在后台生成的输出（需安装 fiona）：(文件名, 说明, 源栅格)。
+# 任务完成时尚未生成，不记录为 JobFile；列出文件时只列出比源栅格新的
+# （重新运行后、后处理完成前，上一次运行的旧文件不列出）
+DERIVED_OUTPUT_FILES = [
+    ("mining_disturbance_mask.fgb", "扰动掩膜边界 (FlatGeobuf)", "mining_disturbance_mask.tif"),
+    ("mining_disturbance_year.fgb", "扰动年份边界 (FlatGeobuf)", "mining_disturbance_year.tif"),
+    ("mining_recovery_year.fgb", "恢复年份边界 (FlatGeobuf)", "mining_recovery_year.tif"),
+]
+
+
+def _layer_versions(job_id):
+    """结果图层版本：瓦片/GeoJSON URL 带 ?v=<版本> 时可长期缓存。
+
+    版本为纳秒级 mtime，超出 JavaScript 安全整数范围，以字符串返回。
+    """
+    versions = {}
+    for layer_name, filename in LAYER_FILES.items():
+        tif_path = os.path.join(JOB_DIR, job_id, filename)
+        if os.path.exists(tif_path):
+            versions[layer_name] = str(tile_version(tif_path))
+    return versions
+
+
+def _available_outputs(job_dir):
+    """[(文件名, 说明, 路径)]：已存在的输出文件，派生文件须比其源栅格新"""
+    outputs = []
+    for filename, label in OUTPUT_FILES:
+        path = os.path.join(job_dir, filename)
+        if os.path.exists(path):
+            outputs.append((filename, label, path))
+    for filename, label, source in DERIVED_OUTPUT_FILES:
+        path = os.path.join(job_dir, filename)
+        source_path = os.path.join(job_dir, source)
+        if os.path.exists(path) and os.path.exists(source_path) \
+                and os.stat(path).st_mtime_ns >= os.stat(source_path).st_mtime_ns:
+            outputs.append((filename, label, path))
+    return outputs
+
 
 @job_bp.post("/api/upload")
 @jwt_required
@@ -64,6 +108,8 @@ def upload():
             job.coal_filename = original_name
 
         db.session.commit()
+        if kind == "ndvi":
+            schedule_upload_postprocess(job_id)
 
         logger.info(f"上传成功: job_id={job_id}, kind={kind}")
         return jsonify({"job_id": job_id, "kind": kind, "path": path})
@@ -108,6 +154,9 @@ def run_job():
         job.startyear = startyear
         db.session.commit()
 
+        # 重新运行会覆盖结果文件，先清理旧瓦片
+        invalidate_job_tiles(job_id)
+
         try:
             runner = get_runner(engine)
             engine_name = type(runner).__name__
@@ -142,6 +191,9 @@ def run_job():
 
             db.session.commit()
 
+            # 后台预生成瓦片等派生数据
+            schedule_job_postprocess(job_id)
+
         except Exception as run_err:
             job.status = "failed"
             job.error_message = str(run_err)
@@ -155,6 +207,7 @@ def run_job():
             "job_id": job_id,
             "bounds": bounds,
             "crs_info": crs_info,
+            "layer_versions": _layer_versions(job_id),
             "outputs": {
                 "mining_disturbance_mask": url_for("mining_disturbance_mask.tif"),
                 "mining_disturbance_year": url_for("mining_disturbance_year.tif"),
@@ -216,6 +269,149 @@ def ndvi_timeseries():
         return jsonify({"error": f"查询失败: {str(e)}"}), 500
 
 
+def _sampled_years(path, lons, lats):
+    """单波段年份栅格的批量采样（nodata/0/范围外为 None）"""
+    if not os.path.exists(path):
+        return [None] * len(lons)
+    values, _ = sample_points(path, lons, lats, indexes=[1])
+    return [None if not np.isfinite(v) or v == 0 else int(v) for v in values[:, 0]]
+
+
+@job_bp.post("/api/ndvi-timeseries/batch")
+@jwt_required
+def ndvi_timeseries_batch():
+    """批量查询多个点的 NDVI 时间序列"""
+    try:
+        data = request.get_json(force=True)
+        job_id = data.get("job_id")
+        points = data.get("points") or []
+        startyear = int(data.get("startyear", 2010))
+
+        if not job_id:
+            return jsonify({"error": "缺少 job_id"}), 400
+        if not points:
+            return jsonify({"error": "缺少 points"}), 400
+        if len(points) > TIMESERIES_BATCH_MAX_POINTS:
+            return jsonify({"error": f"点数超过上限 {TIMESERIES_BATCH_MAX_POINTS}"}), 400
+        try:
+            coords = np.array([(p["lon"], p["lat"]) if isinstance(p, dict) else p for p in points],
+                              dtype=np.float64).reshape(len(points), 2)
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "points 应为 [[lon, lat], ...] 或 [{lon, lat}, ...]"}), 400
+        lons, lats = coords[:, 0], coords[:, 1]
+
+        ndvi_path = os.path.join(UPLOAD_DIR, job_id, "ndvi.tif")
+        if not os.path.exists(ndvi_path):
+            return jsonify({"error": "NDVI文件不存在"}), 404
+
+        values, inside = sample_points(ndvi_path, lons, lats)
+        years = list(range(startyear, startyear + values.shape[1]))
+        disturbance_years = _sampled_years(
+            os.path.join(JOB_DIR, job_id, "mining_disturbance_year.tif"), lons, lats)
+        recovery_years = _sampled_years(
+            os.path.join(JOB_DIR, job_id, "mining_recovery_year.tif"), lons, lats)
+
+        values[~np.isfinite(values)] = np.nan
+        results = []
+        for i, (lon, lat) in enumerate(coords.tolist()):
+            ndvi = None
+            if inside[i]:
+                ndvi = [None if v != v else v for v in values[i].tolist()]
+            results.append({
+                "lon": lon,
+                "lat": lat,
+                "ndvi": ndvi,
+                "disturbance_year": disturbance_years[i],
+                "recovery_year": recovery_years[i],
+            })
+
+        logger.info(f"批量查询成功: job_id={job_id}, {len(points)}个点")
+        return jsonify({"job_id": job_id, "years": years, "points": results})
+    except Exception as e:
+        logger.error(f"批量查询异常: {str(e)}")
+        return jsonify({"error": f"查询失败: {str(e)}"}), 500
+
+
+def _series(values):
+    """每波段统计 → JSON 列表（NaN 为 None）"""
+    return [None if v != v else v for v in np.asarray(values, dtype=np.float64).tolist()]
+
+
+@job_bp.post("/api/ndvi-timeseries/polygon")
+@jwt_required
+def ndvi_timeseries_polygon():
+    """查询多边形内的 NDVI 时间序列统计"""
+    try:
+        data = request.get_json(force=True)
+        job_id = data.get("job_id")
+        geometry = data.get("geometry")
+        startyear = int(data.get("startyear", 2010))
+        percentiles = data.get("percentiles", DEFAULT_PERCENTILES)
+
+        if not job_id:
+            return jsonify({"error": "缺少 job_id"}), 400
+        if not isinstance(geometry, dict):
+            return jsonify({"error": "缺少 geometry"}), 400
+
+        ndvi_path = os.path.join(UPLOAD_DIR, job_id, "ndvi.tif")
+        if not os.path.exists(ndvi_path):
+            return jsonify({"error": "NDVI文件不存在"}), 404
+
+        try:
+            stats = polygon_timeseries(ndvi_path, geometry, percentiles)
+        except (ValueError, TypeError, KeyError, IndexError) as e:
+            return jsonify({"error": f"geometry 或 percentiles 无效: {str(e)}"}), 400
+
+        band_count = len(stats["count"])
+        logger.info(f"多边形查询成功: job_id={job_id}, {stats['pixel_count']}个像元")
+        return jsonify({
+            "job_id": job_id,
+            "years": list(range(startyear, startyear + band_count)),
+            "pixel_count": stats["pixel_count"],
+            "count": stats["count"].tolist(),
+            "mean": _series(stats["mean"]),
+            "median": _series(stats["median"]),
+            "percentiles": {f"{p:g}": _series(v) for p, v in stats["percentiles"].items()},
+            "approximate": stats["approximate"],
+        })
+    except Exception as e:
+        logger.error(f"多边形查询异常: {str(e)}")
+        return jsonify({"error": f"查询失败: {str(e)}"}), 500
+
+
+@job_bp.post("/api/zonal-disturbance")
+@jwt_required
+def zonal_disturbance_stats():
+    """按区域统计逐年扰动/恢复面积"""
+    try:
+        zone_file = request.files.get("zone_raster")
+        if zone_file is not None:
+            job_id = request.form.get("job_id")
+            zones, zone_raster = None, zone_file.read()
+        else:
+            data = request.get_json(force=True)
+            job_id = data.get("job_id")
+            zones, zone_raster = data.get("zones"), None
+            if not isinstance(zones, dict):
+                return jsonify({"error": "需要 zones (FeatureCollection) 或 zone_raster 文件"}), 400
+
+        if not job_id:
+            return jsonify({"error": "缺少 job_id"}), 400
+        if not os.path.exists(os.path.join(JOB_DIR, job_id, "mining_disturbance_year.tif")):
+            return jsonify({"error": "扰动年份结果不存在"}), 404
+
+        try:
+            result = zonal_disturbance(job_id, zones=zones, zone_raster=zone_raster)
+        except (ValueError, TypeError, KeyError, IndexError) as e:
+            return jsonify({"error": f"区域无效: {str(e)}"}), 400
+
+        logger.info(f"区域统计成功: job_id={job_id}, {len(result['zones'])}个区域")
+        return jsonify({"job_id": job_id, **result})
+    except Exception as e:
+        logger.error(f"区域统计异常: {str(e)}")
+        return jsonify({"error": f"统计失败: {str(e)}"}), 500
+
+
 @job_bp.get("/api/job-files/<job_id>")
 @jwt_required
 def list_job_files(job_id):
@@ -226,17 +422,15 @@ def list_job_files(job_id):
             return jsonify({"error": "任务不存在"}), 404
 
         files = []
-        for filename, label in OUTPUT_FILES:
-            path = os.path.join(job_dir, filename)
-            if os.path.exists(path):
-                size = os.path.getsize(path)
-                files.append({
-                    "filename": filename,
-                    "label": label,
-                    "size": size,
-                    "size_formatted": format_file_size(size),
-                    "url": f"/jobs/{job_id}/{filename}",
-                })
+        for filename, label, path in _available_outputs(job_dir):
+            size = os.path.getsize(path)
+            files.append({
+                "filename": filename,
+                "label": label,
+                "size": size,
+                "size_formatted": format_file_size(size),
+                "url": f"/jobs/{job_id}/{filename}",
+            })
 
         return jsonify({"job_id": job_id, "files": files})
     except Exception as e:
@@ -291,10 +485,17 @@ def download_zip(job_id):
 
 @job_bp.get("/jobs/<job_id>/<filename>")
 def serve_job_file(job_id, filename):
-    """提供结果文件（无需认证，以便地图图层加载）"""
+    """提供结果文件（无需认证，以便地图图层加载）
+
+    支持 If-None-Match/If-Modified-Since（304）与 Range（206），前端可以
+    只读取 GeoTIFF 的部分内容。
+    """
     try:
         d = os.path.join(JOB_DIR, job_id)
-        return send_from_directory(d, filename, as_attachment=False)
+        path = safe_join(d, filename)
+        st = os.stat(path) if path else None
+        etag = make_etag(job_id, filename, st.st_mtime_ns, st.st_size) if st else False
+        return send_from_directory(d, filename, as_attachment=False, conditional=True, etag=etag)
     except Exception as e:
         logger.error(f"获取文件异常: {str(e)}")
         return jsonify({"error": f"文件不存在: {str(e)}"}), 404
@@ -332,7 +533,9 @@ def get_job(job_id):
         job = Job.query.filter_by(job_id=job_id, user_id=g.user_id).first()
         if job is None:
             return jsonify({"error": "任务不存在"}), 404
-        return jsonify(job.to_dict())
+        result = job.to_dict()
+        result["layer_versions"] = _layer_versions(job_id)
+        return jsonify(result)
     except Exception as e:
         logger.error(f"获取任务详情异常: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -351,6 +554,8 @@ def delete_job(job_id):
         import shutil
         upload_dir = os.path.join(UPLOAD_DIR, job_id)
         job_dir = os.path.join(JOB_DIR, job_id)
+        # 先释放缓存连接与栅格句柄，再删除目录（Windows 上打开的文件无法删除）
+        invalidate_job_tiles(job_id)
         if os.path.exists(upload_dir):
             shutil.rmtree(upload_dir, ignore_errors=True)
         if os.path.exists(job_dir):
@@ -2,105 +2,276 @@
 import os
 import io
 import logging
-import numpy as np
-import rasterio
-from rasterio.features import shapes
-from pyproj import Transformer
-from flask import Blueprint, jsonify, send_file
-from config import JOB_DIR
+from flask import Blueprint, Response, jsonify, request, send_file
+from config import JOB_DIR, TILE_EMPTY_204, TILE_HTTP_MAX_AGE
 from services.tile_service import (
-    get_tile_cache_key, get_cached_tile, cache_tile,
-    make_transparent_tile, render_tile, LAYER_FILES,
+    get_cached_tile, cache_tile, tile_version, render_tile_coalesced, TileRenderBusy, LAYER_FILES,
+)
+from services.tile_encoder import PNG, MIMETYPES, EMPTY_TILES, EMPTY_TILE_PNG, negotiate_format
+from services.tile_coverage import tile_coverage
+from services.tile_pyramid import pyramid_reader
+from services.result_geojson import (
+    get_geojson_artifacts, get_feature_index, iter_feature_collection, polygon_features, dumps,
+)
+from services.polygonize import get_polygons
+from services.vector_tiles import VECTOR_LAYER_FILES, MVT_MIMETYPE, vector_tile
+from services.http_cache import (
+    REVALIDATE, make_etag, immutable, is_not_modified, with_cache_headers, not_modified,
 )
 
 logger = logging.getLogger(__name__)
 tile_bp = Blueprint("tile", __name__)
 
-GEOJSON_LAYER_FILES = {
-    "disturbance_mask": "mining_disturbance_mask.tif",
-    "disturbance_year": "mining_disturbance_year.tif",
-    "recovery_year": "mining_recovery_year.tif",
-}
+GEOJSON_LAYER_FILES = VECTOR_LAYER_FILES
+
+
+def _result_cache_control(version):
+    """URL 携带当前版本（?v=<版本>）时长期缓存；未带版本的 URL 内容会随重新运行
+    改变，每次按 ETag 重新验证"""
+    if request.args.get("v") == str(version):
+        return immutable(TILE_HTTP_MAX_AGE)
+    return REVALIDATE
+
+
+def _tile_response(data, fmt=PNG, etag=None, cache_control=REVALIDATE):
+    response = send_file(io.BytesIO(data), mimetype=MIMETYPES[fmt])
+    response.headers["Vary"] = "Accept"
+    if etag is not None:
+        with_cache_headers(response, etag, cache_control)
+    return response
+
+
+def _empty_tile_response(fmt=PNG, etag=None, cache_control=REVALIDATE):
+    if TILE_EMPTY_204:
+        response = Response(status=204)
+        response.headers["Vary"] = "Accept"
+        return with_cache_headers(response, etag, cache_control) if etag else response
+    return _tile_response(EMPTY_TILES[fmt], fmt, etag, cache_control)
 
 
 @tile_bp.get("/api/tiles/<job_id>/<layer_name>/<int:z>/<int:x>/<int:y>.png")
 def serve_tile(job_id, layer_name, z, x, y):
-    """提供动态栅格瓦片"""
-    try:
-        cache_key = get_tile_cache_key(job_id, layer_name, z, x, y)
-        cached = get_cached_tile(cache_key)
-        if cached:
-            return send_file(io.BytesIO(cached), mimetype="image/png")
+    """提供栅格瓦片
 
+    预渲染金字塔覆盖的层级始终返回库中的 PNG；其余层级动态渲染，
+    启用 TILE_WEBP_ENABLED 且浏览器支持时返回无损 WebP。
+    """
+    fmt = PNG
+    try:
         if layer_name not in LAYER_FILES:
-            return send_file(io.BytesIO(make_transparent_tile()), mimetype="image/png")
+            return _tile_response(EMPTY_TILE_PNG)
 
         tif_path = os.path.join(JOB_DIR, job_id, LAYER_FILES[layer_name])
         if not os.path.exists(tif_path):
-            return send_file(io.BytesIO(make_transparent_tile()), mimetype="image/png")
+            return _tile_response(EMPTY_TILE_PNG)
+
+        version = tile_version(tif_path)
+        pyramid = pyramid_reader.covers(job_id, layer_name, version, z)
+        if not pyramid:
+            fmt = negotiate_format(request.headers.get("Accept"))
+        etag = make_etag(job_id, layer_name, version, z, x, y, fmt)
+        cache_control = _result_cache_control(version)
+        if is_not_modified(etag):
+            response = not_modified(etag, cache_control)
+            response.headers["Vary"] = "Accept"
+            return response
 
-        png_bytes = render_tile(tif_path, layer_name, z, x, y)
-        cache_tile(cache_key, png_bytes)
-        return send_file(io.BytesIO(png_bytes), mimetype="image/png")
+        # 覆盖索引判定为空的瓦片不打开栅格
+        if tile_coverage.is_empty(job_id, layer_name, version, z, x, y):
+            return _empty_tile_response(fmt, etag, cache_control)
 
+        # 预渲染金字塔覆盖的层级直接读库（查不到即为空瓦片）
+        if pyramid:
+            covered, png_bytes = pyramid_reader.get(job_id, layer_name, version, z, x, y)
+            if covered:
+                if png_bytes:
+                    return _tile_response(png_bytes, fmt, etag, cache_control)
+                return _empty_tile_response(fmt, etag, cache_control)
+
+        # 不同格式分别缓存
+        cache_layer = layer_name if fmt == PNG else f"{layer_name}.{fmt}"
+        tile_bytes = get_cached_tile(job_id, cache_layer, version, z, x, y)
+        if tile_bytes is None:
+            tile_bytes = render_tile_coalesced(job_id, cache_layer, version, tif_path, layer_name,
+                                               z, x, y, fmt)
+        if tile_bytes == EMPTY_TILES[fmt]:
+            return _empty_tile_response(fmt, etag, cache_control)
+        return _tile_response(tile_bytes, fmt, etag, cache_control)
+
+    except TileRenderBusy as e:
+        logger.warning(f"瓦片渲染繁忙: {str(e)}")
+        response = Response(status=503)
+        response.headers["Retry-After"] = "1"
+        return response
     except Exception as e:
         logger.error(f"瓦片生成错误: {str(e)}")
-        return send_file(io.BytesIO(make_transparent_tile()), mimetype="image/png")
+        return _tile_response(EMPTY_TILE_PNG)
+
+
+@tile_bp.get("/api/vtiles/<job_id>/<layer_name>/<int:z>/<int:x>/<int:y>.pbf")
+def serve_vector_tile(job_id, layer_name, z, x, y):
+    """提供矢量瓦片（MVT）"""
+    try:
+        if layer_name not in VECTOR_LAYER_FILES:
+            return jsonify({"error": f"不支持的图层: {layer_name}"}), 400
+
+        tif_path = os.path.join(JOB_DIR, job_id, VECTOR_LAYER_FILES[layer_name])
+        if not os.path.exists(tif_path):
+            return jsonify({"error": f"文件不存在: {VECTOR_LAYER_FILES[layer_name]}"}), 404
+
+        version = tile_version(tif_path)
+        etag = make_etag(job_id, layer_name, version, z, x, y, "mvt")
+        cache_control = _result_cache_control(version)
+        if is_not_modified(etag):
+            return not_modified(etag, cache_control)
+
+        cache_layer = f"{layer_name}.mvt"
+        data = get_cached_tile(job_id, cache_layer, version, z, x, y)
+        if data is None:
+            data = vector_tile(job_id, layer_name, z, x, y)
+            cache_tile(job_id, cache_layer, version, z, x, y, data)
+        if not data and TILE_EMPTY_204:
+            response = Response(status=204)
+        else:
+            response = Response(data, mimetype=MVT_MIMETYPE)
+        return with_cache_headers(response, etag, cache_control)
+
+    except Exception as e:
+        logger.error(f"矢量瓦片生成错误: {str(e)}")
+        return jsonify({"error": f"矢量瓦片生成失败: {str(e)}"}), 500
+
+
+# 预压缩结果文件的 Content-Encoding（按优先顺序）
+_GEOJSON_ENCODINGS = {"br": "br", "gzip": "gzip"}
 
 
 @tile_bp.get("/api/result-geojson/<job_id>/<layer_name>")
 def result_geojson(job_id, layer_name):
-    """将栅格结果转换为 GeoJSON 多边形"""
+    """将栅格结果转换为 GeoJSON 多边形
+
+    ?format=ndjson 时逐行流式返回要素（application/x-ndjson）；否则返回
+    FeatureCollection，请求头 Accept-Encoding 含 br/gzip 时直接发送预压缩文件。
+    ?bbox=minlon,minlat,maxlon,maxlat[&limit=N] 时只返回外包框与范围相交的要素。
+    ?lod=k（k >= 1）时返回第 k 级简化的多边形（见 services/polygonize.py）。
+    """
     try:
         if layer_name not in GEOJSON_LAYER_FILES:
             return jsonify({"error": f"不支持的图层: {layer_name}"}), 400
 
+        fmt = request.args.get("format", "geojson")
+        if fmt not in ("geojson", "ndjson"):
+            return jsonify({"error": f"不支持的格式: {fmt}"}), 400
+
         tif_path = os.path.join(JOB_DIR, job_id, GEOJSON_LAYER_FILES[layer_name])
         if not os.path.exists(tif_path):
             return jsonify({"error": f"文件不存在: {GEOJSON_LAYER_FILES[layer_name]}"}), 404
 
-        features = []
-        with rasterio.open(tif_path) as ds:
-            data = ds.read(1)
-            src_crs = ds.crs
-            transform = ds.transform
-            nodata = ds.nodata
-
-            if nodata is not None:
-                mask = (data != nodata) & (data != 0)
-            else:
-                mask = data != 0
-
-            for geom, value in shapes(data.astype(np.int32), mask=mask, transform=transform):
-                if value == 0:
-                    continue
-
-                if src_crs is not None and src_crs.to_string() != "EPSG:4326":
-                    tfm = Transformer.from_crs(src_crs, "EPSG:4326", always_xy=True)
-                    coords = geom["coordinates"]
-                    new_coords = []
-                    for ring in coords:
-                        new_ring = []
-                        for x_c, y_c in ring:
-                            lon, lat = tfm.transform(x_c, y_c)
-                            new_ring.append([lon, lat])
-                        new_coords.append(new_ring)
-                    geom["coordinates"] = new_coords
-
-                feature = {
-                    "type": "Feature",
-                    "geometry": geom,
-                    "properties": {"value": int(value), "layer": layer_name},
-                }
-
-                if "year" in layer_name:
-                    feature["properties"]["year"] = int(value)
-
-                features.append(feature)
-
-        logger.info(f"GeoJSON转换成功: {job_id}/{layer_name}, {len(features)}个要素")
-        return jsonify({"type": "FeatureCollection", "features": features})
+        if "bbox" in request.args:
+            return _result_geojson_bbox(job_id, layer_name, tif_path)
+
+        lod = request.args.get("lod", 0, type=int)
+        if lod:
+            return _result_geojson_lod(job_id, layer_name, tif_path, lod)
+
+        paths = get_geojson_artifacts(job_id, layer_name)
+        encoding = None
+        if fmt == "geojson":
+            available = [e for e in _GEOJSON_ENCODINGS if os.path.exists(paths[e])]
+            encoding = request.accept_encodings.best_match(available) if available else None
+
+        version = tile_version(tif_path)
+        etag = make_etag(job_id, layer_name, version, fmt, encoding or "identity")
+        cache_control = _result_cache_control(version)
+        if is_not_modified(etag):
+            response = not_modified(etag, cache_control)
+        elif fmt == "ndjson":
+            response = send_file(paths["ndjson"], mimetype="application/x-ndjson",
+                                 conditional=False, etag=False)
+        elif encoding is not None:
+            response = send_file(paths[encoding], mimetype="application/json",
+                                 conditional=False, etag=False)
+            response.headers["Content-Encoding"] = _GEOJSON_ENCODINGS[encoding]
+        else:
+            response = Response(iter_feature_collection(paths["ndjson"]), mimetype="application/json")
+        response.headers["Vary"] = "Accept-Encoding"
+        return with_cache_headers(response, etag, cache_control)
 
     except Exception as e:
         logger.error(f"GeoJSON转换异常: {str(e)}")
         return jsonify({"error": f"转换失败: {str(e)}"}), 500
+
+
+def _parse_bbox(value):
+    try:
+        minx, miny, maxx, maxy = (float(v) for v in value.split(","))
+    except ValueError:
+        return None
+    if not (minx <= maxx and miny <= maxy):
+        return None
+    return minx, miny, maxx, maxy
+
+
+def _result_geojson_bbox(job_id, layer_name, tif_path):
+    """按范围查询要素（R 树索引）"""
+    bbox = _parse_bbox(request.args.get("bbox", ""))
+    if bbox is None:
+        return jsonify({"error": "bbox 格式应为 minlon,minlat,maxlon,maxlat"}), 400
+    limit = request.args.get("limit", type=int)
+    if limit is not None and limit <= 0:
+        return jsonify({"error": "limit 必须为正整数"}), 400
+
+    version = tile_version(tif_path)
+    etag = make_etag(job_id, layer_name, version, "bbox", *bbox, limit)
+    cache_control = _result_cache_control(version)
+    if is_not_modified(etag):
+        return not_modified(etag, cache_control)
+
+    index = get_feature_index(job_id, layer_name)
+    ids = index.query(*bbox)
+    returned = ids[:limit] if limit is not None else ids
+    body = (b'{"type":"FeatureCollection","numberMatched":%d,"numberReturned":%d,"features":['
+            % (len(ids), len(returned))
+            + b",".join(index.read_lines(returned)) + b"]}")
+    return with_cache_headers(Response(body, mimetype="application/json"), etag, cache_control)
+
+
+def _result_geojson_lod(job_id, layer_name, tif_path, lod):
+    """简化级别 lod 的 FeatureCollection"""
+    polygons = get_polygons(tif_path)
+    if not 0 < lod < polygons.n_levels:
+        return jsonify({"error": f"lod 取值范围为 0-{polygons.n_levels - 1}"}), 400
+
+    version = tile_version(tif_path)
+    etag = make_etag(job_id, layer_name, version, "lod", lod)
+    cache_control = _result_cache_control(version)
+    if is_not_modified(etag):
+        return not_modified(etag, cache_control)
+
+    features = polygon_features(tif_path, layer_name, lod)
+    response = Response(dumps({"type": "FeatureCollection", "features": features}),
+                        mimetype="application/json")
+    return with_cache_headers(response, etag, cache_control)
+
+
+@tile_bp.get("/api/result-geojson/<job_id>/<layer_name>/identify")
+def identify_feature(job_id, layer_name):
+    """点查询：返回包含 (lon, lat) 的要素（地图点击识别）"""
+    try:
+        if layer_name not in GEOJSON_LAYER_FILES:
+            return jsonify({"error": f"不支持的图层: {layer_name}"}), 400
+        lon = request.args.get("lon", type=float)
+        lat = request.args.get("lat", type=float)
+        if lon is None or lat is None:
+            return jsonify({"error": "缺少 lon/lat 参数"}), 400
+
+        tif_path = os.path.join(JOB_DIR, job_id, GEOJSON_LAYER_FILES[layer_name])
+        if not os.path.exists(tif_path):
+            return jsonify({"error": f"文件不存在: {GEOJSON_LAYER_FILES[layer_name]}"}), 404
+
+        features = get_feature_index(job_id, layer_name).features_at(lon, lat)
+        return Response(dumps({"type": "FeatureCollection", "features": features}),
+                        mimetype="application/json")
+
+    except Exception as e:
+        logger.error(f"要素查询异常: {str(e)}")
+        return jsonify({"error": f"查询失败: {str(e)}"}), 500
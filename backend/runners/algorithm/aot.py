@@ -0,0 +1,127 @@
+"""
+Ahead-of-time compilation of the DTW / BWlvbo Numba kernels.
+
+The @jit kernels compile on first call (or load from the on-disk cache),
+which puts compilation on the request path of every cold process. This
+build step compiles them into a native extension module (_aot_kernels)
+with numba.pycc and also pre-populates the JIT cache for the kernels that
+stay jitted (batch/parallel variants).
+
+The extension embeds a hash of dtw.py and bwlvbo.py; a stale build is
+ignored and the JIT kernels are used instead.
+
+Usage (build step, e.g. in deployment scripts):
+    cd backend
+    python -m runners.algorithm.aot
+"""
+
+import os
+import sys
+import zlib
+import logging
+import warnings
+
+logger = logging.getLogger(__name__)
+
+MODULE_NAME = "_aot_kernels"
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_SOURCES = ("dtw.py", "bwlvbo.py")
+
+_aot_module = None
+_aot_checked = False
+
+
+def kernel_source_hash():
+    """CRC32 of the kernel source files, used to detect stale builds."""
+    crc = 0
+    for name in _SOURCES:
+        with open(os.path.join(_HERE, name), "rb") as f:
+            crc = zlib.crc32(f.read(), crc)
+    return crc
+
+
+def load_aot_kernels():
+    """Return the compiled kernel module, or None if absent or stale."""
+    global _aot_module, _aot_checked
+    if _aot_checked:
+        return _aot_module
+    _aot_checked = True
+
+    try:
+        from . import _aot_kernels as mod
+    except ImportError:
+        return None
+
+    if mod.source_hash() != kernel_source_hash():
+        logger.warning("AOT kernels are stale (kernel sources changed), using JIT; "
+                       "rebuild with: python -m runners.algorithm.aot")
+        return None
+
+    _aot_module = mod
+    return mod
+
+
+def build_aot_kernels(output_dir=None):
+    """Compile the kernels into a native extension module.
+
+    Args:
+        output_dir: destination directory (default: this package)
+    Returns:
+        path to the built extension
+    """
+    with warnings.catch_warnings():
+        # numba.pycc emits a pending-deprecation warning on import
+        warnings.simplefilter("ignore")
+        from numba.pycc import CC
+
+    from .dtw import _dtw_distance_only, _dtw_distance_matrix, _backtrack_path
+    from .bwlvbo import _spike_removal_numba
+
+    src_hash = kernel_source_hash()
+    # Numba freezes globals as compile-time constants
+    namespace = {}
+    exec(f"def source_hash():\n    return {src_hash}\n", namespace)
+
+    cc = CC(MODULE_NAME)
+    cc.output_dir = output_dir or _HERE
+    cc.verbose = False
+    cc.export("source_hash", "i8()")(namespace["source_hash"])
+    cc.export("dtw_distance_only", "f8(f8[:], f8[:])")(_dtw_distance_only.py_func)
+    cc.export("dtw_distance_matrix", "Tuple((f8, f8[:, :]))(f8[:], f8[:])")(
+        _dtw_distance_matrix.py_func)
+    cc.export("backtrack_path", "i8[:, :](f8[:, :])")(_backtrack_path.py_func)
+    cc.export("spike_removal", "f8[:](f8[:])")(_spike_removal_numba.py_func)
+    cc.compile()
+
+    built = [f for f in os.listdir(cc.output_dir) if f.startswith(MODULE_NAME + ".")]
+    path = os.path.join(cc.output_dir, built[0]) if built else None
+    logger.info(f"AOT kernels built: {path}")
+    return path
+
+
+def warm_jit_cache():
+    """Compile the jitted kernels once so their on-disk cache is populated."""
+    import numpy as np
+    from .dtw import dtw_batch_distances, dtw_with_path_for_template
+    from .knn_dtw import _warmup_numba
+
+    _warmup_numba()
+    d = np.array([1.0, 2.0, 3.0], dtype=np.float64)
+    dtw_batch_distances(np.ones((2, 3), dtype=np.float64), d)
+    dtw_with_path_for_template(d, d)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    try:
+        path = build_aot_kernels()
+    except Exception as e:
+        logger.error(f"AOT build failed ({e}); falling back to JIT cache warm-up only")
+        path = None
+    warm_jit_cache()
+    print(path or "JIT cache warmed (no AOT module)")
+    return 0 if path else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,406 @@
+"""
+Auto-tuning of the KNN-DTW execution backend and chunk size.
+
+knn_classify used to hardcode chunk_size=2000 / n_jobs=cpu_count() and ran
+sequentially whenever the job fitted in one chunk. This module benchmarks
+the sequential, process-pool and threaded backends across chunk sizes on a
+synthetic workload once per host (and again whenever the host or the
+relevant configuration changes), persists the result as a JSON profile and
+answers "which backend / how many workers / what chunk size" for a given
+pixel count and series length.
+
+Cost model (fitted during calibration):
+    sequential time  = M * (a * L^2 + b)
+    backend time     = overhead + sequential time / (n_workers * efficiency)
+
+Calibration never runs inside the web process. It runs through the CLI
+below, which starts its own worker pool of the configured size and placement
+so live jobs never share it. With KNN_AUTOTUNE the web app launches that CLI
+in a low-priority subprocess once a job has finished and no other job is
+running in the process (schedule_idle_calibration). A profile measured
+while a job started is discarded and recalibrated at the next idle point.
+
+Usage:
+    python -m runners.algorithm.autotune            # calibrate if stale
+    python -m runners.algorithm.autotune --force    # always recalibrate
+"""
+
+import os
+import sys
+import json
+import time
+import math
+import logging
+import platform
+import argparse
+import threading
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PROFILE_VERSION = 1
+
+BACKENDS = ("sequential", "processes", "threads")
+
+# Chunk sizes tried during calibration
+CALIBRATION_CHUNK_SIZES = (64, 256, 1000, 2000)
+# Series lengths used to fit the per-pixel cost model
+CALIBRATION_LENGTHS = (12, 30)
+# Target duration of one sequential calibration run (seconds)
+CALIBRATION_TARGET_S = 1.0
+
+# Selection heuristics
+MIN_CHUNK_SIZE = 32
+CHUNKS_PER_WORKER = 4
+DEFAULT_CHUNK_SIZE = 2000
+# Without a profile: go parallel above this much work (pixels * L^2)
+DEFAULT_PARALLEL_WORK = 2_000_000
+
+_profile_cache = {}
+_profile_lock = threading.Lock()
+
+# Jobs in this process: currently running / started since import
+_job_lock = threading.Lock()
+_jobs = {"active": 0, "started": 0, "calibrating": False}
+# Niceness of the calibration subprocess; a stale lock file is ignored after this long
+CALIBRATION_NICE = 10
+CALIBRATION_LOCK_TIMEOUT_S = 3600
+
+
+def _load_config():
+    """Import backend config the same way get_runner() does."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+    import config
+    return config
+
+
+def default_profile_path():
+    return _load_config().KNN_TUNING_PROFILE
+
+
+def current_fingerprint():
+    """Host + configuration identity; a profile is valid only for an equal fingerprint."""
+    import numba
+    from .aot import load_aot_kernels
+
+    config = _load_config()
+    affinity = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+    return {
+        "profile_version": PROFILE_VERSION,
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "affinity": affinity,
+        "python": platform.python_version(),
+        "numba": numba.__version__,
+        "aot_kernels": load_aot_kernels() is not None,
+        "config": {
+            "KNN_WORKER_POOL_SIZE": config.KNN_WORKER_POOL_SIZE,
+            "KNN_PLACEMENT": config.KNN_PLACEMENT,
+        },
+    }
+
+
+def load_tuning_profile(path=None):
+    """Return the persisted profile if it matches this host/config, else None.
+
+    The parsed file is cached per process and re-read when its mtime changes.
+    """
+    path = path or default_profile_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _profile_lock:
+        cached = _profile_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            profile = cached[1]
+        else:
+            try:
+                with open(path) as f:
+                    profile = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cannot read tuning profile {path}: {e}")
+                return None
+            _profile_cache[path] = (mtime, profile)
+
+    if profile.get("fingerprint") != current_fingerprint():
+        return None
+    return profile
+
+
+def save_tuning_profile(profile, path=None):
+    path = path or default_profile_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def pixel_cost(profile, n_bands):
+    """Estimated sequential seconds per pixel for series length n_bands."""
+    cost = profile["pixel_cost"]
+    return cost["a"] * n_bands * n_bands + cost["b"]
+
+
+def select_execution(n_pixels, n_bands, max_workers, profile=None):
+    """Choose backend, worker count and chunk size for a classification job.
+
+    Args:
+        n_pixels: number of pixels to classify
+        n_bands: series length
+        max_workers: workers available (pool size or CPU count)
+        profile: tuning profile (None = built-in heuristics)
+    Returns:
+        dict(backend, n_jobs, chunk_size, estimated_s)
+    """
+    if max_workers <= 1 or n_pixels <= 1:
+        return {"backend": "sequential", "n_jobs": 1, "chunk_size": n_pixels, "estimated_s": None}
+
+    def chunk_for(n_workers, best_chunk):
+        # Enough chunks to keep every worker busy, capped by the measured optimum
+        balanced = math.ceil(n_pixels / (n_workers * CHUNKS_PER_WORKER))
+        return int(max(MIN_CHUNK_SIZE, min(best_chunk, balanced)))
+
+    if profile is None:
+        if n_pixels * n_bands * n_bands < DEFAULT_PARALLEL_WORK:
+            return {"backend": "sequential", "n_jobs": 1, "chunk_size": n_pixels,
+                    "estimated_s": None}
+        return {"backend": "processes", "n_jobs": max_workers,
+                "chunk_size": chunk_for(max_workers, DEFAULT_CHUNK_SIZE), "estimated_s": None}
+
+    t_seq = n_pixels * pixel_cost(profile, n_bands)
+    best = {"backend": "sequential", "n_jobs": 1, "chunk_size": n_pixels, "estimated_s": t_seq}
+
+    for name, params in profile.get("backends", {}).items():
+        n_workers = max(1, min(max_workers, params["n_workers"]))
+        est = params["overhead_s"] + t_seq / (n_workers * params["efficiency"])
+        if est < best["estimated_s"]:
+            best = {
+                "backend": name,
+                "n_jobs": n_workers,
+                "chunk_size": chunk_for(n_workers, params["chunk_size"]),
+                "estimated_s": est,
+            }
+    return best
+
+
+# ============================================================
+# Calibration
+# ============================================================
+
+def _workload(n_pixels, n_bands, seed=0):
+    """Synthetic pixels covering all 49 behaviours, with NaN gaps."""
+    from .sample_generator import creat_sample
+    from .scene_generator import synthesize_pixels
+
+    rng = np.random.default_rng(seed)
+    samples = creat_sample([0.15, 0.75], n_bands, 0.8, 0.6)
+    labels = rng.integers(1, 50, size=n_pixels)
+    test = synthesize_pixels(rng, labels, samples[:, :-1], noise=0.02, nan_fraction=0.02)
+    return samples[:, :-1], samples[:, -1], test
+
+
+def _time_run(train, labels, test, **kwargs):
+    from .knn_dtw import knn_classify
+    t0 = time.perf_counter()
+    knn_classify(train, labels, test, **kwargs)
+    return time.perf_counter() - t0
+
+
+def calibrate(max_workers=None, chunk_sizes=CALIBRATION_CHUNK_SIZES,
+              lengths=CALIBRATION_LENGTHS, target_s=CALIBRATION_TARGET_S):
+    """Benchmark the backends on this host and return a tuning profile."""
+    from .knn_dtw import _warmup_numba
+    from .worker_pool import get_worker_pool_size
+
+    _warmup_numba()
+    max_workers = max_workers or get_worker_pool_size() or os.cpu_count() or 1
+    measurements = []
+
+    # 1) Per-pixel sequential cost at two series lengths -> a * L^2 + b
+    costs = []
+    for L in lengths:
+        train, labels, probe = _workload(200, L)
+        t = _time_run(train, labels, probe, n_jobs=1, backend="sequential")
+        costs.append(t / probe.shape[0])
+        measurements.append({"backend": "sequential", "n_bands": L,
+                             "n_pixels": probe.shape[0], "seconds": t})
+    (l1, l2), (c1, c2) = lengths, costs
+    a = max((c2 - c1) / (l2 * l2 - l1 * l1), 0.0)
+    b = max(c1 - a * l1 * l1, 0.0)
+    profile = {"pixel_cost": {"a": a, "b": b}}
+
+    # 2) Backend throughput / overhead on a workload sized to ~target_s sequential
+    L = lengths[-1]
+    n_pixels = int(max(max_workers * CHUNKS_PER_WORKER * MIN_CHUNK_SIZE,
+                       target_s / pixel_cost(profile, L)))
+    train, labels, test = _workload(n_pixels, L, seed=1)
+    t_seq = n_pixels * pixel_cost(profile, L)
+
+    backends = {}
+    if max_workers > 1:
+        for backend in ("processes", "threads"):
+            _, _, tiny = _workload(max_workers, L, seed=2)
+            overhead = _time_run(train, labels, tiny, n_jobs=max_workers,
+                                 backend=backend, chunk_size=1)
+            best = None
+            for chunk in chunk_sizes:
+                t = _time_run(train, labels, test, n_jobs=max_workers,
+                              backend=backend, chunk_size=chunk)
+                measurements.append({"backend": backend, "n_bands": L, "n_pixels": n_pixels,
+                                     "chunk_size": chunk, "n_workers": max_workers,
+                                     "seconds": t})
+                if best is None or t < best[1]:
+                    best = (chunk, t)
+            chunk, t_best = best
+            efficiency = t_seq / (max_workers * max(t_best - overhead, 1e-6))
+            backends[backend] = {
+                "n_workers": max_workers,
+                "chunk_size": chunk,
+                "overhead_s": overhead,
+                "efficiency": float(min(max(efficiency, 0.01), 1.0)),
+            }
+            logger.info(f"  {backend}: best chunk={chunk}, {t_best:.2f}s "
+                        f"(sequential est. {t_seq:.2f}s), overhead={overhead:.3f}s")
+
+    profile.update({
+        "fingerprint": current_fingerprint(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "backends": backends,
+        "measurements": measurements,
+    })
+    return profile
+
+
+def ensure_tuning_profile(path=None, force=False):
+    """Calibrate and persist a profile unless a valid one already exists."""
+    path = path or default_profile_path()
+    if not force:
+        profile = load_tuning_profile(path)
+        if profile is not None:
+            return profile
+
+    logger.info("Calibrating KNN-DTW execution backends...")
+    profile = calibrate()
+    save_tuning_profile(profile, path)
+    logger.info(f"Tuning profile saved: {path}")
+    return profile
+
+
+@contextmanager
+def job_running():
+    """Mark a detection job as running (idle calibration waits for none)."""
+    with _job_lock:
+        _jobs["active"] += 1
+        _jobs["started"] += 1
+    try:
+        yield
+    finally:
+        with _job_lock:
+            _jobs["active"] -= 1
+
+
+def _acquire_calibration_lock(path):
+    lock = f"{path}.lock"
+    try:
+        if time.time() - os.path.getmtime(lock) > CALIBRATION_LOCK_TIMEOUT_S:
+            os.remove(lock)
+    except OSError:
+        pass
+    try:
+        os.makedirs(os.path.dirname(lock), exist_ok=True)
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return lock
+    except FileExistsError:
+        return None
+
+
+def _run_calibration(path):
+    """Run the calibration CLI in a separate low-priority process."""
+    lock = _acquire_calibration_lock(path)
+    if lock is None:
+        return  # another process is calibrating
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        with _job_lock:
+            started = _jobs["started"]
+        cmd = [sys.executable, "-m", "runners.algorithm.autotune", "--path", path]
+        preexec = (lambda: os.nice(CALIBRATION_NICE)) if hasattr(os, "nice") else None
+        result = subprocess.run(cmd, cwd=backend_dir, preexec_fn=preexec,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            logger.warning(f"KNN-DTW calibration failed: {result.stderr.strip()[-500:]}")
+            return
+        with _job_lock:
+            overlapped = _jobs["started"] != started
+        if overlapped:
+            # Timings were taken under load: drop them and retry when idle again
+            logger.info("KNN-DTW calibration overlapped a job; discarding profile")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        else:
+            logger.info(f"Tuning profile saved: {path}")
+    finally:
+        with _job_lock:
+            _jobs["calibrating"] = False
+        try:
+            os.remove(lock)
+        except OSError:
+            pass
+
+
+def schedule_idle_calibration(path=None):
+    """Start background calibration if the profile is stale and no job is running.
+
+    Returns the started thread, or None when nothing needs to run.
+    """
+    if not _load_config().KNN_AUTOTUNE:
+        return None
+    path = path or default_profile_path()
+    with _job_lock:
+        if _jobs["active"] or _jobs["calibrating"]:
+            return None
+    if load_tuning_profile(path) is not None:
+        return None
+    with _job_lock:
+        if _jobs["active"] or _jobs["calibrating"]:
+            return None
+        _jobs["calibrating"] = True
+    thread = threading.Thread(target=_run_calibration, args=(path,), name="knn-autotune", daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate KNN-DTW execution backends")
+    parser.add_argument("--force", action="store_true", help="recalibrate even if up to date")
+    parser.add_argument("--path", default=None, help="profile path (default: config)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    # Dedicated pool with the production size/placement (never the web app's pool)
+    config = _load_config()
+    from .worker_pool import start_worker_pool, shutdown_worker_pool
+    if config.KNN_WORKER_POOL_SIZE > 0:
+        start_worker_pool(config.KNN_WORKER_POOL_SIZE, config.KNN_PLACEMENT)
+    try:
+        profile = ensure_tuning_profile(args.path, force=args.force)
+    finally:
+        shutdown_worker_pool()
+    print(json.dumps({k: profile[k] for k in ("pixel_cost", "backends")}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,10 @@ import numpy as np
 from numba import jit
 import pywt
 
+from .aot import load_aot_kernels
 
-@jit(nopython=True, cache=True)
+
+@jit(nopython=True, nogil=True, cache=True)
 def _spike_removal_numba(a):
     """Remove dip-spikes using a sliding window of 3.
 
@@ -50,9 +52,13 @@ def _spike_removal_numba(a):
 def spike_removal(a):
     """Remove dip-spikes using a sliding window of 3.
 
-    Wrapper for Numba-accelerated implementation.
+    Wrapper for Numba-accelerated implementation (ahead-of-time compiled
+    build when available, see aot.py).
     """
     a = np.ascontiguousarray(a, dtype=np.float64)
+    aot = load_aot_kernels()
+    if aot is not None:
+        return aot.spike_removal(a)
     return _spike_removal_numba(a)
 
 
@@ -10,7 +10,7 @@ from numba import jit, prange
 from numba.typed import List as NumbaList
 
 
-@jit(nopython=True, cache=True)
+@jit(nopython=True, nogil=True, cache=True)
 def _dtw_distance_matrix(r, t):
     """Compute DTW cumulative distance matrix D.
 
@@ -42,7 +42,7 @@ def _dtw_distance_matrix(r, t):
     return D[M - 1, N - 1], D
 
 
-@jit(nopython=True, cache=True)
+@jit(nopython=True, nogil=True, cache=True)
 def _backtrack_path(D):
     """Backtrack through D matrix to find warping path.
 
@@ -93,7 +93,7 @@ def _backtrack_path(D):
     return result
 
 
-@jit(nopython=True, cache=True)
+@jit(nopython=True, nogil=True, cache=True)
 def _dtw_distance_only(r, t):
     """Compute DTW distance without storing full matrix (memory efficient).
 
@@ -172,7 +172,7 @@ def dtw_batch_distances(templates, test_seq):
     return distances
 
 
-@jit(nopython=True, cache=True)
+@jit(nopython=True, nogil=True, cache=True)
 def dtw_with_path_for_template(template, test_seq):
     """Compute DTW with path for a single template.
 
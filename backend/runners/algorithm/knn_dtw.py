@@ -6,6 +6,12 @@ Performance optimizations vs original pure-Python version:
 2. Only compute warping path for best-matching template (1 vs 49)
 3. Parallel pixel processing via joblib multiprocessing (Nx for N cores)
 4. Chunk-based data distribution for memory efficiency
+5. Persistent, pre-warmed worker pool owned by the application
+   (worker_pool.py) and ahead-of-time compiled kernels (aot.py)
+6. Backend / worker count / chunk size chosen per job from the host's
+   calibrated tuning profile (autotune.py)
+7. Cost-balanced chunks dispatched through a shared work queue, small
+   chunks at the tail (scheduler.py)
 
 Port of knn.m with identical algorithmic logic.
 """
@@ -13,11 +19,24 @@ Port of knn.m with identical algorithmic logic.
 import os
 import logging
 import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 from .dtw import _dtw_distance_only, _dtw_distance_matrix, _backtrack_path
 from .bwlvbo import bwlvbo, _spike_removal_numba
 from .utils import matlab_round
+from .aot import load_aot_kernels
+from .worker_pool import (
+    ensure_worker_pool, get_worker_pools, get_worker_pool_size, configured_worker_pool_size,
+    get_placement,
+)
+from .placement import plan_placement, init_pinned_worker
+from .autotune import select_execution, load_tuning_profile, DEFAULT_CHUNK_SIZE
+from .scheduler import (
+    estimate_pixel_costs, balanced_chunk_ranges, fixed_chunk_ranges,
+    run_work_queue, timed_call, summarize_timeline,
+)
 
 try:
     from joblib import Parallel, delayed
@@ -27,14 +46,36 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Prefer the ahead-of-time compiled kernels: no JIT work in cold processes
+_aot = load_aot_kernels()
+if _aot is not None:
+    _dist_only = _aot.dtw_distance_only
+    _dist_matrix = _aot.dtw_distance_matrix
+    _backtrack = _aot.backtrack_path
+else:
+    _dist_only = _dtw_distance_only
+    _dist_matrix = _dtw_distance_matrix
+    _backtrack = _backtrack_path
+
+_kernels_warm = False
+
 
 def _warmup_numba():
-    """Pre-compile all Numba functions so disk cache is ready for workers."""
+    """Pre-compile all Numba functions so disk cache is ready for workers.
+
+    Runs once per process; a no-op compile when the AOT kernels are loaded.
+    """
+    global _kernels_warm
+    if _kernels_warm:
+        return
     d = np.array([1.0, 2.0, 3.0], dtype=np.float64)
-    _dtw_distance_only(d, d)
-    _dtw_distance_matrix(d, d)
-    _backtrack_path(np.ones((3, 3), dtype=np.float64))
-    _spike_removal_numba(np.array([0.5, 0.3, 0.5, 0.4, 0.5], dtype=np.float64))
+    _dist_only(d, d)
+    _dist_matrix(d, d)
+    _backtrack(np.ones((3, 3), dtype=np.float64))
+    if _aot is None:
+        _spike_removal_numba(np.array([0.5, 0.3, 0.5, 0.4, 0.5], dtype=np.float64))
+    bwlvbo(np.array([0.5, 0.3, 0.5, 0.4, 0.5], dtype=np.float64))
+    _kernels_warm = True
 
 
 def _process_pixel(test_ts, train_data, labels, N):
@@ -65,7 +106,7 @@ def _process_pixel(test_ts, train_data, labels, N):
         best_dist = np.inf
         best_idx = 0
         for i in range(n_templates):
-            d = _dtw_distance_only(train_data[i], denoised)
+            d = _dist_only(train_data[i], denoised)
             if d < best_dist:
                 best_dist = d
                 best_idx = i
@@ -73,8 +114,8 @@ def _process_pixel(test_ts, train_data, labels, N):
         best_label = int(labels[best_idx])
 
         # Compute warping path ONLY for the best template
-        _, D = _dtw_distance_matrix(train_data[best_idx], denoised)
-        path = _backtrack_path(D)
+        _, D = _dist_matrix(train_data[best_idx], denoised)
+        path = _backtrack(D)
 
         # Extract disturbance/recovery years
         yd, yr = _extract_years(path, best_label, id_nan, N)
@@ -104,7 +145,8 @@ def _process_chunk(chunk_data, train_data, labels, N):
     return results
 
 
-def knn_classify(train_data, labels, test_data, k=1, n_jobs=-1, chunk_size=2000):
+def knn_classify(train_data, labels, test_data, k=1, n_jobs=-1, chunk_size=None,
+                 backend=None, stats=None):
     """KNN classification with DTW distance - parallel optimized.
 
     Direct port of knn.m with performance optimizations.
@@ -121,8 +163,10 @@ def knn_classify(train_data, labels, test_data, k=1, n_jobs=-1, chunk_size=2000)
         labels: (49,) template labels (1-49)
         test_data: (num_pixels, L) test data (may contain NaN)
         k: number of neighbors (always 1)
-        n_jobs: parallel workers (-1 = all CPU cores, 1 = sequential)
-        chunk_size: pixels per parallel chunk
+        n_jobs: parallel workers (-1 = pool size / all CPU cores, 1 = sequential)
+        chunk_size: pixels per parallel chunk (None = auto-tuned)
+        backend: 'sequential', 'processes' or 'threads' (None = auto-tuned)
+        stats: optional dict, filled with the execution plan and timing
     Returns:
         (class_labels, disturbance_years, recovery_years)
         Each is (num_pixels,) array of ints
@@ -138,37 +182,100 @@ def knn_classify(train_data, labels, test_data, k=1, n_jobs=-1, chunk_size=2000)
         empty = np.zeros(0, dtype=int)
         return empty.copy(), empty.copy(), empty.copy()
 
-    # Pre-compile Numba functions (disk cache for workers)
-    logger.info("Warming up Numba JIT compilation cache...")
+    # Pre-compile Numba functions (once per process; pool workers warm themselves)
     _warmup_numba()
 
-    # Resolve n_jobs
-    if n_jobs == -1:
-        import multiprocessing
-        n_jobs = multiprocessing.cpu_count()
+    plan = _plan_execution(M_test, N, n_jobs, chunk_size, backend)
+    cost_model = plan.pop("cost_model", None)
+    backend, n_jobs, chunk_size = plan["backend"], plan["n_jobs"], plan["chunk_size"]
 
     t0 = time.time()
 
-    if n_jobs <= 1 or not HAS_JOBLIB or M_test <= chunk_size:
+    if backend == "sequential":
         # Sequential mode
         logger.info(f"KNN-DTW sequential: {M_test} pixels")
         class_test, class_yd, class_yr = _classify_sequential(
             train_f64, labels_f64, test_f64, N
         )
+        schedule_summary = None
     else:
-        # Parallel mode
-        n_chunks = (M_test + chunk_size - 1) // chunk_size
-        logger.info(f"KNN-DTW parallel: {M_test} pixels, {n_chunks} chunks, {n_jobs} workers")
-        class_test, class_yd, class_yr = _classify_parallel(
-            train_f64, labels_f64, test_f64, N, n_jobs, chunk_size
+        # Parallel mode: cost-balanced chunks through a shared work queue
+        logger.info(f"KNN-DTW parallel ({backend}): {M_test} pixels, {n_jobs} workers, "
+                    f"max chunk {chunk_size}")
+        class_test, class_yd, class_yr, schedule_summary = _classify_chunked(
+            train_f64, labels_f64, test_f64, N, backend, n_jobs, chunk_size,
+            cost_model=cost_model,
         )
 
     elapsed = time.time() - t0
     rate = M_test / elapsed if elapsed > 0 else 0
     logger.info(f"KNN classification complete: {M_test} pixels in {elapsed:.1f}s ({rate:.0f} px/s)")
+
+    if stats is not None:
+        stats.update(plan)
+        stats.update({
+            "n_pixels": int(M_test),
+            "n_bands": int(N),
+            "elapsed_s": round(elapsed, 3),
+            "pixels_per_s": round(rate, 1),
+        })
+        if schedule_summary:
+            stats["schedule"] = schedule_summary
+        if plan["backend"] != "sequential":
+            stats["placement"] = get_placement()
     return class_test, class_yd, class_yr
 
 
+def _plan_execution(M_test, N, n_jobs, chunk_size, backend):
+    """Resolve backend, worker count and chunk size for one job.
+
+    Explicit arguments win; otherwise the host's tuning profile decides
+    (built-in heuristics when no valid profile exists).
+    """
+    pool_size = get_worker_pool_size() or configured_worker_pool_size()
+    if n_jobs == -1:
+        if pool_size:
+            max_workers = pool_size
+        else:
+            import multiprocessing
+            max_workers = multiprocessing.cpu_count()
+    else:
+        max_workers = max(1, n_jobs)
+
+    tuned = False
+    if n_jobs == 1:
+        plan = {"backend": "sequential", "n_jobs": 1, "chunk_size": M_test}
+    elif backend is None:
+        try:
+            profile = load_tuning_profile()
+        except Exception as e:
+            logger.warning(f"Tuning profile unavailable: {e}")
+            profile = None
+        tuned = profile is not None
+        plan = select_execution(M_test, N, max_workers, profile)
+        if tuned:
+            plan["cost_model"] = profile["pixel_cost"]
+    else:
+        plan = {
+            "backend": backend,
+            "n_jobs": 1 if backend == "sequential" else max_workers,
+            "chunk_size": DEFAULT_CHUNK_SIZE,
+        }
+
+    if chunk_size is not None and plan["backend"] != "sequential":
+        plan["chunk_size"] = int(chunk_size)
+    if plan["backend"] not in ("sequential", "processes", "threads"):
+        raise ValueError(f"Unknown backend: '{plan['backend']}'")
+    # A configured shared pool is started by the first job that needs it
+    pool = ensure_worker_pool() if plan["backend"] == "processes" else None
+    if plan["backend"] == "processes" and pool is None and not HAS_JOBLIB:
+        plan = {"backend": "sequential", "n_jobs": 1, "chunk_size": M_test}
+
+    plan.pop("estimated_s", None)
+    plan["tuned"] = tuned
+    return plan
+
+
 def _classify_sequential(train_data, labels, test_data, N):
     """Sequential pixel processing with progress logging."""
     M_test = test_data.shape[0]
@@ -190,33 +297,107 @@ def _classify_sequential(train_data, labels, test_data, N):
     return class_test, class_yd, class_yr
 
 
-def _classify_parallel(train_data, labels, test_data, N, n_jobs, chunk_size):
-    """Parallel pixel processing via joblib multiprocessing."""
+def _classify_chunked(train_data, labels, test_data, N, backend, n_jobs, chunk_size,
+                     schedule="balanced", cost_model=None):
+    """Parallel pixel processing through a shared work queue.
+
+    Args:
+        backend: 'processes' (shared worker pool, or joblib) or 'threads'
+        chunk_size: maximum pixels per chunk
+        schedule: 'balanced' (cost-balanced, shrinking chunks) or 'fixed'
+        cost_model: per-pixel cost model from the tuning profile
+    Returns:
+        (class_labels, disturbance_years, recovery_years, schedule_summary)
+    """
+    M_test = test_data.shape[0]
+    pools = get_worker_pools() if backend == "processes" else []
+    costs = estimate_pixel_costs(test_data, cost_model) if schedule == "balanced" else None
+
+    if len(pools) > 1:
+        # NUMA mode: one contiguous, cost-proportional slice of pixels per node;
+        # the node's pinned workers unpickle (first-touch allocate) its chunks
+        return _finish_chunked(_run_per_node(
+            pools, train_data, labels, test_data, N, chunk_size, schedule, costs
+        ), schedule)
+
+    tasks = _build_tasks(train_data, labels, test_data, N, 0, M_test,
+                         n_jobs, chunk_size, schedule, costs)
+
+    if backend == "threads":
+        initializer, initargs = None, ()
+        if get_placement()["mode"] != "none":
+            slots = queue.Queue()
+            for cpus in plan_placement(n_jobs, "cores")[0][2]:
+                slots.put(cpus)
+            initializer, initargs = init_pinned_worker, (slots, False)
+        with ThreadPoolExecutor(max_workers=n_jobs, initializer=initializer,
+                                initargs=initargs) as executor:
+            outputs = run_work_queue(executor, timed_call, tasks, n_jobs)
+    elif pools:
+        # Warm, long-lived workers: no start-up or JIT cost per job
+        outputs = run_work_queue(pools[0][1], timed_call, tasks, pools[0][2])
+    else:
+        # joblib hands out one chunk at a time as workers free up
+        # verbose=10: one line per completed chunk
+        outputs = Parallel(
+            n_jobs=n_jobs,
+            verbose=10,
+            prefer="processes",
+            pre_dispatch="n_jobs",
+            batch_size=1,
+        )(
+            delayed(timed_call)(*task) for task in tasks
+        )
+
+    return _finish_chunked(outputs, schedule)
+
+
+def _build_tasks(train_data, labels, test_data, N, start, end, n_workers,
+                 chunk_size, schedule, costs):
+    """Chunk tasks for pixels [start, end)."""
+    if schedule == "balanced":
+        ranges = balanced_chunk_ranges(costs[start:end], n_workers, max_chunk_size=chunk_size)
+    else:
+        ranges = fixed_chunk_ranges(end - start, chunk_size)
+    # Slices get pickled as copies automatically for process workers
+    return [(_process_chunk, test_data[start + s:start + e], train_data, labels, N)
+            for s, e in ranges]
+
+
+def _run_per_node(pools, train_data, labels, test_data, N, chunk_size, schedule, costs):
+    """Run one work queue per NUMA node pool concurrently, results in pixel order."""
     M_test = test_data.shape[0]
-    n_chunks = (M_test + chunk_size - 1) // chunk_size
-
-    # Build chunk list (slices get pickled as copies automatically)
-    chunk_args = []
-    for i in range(0, M_test, chunk_size):
-        end = min(i + chunk_size, M_test)
-        chunk_args.append(test_data[i:end])
-
-    # Parallel execution
-    # verbose=10: one line per completed chunk
-    results_list = Parallel(
-        n_jobs=n_jobs,
-        verbose=10,
-        prefer="processes"
-    )(
-        delayed(_process_chunk)(chunk, train_data, labels, N)
-        for chunk in chunk_args
-    )
+    weights = np.array([count for _, _, count in pools], dtype=np.float64)
+    bounds = np.cumsum(weights) / weights.sum()
+
+    # Contiguous per-node slices of (estimated) equal cost per worker
+    if costs is not None:
+        cum = np.cumsum(costs)
+        cuts = [int(np.searchsorted(cum, b * cum[-1])) for b in bounds[:-1]]
+    else:
+        cuts = [int(b * M_test) for b in bounds[:-1]]
+    edges = [0] + cuts + [M_test]
+
+    def run_node(i):
+        _, executor, count = pools[i]
+        tasks = _build_tasks(train_data, labels, test_data, N, edges[i], edges[i + 1],
+                             count, chunk_size, schedule, costs)
+        return run_work_queue(executor, timed_call, tasks, count)
+
+    with ThreadPoolExecutor(max_workers=len(pools)) as dispatcher:
+        per_node = list(dispatcher.map(run_node, range(len(pools))))
+    return [out for outputs in per_node for out in outputs]
+
 
-    combined = np.vstack(results_list)
+def _finish_chunked(outputs, schedule):
+    combined = np.vstack([out[0] for out in outputs])
+    summary = summarize_timeline([out[1:] for out in outputs])
+    summary["schedule"] = schedule
     return (
         combined[:, 0].astype(int),
         combined[:, 1].astype(int),
         combined[:, 2].astype(int),
+        summary,
     )
 
 
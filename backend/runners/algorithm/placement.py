@@ -0,0 +1,180 @@
+"""
+CPU affinity and NUMA-aware placement of classification workers.
+
+On multi-socket hosts, unpinned workers migrate across sockets and all
+pixel data is allocated on the node of the process that read it. Placement
+modes (config.KNN_PLACEMENT):
+
+    none   - leave scheduling to the OS (default)
+    cores  - pin every worker process / thread to one core, spreading
+             workers evenly over the NUMA nodes
+    numa   - one worker pool per NUMA node, workers pinned to their node's
+             cores; the pixel matrix is split per node so each node's
+             workers unpickle (first-touch allocate) their chunks locally
+
+In every pinned worker, BLAS/OpenMP/Numba thread pools are capped to one
+thread to avoid oversubscribing the pinned cores.
+"""
+
+import os
+import glob
+import logging
+
+logger = logging.getLogger(__name__)
+
+PLACEMENT_MODES = ("none", "cores", "numa")
+
+_NODE_GLOB = "/sys/devices/system/node/node[0-9]*"
+
+# Environment variables read by the native thread pools at import time
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "NUMBA_NUM_THREADS",
+)
+
+
+def parse_cpulist(text):
+    """Parse a Linux cpulist string ("0-3,8,10-11") into a sorted list."""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return sorted(set(cpus))
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def numa_topology():
+    """NUMA nodes usable by this process.
+
+    Returns:
+        list of (node_id, [cpu, ...]) restricted to the current affinity mask;
+        a single pseudo-node when the host exposes no NUMA information.
+    """
+    allowed = set(available_cpus())
+    nodes = []
+    for path in sorted(glob.glob(_NODE_GLOB), key=lambda p: int(p.rsplit("node", 1)[1])):
+        try:
+            with open(os.path.join(path, "cpulist")) as f:
+                cpus = [c for c in parse_cpulist(f.read()) if c in allowed]
+        except OSError:
+            continue
+        if cpus:
+            nodes.append((int(path.rsplit("node", 1)[1]), cpus))
+    if not nodes:
+        nodes = [(0, sorted(allowed))]
+    return nodes
+
+
+def plan_placement(n_workers, mode):
+    """Assign CPUs to workers.
+
+    Args:
+        n_workers: total worker count
+        mode: 'none', 'cores' or 'numa'
+    Returns:
+        list of (node_id, n_workers, [cpuset per worker]) groups. 'none' and
+        'cores' return a single group; 'numa' one group per node with workers
+        split in proportion to the node's cores. cpuset is None for 'none'.
+    """
+    if mode not in PLACEMENT_MODES:
+        raise ValueError(f"Unknown placement mode: '{mode}'. Must be one of {PLACEMENT_MODES}")
+
+    if mode == "none":
+        return [(None, n_workers, [None] * n_workers)]
+
+    nodes = numa_topology()
+
+    if mode == "cores":
+        # Interleave nodes so consecutive workers land on different sockets
+        order = []
+        longest = max(len(cpus) for _, cpus in nodes)
+        for i in range(longest):
+            order.extend(cpus[i] for _, cpus in nodes if i < len(cpus))
+        return [(None, n_workers, [{order[i % len(order)]} for i in range(n_workers)])]
+
+    # numa: workers per node proportional to its core count (at least one each)
+    total_cpus = sum(len(cpus) for _, cpus in nodes)
+    nodes = nodes[:max(1, n_workers)]
+    counts = [max(1, round(n_workers * len(cpus) / total_cpus)) for _, cpus in nodes]
+    while sum(counts) > n_workers and max(counts) > 1:
+        counts[counts.index(max(counts))] -= 1
+    while sum(counts) < n_workers:
+        counts[counts.index(min(counts))] += 1
+
+    groups = []
+    for (node_id, cpus), count in zip(nodes, counts):
+        groups.append((node_id, count, [{cpus[i % len(cpus)]} for i in range(count)]))
+    return groups
+
+
+def limit_native_threads(n_threads=1):
+    """Cap BLAS/OpenMP/Numba thread pools inside a pinned worker.
+
+    Environment variables cover libraries not yet loaded; threadpoolctl
+    (optional) and numba.set_num_threads cover already-loaded ones.
+    """
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(n_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(n_threads)
+    except ImportError:
+        pass
+    try:
+        import numba
+        numba.set_num_threads(min(n_threads, numba.config.NUMBA_NUM_THREADS))
+    except Exception:
+        pass
+
+
+def pin_current(cpus):
+    """Pin the calling process/thread to cpus (no-op where unsupported)."""
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(0, cpus)
+        return True
+    except OSError as e:
+        logger.warning(f"CPU pinning to {sorted(cpus)} failed: {e}")
+        return False
+
+
+def init_pinned_worker(slot_queue, cap_threads=True):
+    """Executor initializer: take a CPU set from the queue, pin, cap threads.
+
+    cap_threads is False for thread workers, which share the caller's
+    process-wide native thread pools.
+    """
+    cpus = slot_queue.get()
+    if cpus:
+        pin_current(cpus)
+        if cap_threads:
+            limit_native_threads(1)
+
+
+def describe_placement(mode, groups):
+    """JSON-friendly placement summary for job profiles."""
+    return {
+        "mode": mode,
+        "groups": [
+            {
+                "numa_node": node_id,
+                "workers": count,
+                "cpus": [sorted(c) if c else None for c in cpusets],
+            }
+            for node_id, count, cpusets in groups
+        ],
+    }
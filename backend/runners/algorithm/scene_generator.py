@@ -0,0 +1,337 @@
+"""
+Synthetic NDVI / bare-coal scene generator for load testing.
+
+Python counterpart of generate_test_data.m, scaled up: writes georeferenced
+multi-band NDVI and coal GeoTIFFs of arbitrary size plus a ground-truth
+label raster. Every pixel follows one of the 49 creat_sample templates
+(with noise and NaN gaps); mining polygons switch their interior to
+disturbance behaviours and raise the bare-coal probability.
+
+The rasters are streamed window by window, so memory use is bounded by
+the window size, not the scene size (50k x 50k x 40 bands is fine).
+
+Usage:
+    python -m runners.algorithm.scene_generator out_dir --width 4096 --height 4096 --bands 20
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import numpy as np
+import rasterio
+from rasterio.features import rasterize
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+from .sample_generator import creat_sample
+
+logger = logging.getLogger(__name__)
+
+NUM_TEMPLATES = 49
+
+# Percentile bounds used to build the templates (ljpl() output of typical scenes)
+DEFAULT_BOUNDS = (0.15, 0.75)
+
+# Labels whose templates contain a disturbance drop (used inside mining polygons)
+DISTURBANCE_LABELS = tuple(range(1, 37))
+
+# Output file names match the upload layout (UPLOAD_DIR/<job_id>/ndvi.tif, coal.tif)
+NDVI_FILENAME = "ndvi.tif"
+COAL_FILENAME = "coal.tif"
+LABEL_FILENAME = "truth_labels.tif"
+META_FILENAME = "scene_meta.json"
+
+
+def parse_proportions(spec):
+    """Parse a proportion spec like "37:0.4,38-40:0.3,1-9:0.3" into 49 weights.
+
+    Labels not mentioned get weight 0. An empty/None spec means uniform.
+
+    Args:
+        spec: str, dict {label: weight}, or sequence of 49 weights
+    Returns:
+        (49,) float64 array normalised to sum 1
+    """
+    weights = np.zeros(NUM_TEMPLATES, dtype=np.float64)
+
+    if spec is None or (isinstance(spec, str) and not spec.strip()):
+        weights[:] = 1.0
+    elif isinstance(spec, str):
+        for item in spec.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            labels_part, weight_part = item.split(":")
+            if "-" in labels_part:
+                lo, hi = (int(v) for v in labels_part.split("-"))
+            else:
+                lo = hi = int(labels_part)
+            if lo < 1 or hi > NUM_TEMPLATES or lo > hi:
+                raise ValueError(f"Invalid label range: '{labels_part}'")
+            # A range shares its weight equally between its labels
+            weights[lo - 1:hi] += float(weight_part) / (hi - lo + 1)
+    elif isinstance(spec, dict):
+        for lbl, w in spec.items():
+            if not 1 <= int(lbl) <= NUM_TEMPLATES:
+                raise ValueError(f"Invalid label: {lbl}")
+            weights[int(lbl) - 1] += float(w)
+    else:
+        weights = np.asarray(spec, dtype=np.float64).copy()
+        if weights.shape != (NUM_TEMPLATES,):
+            raise ValueError(f"Expected {NUM_TEMPLATES} weights, got {weights.shape}")
+
+    if np.any(weights < 0) or weights.sum() <= 0:
+        raise ValueError("Proportions must be non-negative with a positive sum")
+    return weights / weights.sum()
+
+
+def make_mining_polygons(rng, width, height, n_polygons, mean_radius, n_vertices=12):
+    """Random star-shaped polygons in pixel coordinates.
+
+    Returns:
+        list of (n_vertices + 1, 2) arrays of (col, row) vertices (closed rings)
+    """
+    polygons = []
+    for _ in range(n_polygons):
+        cx = rng.uniform(0, width)
+        cy = rng.uniform(0, height)
+        radius = mean_radius * rng.uniform(0.5, 1.5)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, n_vertices))
+        radii = radius * rng.uniform(0.6, 1.0, n_vertices)
+        ring = np.column_stack([cx + radii * np.cos(angles), cy + radii * np.sin(angles)])
+        polygons.append(np.vstack([ring, ring[:1]]))
+    return polygons
+
+
+def synthesize_pixels(rng, labels, templates, noise=0.02, nan_fraction=0.0):
+    """Build NDVI time series for a batch of pixels.
+
+    Args:
+        rng: numpy Generator
+        labels: (n,) int array, template labels 1-49 (0 = empty, all NaN)
+        templates: (49, L) template matrix (creat_sample without label column)
+        noise: std of additive Gaussian noise
+        nan_fraction: probability that an individual sample is a NaN gap
+    Returns:
+        (n, L) float32 array
+    """
+    n = labels.shape[0]
+    L = templates.shape[1]
+    idx = np.clip(labels - 1, 0, NUM_TEMPLATES - 1)
+    values = templates[idx] + rng.normal(0.0, noise, size=(n, L))
+    # Keep values inside the open interval the runner treats as valid NDVI
+    np.clip(values, 0.01, 0.99, out=values)
+    if nan_fraction > 0:
+        values[rng.random((n, L)) < nan_fraction] = np.nan
+    values[labels == 0] = np.nan
+    return values.astype(np.float32)
+
+
+def _polygon_geojson(ring, transform):
+    xs, ys = transform * (ring[:, 0], ring[:, 1])
+    return {"type": "Polygon", "coordinates": [list(zip(xs.tolist(), ys.tolist()))]}
+
+
+def _iter_windows(width, height, block_size):
+    for row_off in range(0, height, block_size):
+        for col_off in range(0, width, block_size):
+            yield Window(col_off, row_off,
+                         min(block_size, width - col_off),
+                         min(block_size, height - row_off))
+
+
+def generate_scene(out_dir, width=1024, height=1024, n_bands=15, coal_bands=None,
+                   proportions=None, mining_proportions=None, noise=0.02,
+                   nan_fraction=0.02, empty_fraction=0.01, n_polygons=20,
+                   mining_radius=60.0, bounds=DEFAULT_BOUNDS, crs="EPSG:32649",
+                   origin=(500000.0, 4200000.0), pixel_size=30.0, block_size=256,
+                   compress="lzw", seed=0):
+    """Write a synthetic NDVI/coal scene and its ground truth to out_dir.
+
+    Args:
+        out_dir: output directory (created if missing)
+        width, height: raster size in pixels
+        n_bands: NDVI time series length
+        coal_bands: coal band count (default: n_bands)
+        proportions: template proportions outside mining polygons (see parse_proportions)
+        mining_proportions: template proportions inside polygons (default: labels 1-36)
+        noise: NDVI noise std
+        nan_fraction: per-sample NaN gap probability
+        empty_fraction: probability that a pixel is entirely NaN (label 0)
+        n_polygons: number of mining polygons
+        mining_radius: mean polygon radius in pixels
+        bounds: [low, high] NDVI levels for the templates
+        crs, origin, pixel_size: georeferencing (origin is the upper-left corner)
+        block_size: window/tile edge in pixels (multiple of 16)
+        compress: GeoTIFF compression (None for raw)
+        seed: random seed; output is deterministic for a given seed and block_size
+    Returns:
+        dict with output paths and realised label counts
+    """
+    if block_size % 16 != 0:
+        raise ValueError("block_size must be a multiple of 16")
+
+    os.makedirs(out_dir, exist_ok=True)
+    coal_bands = coal_bands or n_bands
+    bg_probs = parse_proportions(proportions)
+    if mining_proportions is None:
+        mining_proportions = {lbl: 1.0 for lbl in DISTURBANCE_LABELS}
+    mine_probs = parse_proportions(mining_proportions)
+    label_values = np.arange(1, NUM_TEMPLATES + 1)
+
+    templates = creat_sample(list(bounds), n_bands, 0.8, 0.6)[:, :n_bands]
+    transform = from_origin(origin[0], origin[1], pixel_size, pixel_size)
+
+    rng = np.random.default_rng(seed)
+    polygons = make_mining_polygons(rng, width, height, n_polygons, mining_radius)
+    poly_geoms = [_polygon_geojson(p, transform) for p in polygons]
+    if polygons:
+        poly_bbox = np.array([[p[:, 0].min(), p[:, 1].min(), p[:, 0].max(), p[:, 1].max()]
+                              for p in polygons])
+    else:
+        poly_bbox = np.zeros((0, 4))
+
+    base_profile = {
+        "driver": "GTiff",
+        "width": width,
+        "height": height,
+        "crs": crs,
+        "transform": transform,
+        "tiled": True,
+        "blockxsize": block_size,
+        "blockysize": block_size,
+        "BIGTIFF": "IF_SAFER",
+    }
+    if compress:
+        base_profile["compress"] = compress
+
+    paths = {
+        "ndvi": os.path.join(out_dir, NDVI_FILENAME),
+        "coal": os.path.join(out_dir, COAL_FILENAME),
+        "labels": os.path.join(out_dir, LABEL_FILENAME),
+    }
+    label_counts = np.zeros(NUM_TEMPLATES + 1, dtype=np.int64)
+    t0 = time.time()
+
+    with rasterio.open(paths["ndvi"], "w", count=n_bands, dtype="float32",
+                       nodata=np.nan, interleave="band", **base_profile) as ndvi_dst, \
+         rasterio.open(paths["coal"], "w", count=coal_bands, dtype="float32",
+                       interleave="band", **base_profile) as coal_dst, \
+         rasterio.open(paths["labels"], "w", count=1, dtype="uint8",
+                       nodata=0, **base_profile) as label_dst:
+
+        for window in _iter_windows(width, height, block_size):
+            row_off, col_off = int(window.row_off), int(window.col_off)
+            h, w = int(window.height), int(window.width)
+            n = h * w
+            wrng = np.random.default_rng([seed, row_off, col_off])
+
+            # Mining mask from the polygons overlapping this window
+            hit = ((poly_bbox[:, 2] >= col_off) & (poly_bbox[:, 0] <= col_off + w) &
+                   (poly_bbox[:, 3] >= row_off) & (poly_bbox[:, 1] <= row_off + h))
+            if np.any(hit):
+                inside = rasterize(
+                    [(poly_geoms[i], 1) for i in np.where(hit)[0]],
+                    out_shape=(h, w),
+                    transform=ndvi_dst.window_transform(window),
+                    fill=0,
+                    dtype="uint8",
+                ).ravel().astype(bool)
+            else:
+                inside = np.zeros(n, dtype=bool)
+
+            labels = wrng.choice(label_values, size=n, p=bg_probs)
+            n_inside = int(inside.sum())
+            if n_inside:
+                labels[inside] = wrng.choice(label_values, size=n_inside, p=mine_probs)
+            if empty_fraction > 0:
+                labels[wrng.random(n) < empty_fraction] = 0
+            label_counts += np.bincount(labels, minlength=NUM_TEMPLATES + 1)
+
+            ndvi = synthesize_pixels(wrng, labels, templates, noise, nan_fraction)
+            ndvi_dst.write(ndvi.T.reshape(n_bands, h, w), window=window)
+
+            coal = wrng.uniform(0.0, 0.3, size=(coal_bands, n)).astype(np.float32)
+            if n_inside:
+                coal[:, inside] = wrng.uniform(0.6, 1.0, size=(coal_bands, n_inside))
+            coal_dst.write(coal.reshape(coal_bands, h, w), window=window)
+
+            label_dst.write(labels.astype(np.uint8).reshape(1, h, w), window=window)
+
+    elapsed = time.time() - t0
+    meta = {
+        "width": width,
+        "height": height,
+        "n_bands": n_bands,
+        "coal_bands": coal_bands,
+        "crs": str(crs),
+        "pixel_size": pixel_size,
+        "seed": seed,
+        "block_size": block_size,
+        "noise": noise,
+        "nan_fraction": nan_fraction,
+        "empty_fraction": empty_fraction,
+        "n_polygons": n_polygons,
+        "bounds": list(bounds),
+        "label_counts": {str(i): int(c) for i, c in enumerate(label_counts) if c},
+        "elapsed_s": round(elapsed, 3),
+    }
+    with open(os.path.join(out_dir, META_FILENAME), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    logger.info(f"Scene generated: {width}x{height}x{n_bands} in {elapsed:.1f}s -> {out_dir}")
+    return {**paths, "meta": os.path.join(out_dir, META_FILENAME),
+            "label_counts": label_counts}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic NDVI/coal scene")
+    parser.add_argument("out_dir", help="output directory")
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=1024)
+    parser.add_argument("--bands", type=int, default=15, help="NDVI time series length")
+    parser.add_argument("--coal-bands", type=int, default=None)
+    parser.add_argument("--proportions", default=None,
+                        help='template proportions, e.g. "37:0.5,38-40:0.3,41-49:0.2"')
+    parser.add_argument("--mining-proportions", default=None,
+                        help="template proportions inside mining polygons (default 1-36)")
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--nan-fraction", type=float, default=0.02)
+    parser.add_argument("--empty-fraction", type=float, default=0.01)
+    parser.add_argument("--polygons", type=int, default=20)
+    parser.add_argument("--mining-radius", type=float, default=60.0)
+    parser.add_argument("--crs", default="EPSG:32649")
+    parser.add_argument("--pixel-size", type=float, default=30.0)
+    parser.add_argument("--block-size", type=int, default=256)
+    parser.add_argument("--compress", default="lzw", help='"none" to disable')
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    result = generate_scene(
+        args.out_dir,
+        width=args.width,
+        height=args.height,
+        n_bands=args.bands,
+        coal_bands=args.coal_bands,
+        proportions=args.proportions,
+        mining_proportions=args.mining_proportions,
+        noise=args.noise,
+        nan_fraction=args.nan_fraction,
+        empty_fraction=args.empty_fraction,
+        n_polygons=args.polygons,
+        mining_radius=args.mining_radius,
+        crs=args.crs,
+        pixel_size=args.pixel_size,
+        block_size=args.block_size,
+        compress=None if args.compress.lower() == "none" else args.compress,
+        seed=args.seed,
+    )
+    for key in ("ndvi", "coal", "labels", "meta"):
+        print(f"{key}: {result[key]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Cost-aware chunk scheduling for parallel KNN-DTW classification.
+
+Per-pixel cost in _process_pixel varies widely: all-NaN pixels return
+immediately, pixels with many NaN gaps produce short series, and complete
+series pay the full 49 x L^2 DTW cost. Fixed contiguous chunks therefore
+finish at very different times and leave workers idle at the tail.
+
+The scheduler:
+  1. estimates each pixel's cost from its valid-sample count,
+  2. cuts the pixel range into contiguous chunks of balanced *cost*, large
+     first and geometrically shrinking towards the end (guided
+     self-scheduling), so the tail is made of small chunks,
+  3. dispatches them through a shared work queue: a worker takes the next
+     chunk as soon as it finishes one, keeping only a bounded number of
+     chunks in flight.
+
+Workers time every chunk; summarize_timeline() turns those timings into
+makespan / tail-latency figures for job profiles and benchmarks.
+"""
+
+import os
+import time
+import threading
+import numpy as np
+from concurrent.futures import wait, FIRST_COMPLETED
+
+# Default per-pixel cost model (seconds): b + a * L * (valid + 1)
+# Overridden by the calibrated profile from autotune.py when available.
+DEFAULT_COST_A = 1e-7
+DEFAULT_COST_B = 2e-5
+# All-NaN pixels only pay the isnan() scan
+EMPTY_PIXEL_COST = 1e-6
+
+# Guided self-scheduling: each chunk takes remaining_cost / (GUIDED_FACTOR * workers)
+GUIDED_FACTOR = 2
+# Tail chunks never go below this share of the per-worker cost
+MIN_CHUNK_COST_FRACTION = 0.01
+# Chunks kept in flight per worker (1 running + prefetched)
+IN_FLIGHT_PER_WORKER = 2
+
+
+def estimate_pixel_costs(test_data, cost_model=None):
+    """Estimated processing cost (seconds) of each pixel.
+
+    Args:
+        test_data: (num_pixels, L) array, may contain NaN
+        cost_model: optional {"a": ..., "b": ...} from the tuning profile,
+            where the sequential per-pixel cost is a * L^2 + b
+    Returns:
+        (num_pixels,) float64 array
+    """
+    L = test_data.shape[1]
+    a = cost_model["a"] if cost_model else DEFAULT_COST_A
+    b = cost_model["b"] if cost_model else DEFAULT_COST_B
+
+    valid = L - np.count_nonzero(np.isnan(test_data), axis=1)
+    # DTW against each template is O(L * valid); BWlvbo extends the series by one
+    costs = b + a * L * (valid + 1)
+    costs[valid == 0] = EMPTY_PIXEL_COST
+    return costs.astype(np.float64)
+
+
+def fixed_chunk_ranges(n_pixels, chunk_size):
+    """Contiguous fixed-size chunks (the previous scheduling)."""
+    return [(i, min(i + chunk_size, n_pixels)) for i in range(0, n_pixels, chunk_size)]
+
+
+def balanced_chunk_ranges(costs, n_workers, max_chunk_size=None):
+    """Cut the pixel range into contiguous, cost-balanced, shrinking chunks.
+
+    Args:
+        costs: (num_pixels,) per-pixel cost estimates
+        n_workers: number of workers
+        max_chunk_size: optional cap on pixels per chunk (memory bound)
+    Returns:
+        list of (start, end) index ranges covering [0, num_pixels)
+    """
+    n = costs.shape[0]
+    if n == 0:
+        return []
+
+    cum = np.cumsum(costs)
+    total = cum[-1]
+    min_cost = total / max(n_workers, 1) * MIN_CHUNK_COST_FRACTION
+
+    ranges = []
+    start = 0
+    while start < n:
+        done = cum[start - 1] if start > 0 else 0.0
+        remaining = total - done
+        target = max(remaining / (GUIDED_FACTOR * max(n_workers, 1)), min_cost)
+        end = int(np.searchsorted(cum, done + target, side="left")) + 1
+        end = max(end, start + 1)
+        if max_chunk_size:
+            end = min(end, start + max_chunk_size)
+        end = min(end, n)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def run_work_queue(executor, fn, tasks, n_workers):
+    """Run fn(*task) for all tasks through a bounded shared queue.
+
+    Tasks are handed out in order; a new one is submitted whenever one
+    completes, so idle workers immediately take the next (smaller) chunk.
+
+    Returns:
+        list of results in task order
+    """
+    results = [None] * len(tasks)
+    max_in_flight = max(1, n_workers * IN_FLIGHT_PER_WORKER)
+    pending = {}
+    next_task = 0
+
+    while next_task < len(tasks) or pending:
+        while next_task < len(tasks) and len(pending) < max_in_flight:
+            future = executor.submit(fn, *tasks[next_task])
+            pending[future] = next_task
+            next_task += 1
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[pending.pop(future)] = future.result()
+    return results
+
+
+def timed_call(fn, *args):
+    """Run fn in a worker and return (result, start, end, worker_id)."""
+    t0 = time.time()
+    result = fn(*args)
+    return result, t0, time.time(), f"{os.getpid()}:{threading.get_ident()}"
+
+
+def summarize_timeline(timings):
+    """Makespan and tail latency from per-chunk (start, end, worker_id) timings.
+
+    tail_s is the time between the first worker running out of work and the
+    last one finishing, i.e. the idle tail the scheduler tries to minimise.
+    """
+    if not timings:
+        return {}
+    starts = np.array([t[0] for t in timings])
+    ends = np.array([t[1] for t in timings])
+    durations = ends - starts
+
+    finish_by_worker = {}
+    for _, end, worker in timings:
+        finish_by_worker[worker] = max(end, finish_by_worker.get(worker, end))
+    finishes = np.array(list(finish_by_worker.values()))
+
+    makespan = float(ends.max() - starts.min())
+    tail = float(finishes.max() - finishes.min())
+    return {
+        "n_chunks": len(timings),
+        "n_workers_used": len(finish_by_worker),
+        "makespan_s": round(makespan, 4),
+        "tail_s": round(tail, 4),
+        "tail_fraction": round(tail / makespan, 4) if makespan > 0 else 0.0,
+        "chunk_s_max": round(float(durations.max()), 4),
+        "chunk_s_median": round(float(np.median(durations)), 4),
+    }
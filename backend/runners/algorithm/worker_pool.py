@@ -0,0 +1,182 @@
+"""
+Long-lived classification worker pool.
+
+knn_classify used to spawn a fresh joblib pool per call, so every job paid
+for process start-up, numba/pywt imports and JIT cache loading in each
+worker. The application now owns one process pool, reused across jobs; each
+worker warms the DTW/BWlvbo kernels once in its initializer.
+
+The web app only records the pool configuration at start-up
+(configure_worker_pool); the pool is created by the first KNN job in the
+process (ensure_worker_pool). WSGI worker processes that never run a job
+therefore never start classification workers, and start-up does not wait
+for the warm-up. Each WSGI process that does run jobs owns its own pool, so
+N such processes start up to N * KNN_WORKER_POOL_SIZE workers.
+
+Workers are started through a forkserver (spawn on platforms without it)
+that preloads the algorithm modules, so they never inherit Flask/SQLAlchemy
+state from the web process and share the imported numba runtime.
+
+With a placement mode (see placement.py) workers are pinned to cores, and
+in 'numa' mode one pool is created per NUMA node.
+
+Usage:
+    from runners.algorithm.worker_pool import configure_worker_pool
+    configure_worker_pool(8)      # at application start-up (no processes yet)
+    knn_classify(...)             # starts the pool on first use and reuses it
+
+start_worker_pool(n) creates the pool immediately (benchmarks, tests).
+"""
+
+import os
+import atexit
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .placement import plan_placement, describe_placement, init_pinned_worker, THREAD_ENV_VARS
+
+logger = logging.getLogger(__name__)
+
+_PRELOAD_MODULES = ["runners.algorithm.knn_dtw"]
+
+# [(numa_node, executor, n_workers)]
+_pools = []
+_placement = {"mode": "none", "groups": []}
+_pool_lock = threading.Lock()
+# (n_workers, placement) recorded by configure_worker_pool, None = no shared pool
+_pool_config = None
+
+
+def _init_worker(slot_queue=None):
+    """Worker initializer: pin (if planned), then compile/load kernels
+    before the first chunk arrives."""
+    if slot_queue is not None:
+        init_pinned_worker(slot_queue)
+    from .knn_dtw import _warmup_numba
+    _warmup_numba()
+
+
+def _mp_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        # Preload only the algorithm package, never the web app's __main__
+        ctx.set_forkserver_preload(_PRELOAD_MODULES)
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def start_worker_pool(n_workers=None, placement="none"):
+    """Create the shared worker pool(s) (idempotent).
+
+    Args:
+        n_workers: total process count (None = all CPU cores)
+        placement: 'none', 'cores' or 'numa' (see placement.py)
+    Returns:
+        the first ProcessPoolExecutor, or None when called from a worker process
+    """
+    global _placement
+
+    # Spawned children re-import the entry module; never nest pools there
+    if multiprocessing.parent_process() is not None:
+        return None
+
+    with _pool_lock:
+        if _pools:
+            return _pools[0][1]
+
+        n_workers = n_workers or os.cpu_count() or 1
+        groups = plan_placement(n_workers, placement)
+        ctx = _mp_context()
+
+        if placement != "none":
+            # Inherited by the forkserver before it imports numpy/BLAS
+            for var in THREAD_ENV_VARS:
+                os.environ.setdefault(var, "1")
+
+        for node_id, count, cpusets in groups:
+            slot_queue = None
+            if placement != "none":
+                slot_queue = ctx.Queue()
+                for cpus in cpusets:
+                    slot_queue.put(cpus)
+            executor = ProcessPoolExecutor(
+                max_workers=count,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(slot_queue,),
+            )
+            _pools.append((node_id, executor, count))
+
+        # Start every worker now so warm-up happens off the request path
+        futures = [ex.submit(os.getpid) for _, ex, count in _pools for _ in range(count)]
+        for f in futures:
+            f.result()
+
+        _placement = describe_placement(placement, groups)
+        logger.info(f"KNN worker pool started: {n_workers} workers, placement={placement}, "
+                    f"{len(_pools)} pool(s)")
+        return _pools[0][1]
+
+
+def configure_worker_pool(n_workers=None, placement="none"):
+    """Record the pool configuration without starting any process; the pool
+    is created by the first ensure_worker_pool() call (i.e. the first job)."""
+    global _pool_config
+    _pool_config = (n_workers, placement)
+
+
+def ensure_worker_pool():
+    """Return the shared pool, starting the configured one on first use.
+
+    Returns None when no pool is configured (or inside a worker process).
+    """
+    if _pools:
+        return _pools[0][1]
+    if _pool_config is None:
+        return None
+    return start_worker_pool(*_pool_config)
+
+
+def get_worker_pool():
+    """Return the shared pool (first one in 'numa' mode), or None if the
+    application has not started one."""
+    return _pools[0][1] if _pools else None
+
+
+def get_worker_pools():
+    """All pools as [(numa_node, executor, n_workers)]."""
+    return list(_pools)
+
+
+def get_worker_pool_size():
+    return sum(count for _, _, count in _pools)
+
+
+def configured_worker_pool_size():
+    """Worker count the pool will start with (0 when none is configured)."""
+    if _pool_config is None:
+        return 0
+    return _pool_config[0] or os.cpu_count() or 1
+
+
+def get_placement():
+    """Placement summary of the running pool(s), for job profiles."""
+    return _placement
+
+
+def shutdown_worker_pool(wait=True):
+    """Stop the shared pool(s) (registered with atexit)."""
+    global _placement
+    with _pool_lock:
+        if not _pools:
+            return
+        for _, executor, _ in _pools:
+            executor.shutdown(wait=wait, cancel_futures=True)
+        _pools.clear()
+        _placement = {"mode": "none", "groups": []}
+        logger.info("KNN worker pool stopped")
+
+
+atexit.register(shutdown_worker_pool, wait=False)
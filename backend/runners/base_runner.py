@@ -27,5 +27,7 @@ class DetectionRunner(ABC):
                 mask, disturbance_year, recovery_year,
                 potential, res_type, year_disturb_raw, year_recovery_raw
             Each value is the full path to the output GeoTIFF.
+            Engines may add "profile": path to a job_profile.json
+            execution report.
         """
         pass
@@ -6,6 +6,7 @@ Produces identical 7 GeoTIFF output files as the MATLAB version.
 """
 
 import os
+import json
 import logging
 import numpy as np
 import rasterio
@@ -16,6 +17,7 @@ from .base_runner import DetectionRunner
 from .algorithm.utils import ljpl
 from .algorithm.sample_generator import creat_sample
 from .algorithm.knn_dtw import knn_classify
+from .algorithm.autotune import job_running, schedule_idle_calibration
 from .algorithm.geotiff_io import read_multiband_geotiff, write_singleband_geotiff
 
 logger = logging.getLogger(__name__)
@@ -69,6 +71,13 @@ class PythonRunner(DetectionRunner):
     """Detection runner using pure Python (NumPy/SciPy) algorithms."""
 
     def run_detect(self, ndvi_path, coal_path, out_dir, startyear):
+        with job_running():
+            result = self._run_detect(ndvi_path, coal_path, out_dir, startyear)
+        # Calibrate the KNN-DTW backends (if stale) now that the process is idle
+        schedule_idle_calibration()
+        return result
+
+    def _run_detect(self, ndvi_path, coal_path, out_dir, startyear):
         os.makedirs(out_dir, exist_ok=True)
         logger.info(f"Python engine: starting detection (startyear={startyear})")
 
@@ -80,6 +89,7 @@ class PythonRunner(DetectionRunner):
         out_res_type = os.path.join(out_dir, 'res_disturbance_type.tif')
         out_year_disturb = os.path.join(out_dir, 'year_disturbance_raw.tif')
         out_year_recovery = os.path.join(out_dir, 'year_recovery_raw.tif')
+        out_profile = os.path.join(out_dir, 'job_profile.json')
 
         # ====== Step 1: Load NDVI GeoTIFF ======
         logger.info("Step 1/7: Loading NDVI data")
@@ -121,7 +131,8 @@ class PythonRunner(DetectionRunner):
 
         # ====== Step 6: KNN classification with DTW ======
         logger.info("Step 4/7: Running KNN-DTW classification")
-        c, y1, y2 = knn_classify(train_data, sample_label, b_valid, k=1)
+        knn_stats = {}
+        c, y1, y2 = knn_classify(train_data, sample_label, b_valid, k=1, stats=knn_stats)
 
         # ====== Step 7: Restore full pixel grid ======
         logger.info("Step 5/7: Restoring spatial grid")
@@ -218,6 +229,10 @@ class PythonRunner(DetectionRunner):
         write_singleband_geotiff(out_year_disturb, yeardisturbance.astype(np.float64), ndvi_profile)
         write_singleband_geotiff(out_year_recovery, yearrecovery.astype(np.float64), ndvi_profile)
 
+        # Execution profile (backend, chunking, throughput) for diagnostics
+        with open(out_profile, 'w') as f:
+            json.dump({"engine": "python", "shape": [m, n, l], "knn": knn_stats}, f, indent=2)
+
         logger.info("Python engine: detection complete")
 
         return {
@@ -228,4 +243,5 @@ class PythonRunner(DetectionRunner):
             "res_type": out_res_type,
             "year_disturb_raw": out_year_disturb,
             "year_recovery_raw": out_year_recovery,
+            "profile": out_profile,
         }
@@ -1,8 +1,9 @@
 """地理空间处理服务 — 从 app.py 抽取"""
 import logging
 import numpy as np
-import rasterio
-from pyproj import Transformer
+from rasterio.windows import Window
+from services.raster_pool import open_dataset, get_transformer
+from services.timeseries_store import get_timeseries_store
 
 logger = logging.getLogger(__name__)
 
@@ -10,7 +11,7 @@ logger = logging.getLogger(__name__)
 def get_crs_info(geotiff_path):
     """提取 GeoTIFF 的坐标系信息用于前端显示"""
     try:
-        with rasterio.open(geotiff_path) as ds:
+        with open_dataset(geotiff_path) as ds:
             if ds.crs is None:
                 return {"valid": False, "warning": "GeoTIFF 缺少坐标系元数据"}
 
@@ -48,11 +49,11 @@ def get_crs_info(geotiff_path):
 def get_geotiff_bounds(geotiff_path):
     """获取 GeoTIFF 的地理边界 (EPSG:4326)"""
     try:
-        with rasterio.open(geotiff_path) as ds:
+        with open_dataset(geotiff_path) as ds:
             bounds = ds.bounds
             src_crs = ds.crs
 
-            if src_crs is None or src_crs.to_string() == "EPSG:4326":
+            if src_crs is None or ds.crs_string == "EPSG:4326":
                 return {
                     "west": bounds.left,
                     "south": bounds.bottom,
@@ -60,7 +61,7 @@ def get_geotiff_bounds(geotiff_path):
                     "north": bounds.top,
                 }
             else:
-                tfm = Transformer.from_crs(src_crs, "EPSG:4326", always_xy=True)
+                tfm = get_transformer(ds.crs_string, "EPSG:4326")
                 west, south = tfm.transform(bounds.left, bounds.bottom)
                 east, north = tfm.transform(bounds.right, bounds.top)
                 return {"west": west, "south": south, "east": east, "north": north}
@@ -69,26 +70,43 @@ def get_geotiff_bounds(geotiff_path):
         return None
 
 
-def sample_timeseries(geotiff_path, lon, lat):
-    """从 GeoTIFF 中采样时间序列数据"""
-    with rasterio.open(geotiff_path) as ds:
-        src_crs = ds.crs
-        if src_crs is None:
-            raise ValueError("GeoTIFF 没有 CRS 信息")
+def _pixel_index(ds, lon, lat):
+    """经纬度 → 池化数据集的 (row, col)；超出范围返回 None"""
+    if ds.crs is None:
+        raise ValueError("GeoTIFF 没有 CRS 信息")
 
-        if src_crs.to_string() != "EPSG:4326":
-            tfm = Transformer.from_crs("EPSG:4326", src_crs, always_xy=True)
-            x, y = tfm.transform(lon, lat)
-        else:
-            x, y = lon, lat
+    if ds.crs_string != "EPSG:4326":
+        tfm = get_transformer("EPSG:4326", ds.crs_string)
+        x, y = tfm.transform(lon, lat)
+    else:
+        x, y = lon, lat
+
+    row, col = ds.index(x, y)
+    if row < 0 or row >= ds.height or col < 0 or col >= ds.width:
+        return None
+    return row, col
 
-        row, col = ds.index(x, y)
 
-        if row < 0 or row >= ds.height or col < 0 or col >= ds.width:
+def _read_pixel(ds, row, col, indexes=None):
+    """只读取 (row, col) 处 1×1 窗口的各波段值，shape (波段数,)
+
+    GDAL 只解码该像元所在的内部块，耗时与文件大小无关。
+    """
+    return ds.read(indexes, window=Window(col, row, 1, 1)).reshape(-1)
+
+
+def sample_timeseries(geotiff_path, lon, lat):
+    """从 GeoTIFF 中采样时间序列数据"""
+    with open_dataset(geotiff_path) as ds:
+        pixel = _pixel_index(ds, lon, lat)
+        if pixel is None:
             raise ValueError(f"坐标 ({lon}, {lat}) 超出数据范围")
 
-        arr = ds.read()
-        vals = arr[:, row, col].astype("float64")
+        store = get_timeseries_store(geotiff_path)
+        if store is not None:
+            vals = store.pixel(*pixel).astype("float64")
+        else:
+            vals = _read_pixel(ds, *pixel).astype("float64")
 
         nodata = ds.nodata
         if nodata is not None:
@@ -108,23 +126,12 @@ def sample_timeseries(geotiff_path, lon, lat):
 def sample_singleband(geotiff_path, lon, lat):
     """从单波段 GeoTIFF 中采样"""
     try:
-        with rasterio.open(geotiff_path) as ds:
-            src_crs = ds.crs
-            if src_crs is None:
-                raise ValueError("GeoTIFF 没有 CRS 信息")
-
-            if src_crs.to_string() != "EPSG:4326":
-                tfm = Transformer.from_crs("EPSG:4326", src_crs, always_xy=True)
-                x, y = tfm.transform(lon, lat)
-            else:
-                x, y = lon, lat
-
-            row, col = ds.index(x, y)
-
-            if row < 0 or row >= ds.height or col < 0 or col >= ds.width:
+        with open_dataset(geotiff_path) as ds:
+            pixel = _pixel_index(ds, lon, lat)
+            if pixel is None:
                 return None
 
-            val = ds.read(1)[row, col].item()
+            val = _read_pixel(ds, *pixel, indexes=1)[0].item()
             nodata = ds.nodata
             if nodata is not None and val == nodata:
                 return None
@@ -136,6 +143,65 @@ def sample_singleband(geotiff_path, lon, lat):
         return None
 
 
+def _read_pixels_by_block(ds, rows, cols, indexes):
+    """按内部块分组读取多个像元，shape (点数, 波段数)"""
+    out = np.empty((len(rows), len(indexes)), dtype=ds.dtypes[0])
+    block_h, block_w = ds.block_shapes[0]
+    block_ids = (rows // block_h) * (-(-ds.width // block_w)) + cols // block_w
+    order = np.argsort(block_ids, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(block_ids[order]) != 0])
+    for group in np.split(order, starts[1:]) if len(order) else []:
+        row0 = rows[group[0]] // block_h * block_h
+        col0 = cols[group[0]] // block_w * block_w
+        window = Window(col0, row0, min(block_w, ds.width - col0), min(block_h, ds.height - row0))
+        block = ds.read(indexes, window=window)
+        out[group] = block[:, rows[group] - row0, cols[group] - col0].T
+    return out
+
+
+def sample_points(geotiff_path, lons, lats, indexes=None):
+    """批量采样多个点的各波段值
+
+    全部点一次向量化投影到栅格坐标系。有像元优先存储（timeseries_store.py）
+    时直接按像元读取序列；否则按所在内部块分组，每个块（跨所需全部波段）
+    只读取一次。
+
+    返回 (values, inside)：values 为 (点数, 波段数) float64，nodata 与
+    超出范围的点为 NaN；inside 标记点是否落在栅格内。
+    """
+    lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+    lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+    with open_dataset(geotiff_path) as ds:
+        if ds.crs is None:
+            raise ValueError("GeoTIFF 没有 CRS 信息")
+        if indexes is None:
+            indexes = list(range(1, ds.count + 1))
+
+        if ds.crs_string != "EPSG:4326":
+            tfm = get_transformer("EPSG:4326", ds.crs_string)
+            xs, ys = tfm.transform(lons, lats)
+        else:
+            xs, ys = lons, lats
+        inv = ~ds.transform
+        with np.errstate(invalid="ignore"):
+            cols = np.floor(inv.a * xs + inv.b * ys + inv.c)
+            rows = np.floor(inv.d * xs + inv.e * ys + inv.f)
+        inside = (rows >= 0) & (rows < ds.height) & (cols >= 0) & (cols < ds.width)
+
+        values = np.full((len(lons), len(indexes)), np.nan)
+        idx = np.flatnonzero(inside)
+        rows, cols = rows[idx].astype(np.int64), cols[idx].astype(np.int64)
+        store = get_timeseries_store(geotiff_path)
+        if store is not None:
+            values[idx] = store.pixels(rows, cols)[:, np.asarray(indexes) - 1]
+        else:
+            values[idx] = _read_pixels_by_block(ds, rows, cols, indexes)
+
+        if ds.nodata is not None:
+            values[values == ds.nodata] = np.nan
+        return values, inside
+
+
 def format_file_size(size_bytes):
     """格式化文件大小"""
     for unit in ["B", "KB", "MB", "GB"]:
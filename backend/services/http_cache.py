@@ -0,0 +1,37 @@
+"""HTTP 缓存 — ETag、Cache-Control 与条件请求
+
+ETag 由内容的决定因素生成（任务 ID、图层、输出文件 mtime、瓦片坐标、
+格式），各工作进程对同一内容得到相同的 ETag，无需读取或渲染内容即可
+回答 If-None-Match（304）。
+"""
+import hashlib
+from flask import Response, request
+
+# 未完成（或可能被重新运行）的内容：浏览器每次按 ETag 重新验证
+REVALIDATE = "no-cache"
+
+
+def make_etag(*parts):
+    return hashlib.blake2b("/".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+
+
+def immutable(max_age):
+    """长期缓存策略；max_age 为 0 时退化为重新验证"""
+    if max_age <= 0:
+        return REVALIDATE
+    return f"public, max-age={max_age}, immutable"
+
+
+def is_not_modified(etag):
+    """请求的 If-None-Match 是否命中 etag"""
+    return request.if_none_match.contains(etag)
+
+
+def with_cache_headers(response, etag, cache_control):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def not_modified(etag, cache_control):
+    return with_cache_headers(Response(status=304), etag, cache_control)
@@ -0,0 +1,83 @@
+"""任务完成后的后台处理
+
+run_job 在任务完成后调用 schedule_job_postprocess(job_id)，各处理步骤在
+后台线程中按顺序执行，不阻塞检测接口的响应。同一时间只处理一个任务，
+后续任务排队；某一步失败只记录日志，不影响其他步骤。
+
+上传 NDVI 后 upload 调用 schedule_upload_postprocess(job_id)，在独立的
+后台线程中生成像元优先的时间序列存储，不排在其他任务的金字塔等
+后处理之后。
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (
+    TILE_PYRAMID_ENABLED, MERCATOR_RASTERS_ENABLED, TILE_COVERAGE_ENABLED, VECTOR_TILES_ENABLED,
+    GEOJSON_ARTIFACTS_ENABLED, TIMESERIES_STORE_ENABLED,
+)
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-postprocess")
+_upload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-postprocess")
+
+
+def _steps():
+    steps = []
+    # 覆盖索引与预投影栅格在前，金字塔跳过空瓦片并从预投影栅格渲染原生级别
+    if TILE_COVERAGE_ENABLED:
+        from services.tile_coverage import build_tile_coverage
+        steps.append(("瓦片覆盖索引", build_tile_coverage))
+    if MERCATOR_RASTERS_ENABLED:
+        from services.mercator_raster import build_job_mercator_rasters
+        steps.append(("Web Mercator 栅格", build_job_mercator_rasters))
+    if TILE_PYRAMID_ENABLED:
+        from services.tile_pyramid import build_tile_pyramid
+        steps.append(("瓦片金字塔", build_tile_pyramid))
+    # 矢量瓦片与 GeoJSON 结果文件共用多级多边形
+    if VECTOR_TILES_ENABLED or GEOJSON_ARTIFACTS_ENABLED:
+        from services.vector_tiles import build_job_polygons
+        steps.append(("多边形化", build_job_polygons))
+    if VECTOR_TILES_ENABLED:
+        from services.vector_tiles import build_job_vector_indexes
+        steps.append(("矢量瓦片索引", build_job_vector_indexes))
+    if GEOJSON_ARTIFACTS_ENABLED:
+        from services.result_geojson import build_job_geojson_artifacts
+        steps.append(("GeoJSON 结果文件", build_job_geojson_artifacts))
+    return steps
+
+
+def _upload_steps():
+    steps = []
+    if TIMESERIES_STORE_ENABLED:
+        from services.timeseries_store import build_upload_timeseries_store
+        steps.append(("时间序列存储", build_upload_timeseries_store))
+    return steps
+
+
+def _run_steps(job_id, steps):
+    for name, step in steps:
+        try:
+            step(job_id)
+        except Exception as e:
+            logger.error(f"任务后处理失败 ({name}): job_id={job_id}, {str(e)}")
+
+
+def run_job_postprocess(job_id):
+    """依次执行全部后处理步骤（在调用线程中）"""
+    _run_steps(job_id, _steps())
+
+
+def schedule_job_postprocess(job_id):
+    """提交任务后处理到后台线程，返回 Future"""
+    return _executor.submit(run_job_postprocess, job_id)
+
+
+def run_upload_postprocess(job_id):
+    """依次执行上传后处理步骤（在调用线程中）"""
+    _run_steps(job_id, _upload_steps())
+
+
+def schedule_upload_postprocess(job_id):
+    """提交上传后处理到上传后处理线程，返回 Future"""
+    return _upload_executor.submit(run_upload_postprocess, job_id)
@@ -0,0 +1,206 @@
+"""Web Mercator 预投影结果栅格 — 瓦片渲染只需窗口读取 + 配色
+
+render_tile 每次未命中缓存都要 calculate_default_transform 并把窗口重投影到
+EPSG:3857，而结果栅格生成后不会再变化。任务完成后为每个图层生成一份
+EPSG:3857 副本 (JOB_DIR/<job_id>/web/<图层文件>)：
+
+- 分辨率取原生分辨率对应的缩放级别 native_zoom（瓦片像元不大于源像元）
+- 网格原点与范围对齐到 base_zoom 级的瓦片边界（base_zoom 为数据范围
+  不超过 2x2 个瓦片的最大级别），因此 base_zoom 及以上每个瓦片都恰好
+  对应网格中整块对齐的窗口，要么完全在网格内，要么完全在网格外
+- 最近邻重采样，逐瓦片写入（空白块不落盘）
+- 像元直接存储配色查找表索引（uint8/uint16，0 = 透明），渲染只需一次查表
+
+副本只服务 native_zoom 级瓦片：读取与网格整块对齐的窗口即得到瓦片，与直接
+最近邻重投影到瓦片网格的结果逐像元一致。其他级别的瓦片像元中心与
+native_zoom 像元中心不重合，从副本抽稀（概览）或放大得到的像元与在瓦片
+像元中心直接采样源栅格的结果不同（低缩放级别约 10%~20% 的像元），因此
+仍走动态重投影。
+
+副本比源文件旧（任务重新运行）时不使用，直到重新生成。
+"""
+import os
+import math
+import logging
+from functools import lru_cache
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+from rasterio.transform import Affine
+from rasterio.warp import calculate_default_transform, reproject
+from rasterio.enums import Resampling
+
+from config import JOB_DIR
+from services.tile_service import (
+    LAYER_FILES, TILE_SIZE, ORIGIN_SHIFT, WEB_MERCATOR, WEB_MERCATOR_CRS,
+    layer_lut, lut_index_dtype, to_lut_index,
+)
+from services.raster_pool import open_dataset, cached_transform_bounds
+
+logger = logging.getLogger(__name__)
+
+MERCATOR_DIRNAME = "web"
+# 写入时每次重投影的目标窗口边长（像元）；与瓦片同大小时 native_zoom 级
+# 瓦片与逐瓦片重投影逐像元一致（GDAL 近似变换的误差与目标窗口范围有关）
+WRITE_BLOCK = TILE_SIZE
+# base_zoom 级数据范围最多跨越的瓦片数（每个方向）
+BASE_TILES = 2
+
+_FILE_LAYERS = {filename: layer for layer, filename in LAYER_FILES.items()}
+
+
+def mercator_path(tif_path):
+    return os.path.join(os.path.dirname(tif_path), MERCATOR_DIRNAME, os.path.basename(tif_path))
+
+
+def zoom_resolution(z):
+    return 2 * ORIGIN_SHIFT / (TILE_SIZE * 2 ** z)
+
+
+def _tile_index(v, z, axis):
+    span = 2 * ORIGIN_SHIFT / 2 ** z
+    i = (v + ORIGIN_SHIFT) / span if axis == "x" else (ORIGIN_SHIFT - v) / span
+    return min(max(int(math.floor(i)), 0), 2 ** z - 1)
+
+
+def plan_grid(src):
+    """计算对齐网格：native_zoom、base_zoom 及 base_zoom 级的起止瓦片"""
+    res = calculate_default_transform(src.crs, WEB_MERCATOR_CRS, src.width, src.height, *src.bounds)[0].a
+    native_zoom = max(0, int(math.ceil(math.log2(2 * ORIGIN_SHIFT / (TILE_SIZE * res)))))
+
+    minx, miny, maxx, maxy = cached_transform_bounds(src.crs_string, WEB_MERCATOR, *src.bounds)
+    base_zoom = 0
+    for z in range(native_zoom, -1, -1):
+        nx = _tile_index(maxx, z, "x") - _tile_index(minx, z, "x") + 1
+        ny = _tile_index(miny, z, "y") - _tile_index(maxy, z, "y") + 1
+        if nx <= BASE_TILES and ny <= BASE_TILES:
+            base_zoom = z
+            break
+
+    x0, x1 = _tile_index(minx, base_zoom, "x"), _tile_index(maxx, base_zoom, "x")
+    y0, y1 = _tile_index(maxy, base_zoom, "y"), _tile_index(miny, base_zoom, "y")
+    return {
+        "native_zoom": native_zoom,
+        "base_zoom": base_zoom,
+        "tiles": (x0, y0, x1, y1),
+        "data_bounds": (minx, miny, maxx, maxy),
+    }
+
+
+def build_mercator_raster(tif_path, out_path=None):
+    """生成 tif_path 的对齐 EPSG:3857 副本（像元为查找表索引），返回输出路径"""
+    layer_name = _FILE_LAYERS[os.path.basename(tif_path)]
+    _, lut_scale = layer_lut(tif_path, layer_name)
+    out_path = out_path or mercator_path(tif_path)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = out_path + ".tmp.tif"
+
+    with open_dataset(tif_path) as src:
+        grid = plan_grid(src)
+        native_zoom, base_zoom = grid["native_zoom"], grid["base_zoom"]
+        x0, y0, x1, y1 = grid["tiles"]
+        scale = 2 ** (native_zoom - base_zoom)
+        res = zoom_resolution(native_zoom)
+        span = TILE_SIZE * scale
+        width, height = (x1 - x0 + 1) * span, (y1 - y0 + 1) * span
+        transform = Affine(res, 0, -ORIGIN_SHIFT + x0 * span * res,
+                           0, -res, ORIGIN_SHIFT - y0 * span * res)
+
+        profile = {
+            "driver": "GTiff", "width": width, "height": height, "count": 1,
+            "dtype": lut_index_dtype(layer_name), "nodata": 0, "crs": WEB_MERCATOR_CRS,
+            "transform": transform, "tiled": True, "blockxsize": TILE_SIZE,
+            "blockysize": TILE_SIZE, "compress": "deflate", "sparse_ok": True,
+        }
+        minx, miny, maxx, maxy = grid["data_bounds"]
+        with rasterio.open(tmp_path, "w", **profile) as dst:
+            dst.update_tags(LAYER=layer_name, NATIVE_ZOOM=native_zoom, BASE_ZOOM=base_zoom,
+                            BASE_X=x0, BASE_Y=y0)
+            for row in range(0, height, WRITE_BLOCK):
+                for col in range(0, width, WRITE_BLOCK):
+                    win = Window(col, row, min(WRITE_BLOCK, width - col), min(WRITE_BLOCK, height - row))
+                    wl, wt = transform * (col, row)
+                    wr, wb = transform * (col + win.width, row + win.height)
+                    # 与数据范围不相交的块保持稀疏（不写入）
+                    if wr < minx or wl > maxx or wb > maxy or wt < miny:
+                        continue
+                    block = np.zeros((int(win.height), int(win.width)), dtype=src.dtypes[0])
+                    reproject(
+                        source=rasterio.band(src.dataset, 1),
+                        destination=block,
+                        dst_transform=dst.window_transform(win),
+                        dst_crs=WEB_MERCATOR_CRS,
+                        resampling=Resampling.nearest,
+                    )
+                    index = to_lut_index(block, layer_name, src.nodata, lut_scale)
+                    if index.any():
+                        dst.write(index, 1, window=win)
+
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def build_job_mercator_rasters(job_id):
+    """任务完成后处理步骤：为全部瓦片图层生成 EPSG:3857 副本"""
+    built = []
+    for filename in LAYER_FILES.values():
+        tif_path = os.path.join(JOB_DIR, job_id, filename)
+        if os.path.exists(tif_path):
+            built.append(build_mercator_raster(tif_path))
+    logger.info(f"Web Mercator 栅格生成完成: job_id={job_id}, {len(built)}个图层")
+    return built
+
+
+@lru_cache(maxsize=256)
+def _grid_tags(path, mtime_ns):
+    with open_dataset(path) as ds:
+        tags = ds.tags()
+    return int(tags["NATIVE_ZOOM"]), int(tags["BASE_ZOOM"]), int(tags["BASE_X"]), int(tags["BASE_Y"])
+
+
+def read_mercator_tile(tif_path, z, x, y):
+    """从预投影副本读取瓦片的查找表索引。
+
+    Returns:
+        (handled, index)：handled 为 False 表示没有可用副本或 z 不是
+        native_zoom，需要动态重投影；index 为 None 表示瓦片与数据不相交。
+    """
+    return read_mercator_block(tif_path, z, x, y, 1)
+
+
+def read_mercator_block(tif_path, z, x0, y0, n):
+    """一次读取以 (x0, y0) 为左上角的 n×n 瓦片块（x0、y0 为 n 的倍数）。
+
+    Returns:
+        (handled, index)：index 为 (n*256, n*256) 数组，与数据不相交时为 None
+    """
+    path = mercator_path(tif_path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return False, None
+    if mtime < os.stat(tif_path).st_mtime_ns:
+        return False, None
+
+    native_zoom, base_zoom, bx, by = _grid_tags(path, mtime)
+    if z != native_zoom:
+        return False, None
+
+    # 瓦片块在网格中的像元窗口（网格原点为 base_zoom 级瓦片 (bx, by) 的左上角）
+    size = TILE_SIZE * n
+    col0 = (x0 - (bx << (native_zoom - base_zoom))) * TILE_SIZE
+    row0 = (y0 - (by << (native_zoom - base_zoom))) * TILE_SIZE
+
+    with open_dataset(path) as ds:
+        c0, c1 = max(col0, 0), min(col0 + size, ds.width)
+        r0, r1 = max(row0, 0), min(row0 + size, ds.height)
+        if c0 >= c1 or r0 >= r1:
+            return True, None
+        part = ds.read(1, window=Window(c0, r0, c1 - c0, r1 - r0))
+
+    if part.shape == (size, size):
+        return True, part
+    block = np.zeros((size, size), dtype=part.dtype)
+    block[r0 - row0:r1 - row0, c0 - col0:c1 - col0] = part
+    return True, block
@@ -0,0 +1,109 @@
+"""Mapbox Vector Tile (MVT 2.1) 编码 — 手写的最小 protobuf 编码器
+
+只实现多边形要素所需的部分：
+
+    Tile    { repeated Layer layers = 3; }
+    Layer   { uint32 version = 15; string name = 1; repeated Feature features = 2;
+              repeated string keys = 3; repeated Value values = 4; uint32 extent = 5; }
+    Feature { uint64 id = 1; repeated uint32 tags = 2 [packed];
+              GeomType type = 3; repeated uint32 geometry = 4 [packed]; }
+    Value   { string string_value = 1; double double_value = 3;
+              int64 int_value = 4; bool bool_value = 7; }
+
+几何为瓦片坐标（原点左上，y 向下）的整数环，外环顺时针（面积为正），
+内环逆时针，环不含重复的闭合点。
+"""
+import struct
+
+POLYGON = 3
+
+_MOVE_TO, _LINE_TO, _CLOSE_PATH = 1, 2, 7
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _length_delimited(field, payload):
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _packed(field, values):
+    return _length_delimited(field, b"".join(_varint(v) for v in values))
+
+
+def _command(cmd, count):
+    return (cmd & 0x7) | (count << 3)
+
+
+def encode_polygon(rings):
+    """环列表 [[(x, y), ...], ...] → geometry 命令序列"""
+    geometry = []
+    cx = cy = 0
+    for ring in rings:
+        x, y = ring[0]
+        geometry += [_command(_MOVE_TO, 1), _zigzag(x - cx), _zigzag(y - cy)]
+        cx, cy = x, y
+        geometry.append(_command(_LINE_TO, len(ring) - 1))
+        for x, y in ring[1:]:
+            geometry += [_zigzag(x - cx), _zigzag(y - cy)]
+            cx, cy = x, y
+        geometry.append(_command(_CLOSE_PATH, 1))
+    return geometry
+
+
+def _encode_value(value):
+    if isinstance(value, bool):
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, int):
+        return _key(4, 0) + _varint(value & 0xFFFFFFFFFFFFFFFF)
+    if isinstance(value, float):
+        return _key(3, 1) + struct.pack("<d", value)
+    return _length_delimited(1, str(value).encode("utf-8"))
+
+
+def encode_layer(name, features, extent=4096):
+    """编码一个图层。
+
+    Args:
+        features: [(feature_id, properties_dict, rings)]，rings 见 encode_polygon
+    """
+    keys, values = {}, {}
+    body = [_key(15, 0) + _varint(2), _length_delimited(1, name.encode("utf-8"))]
+    for feature_id, properties, rings in features:
+        tags = []
+        for k, v in properties.items():
+            tags.append(keys.setdefault(k, len(keys)))
+            tags.append(values.setdefault((type(v), v), len(values)))
+        payload = (
+            _key(1, 0) + _varint(feature_id)
+            + _packed(2, tags)
+            + _key(3, 0) + _varint(POLYGON)
+            + _packed(4, encode_polygon(rings))
+        )
+        body.append(_length_delimited(2, payload))
+    body += [_length_delimited(3, k.encode("utf-8")) for k in keys]
+    body += [_length_delimited(4, _encode_value(v)) for _, v in values]
+    body.append(_key(5, 0) + _varint(extent))
+    return b"".join(body)
+
+
+def encode_tile(layers):
+    """[(name, features, extent)] → MVT 字节；没有要素的图层不输出"""
+    return b"".join(
+        _length_delimited(3, encode_layer(name, features, extent))
+        for name, features, extent in layers if features
+    )
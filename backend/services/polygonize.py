@@ -0,0 +1,555 @@
+"""结果栅格多边形化 — 分块并行 + 多级简化
+
+rasterio.features.shapes 单线程处理整幅栅格，输出全分辨率的像元阶梯。
+本模块把多边形化拆成互不相交的任务在进程池中执行，并一次生成多个
+简化级别：
+
+分块
+    按 POLYGONIZE_TILE_SIZE 见方的窗口分块读取结果栅格，在进程池中逐窗口
+    做 4 连通标记；相邻窗口接缝两侧同为有效像元的标记用并查集
+    （scipy.sparse.csgraph.connected_components）合并为全局连通区，
+    常驻内存只有每个连通区的外包框与一个种子像元，不再整幅读入栅格
+    或保存全局标记数组。每个连通区按外包框左上角归入一个分块；任务
+    窗口扩展到完整覆盖其中的连通区，由工作进程自行读取窗口、重新标记
+    并按种子像元选出属于本任务的像元。同值区域必然位于同一连通区内，
+    每个多边形都在一个任务中完整生成，不存在接缝，级别 0 与整幅 shapes
+    的几何完全相同。限制：横跨整幅栅格的单个连通区仍需一个覆盖其外包框
+    的任务窗口（shapes 需要完整的连通区）。
+
+多级简化（共享边一致）
+    环顶点位于像元角点网格上。周围 2x2 像元含三种以上取值（或呈对角
+    棋盘状）的角点是“结点”；环在结点处切分为弧段，相邻两个多边形的
+    共享边界是同一条弧。每条弧按规范方向做一次 Douglas-Peucker，记录
+    各顶点的显著度（不超过其父分割点），级别 k 保留显著度大于
+    2^(k-1) 像元的顶点。共享弧两侧得到完全相同的简化结果，相邻多边形
+    之间不会因两侧各自简化而产生缝隙；退化的环在该级别丢弃。外包框
+    边长不超过容差的环（绝大多数是零星像元）直接丢弃，不参与简化。
+
+有效性
+    逐弧简化并不保持拓扑：简化后的弧可能与同一多边形的其他弧交叉，
+    环的方向可能翻转，洞可能移出外环。每个多边形的每个简化级别都做
+    有效性检查（安装 shapely 时用 shapely.is_valid，否则用 numpy 检查
+    边交叉、共线重叠、环内顶点落在边上、环方向与洞的位置），无效时
+    该多边形在该级别改用上一级别（简化更少）的几何；这样的多边形与
+    相邻多边形的共享边在该级别不再逐点一致。
+
+级别 0 为原始几何；级别 k 约对应比原生缩放级别低 k 级的显示。
+
+结果文件：与结果栅格同名的 <name>.polygons.npz（像元角点坐标 + 仿射
+变换），多边形按首个像元的扫描顺序排列；栅格重写后自动重新生成。
+"""
+import os
+import time
+import logging
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import ndimage
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from rasterio.features import shapes
+from rasterio.windows import Window
+
+from config import (
+    POLYGONIZE_TILE_SIZE, POLYGONIZE_WORKERS, POLYGON_SIMPLIFY_LEVELS, TILE_PYRAMID_NICE,
+)
+from services.raster_pool import open_dataset
+from services.single_flight import SingleFlight
+
+try:
+    import shapely
+    HAS_SHAPELY = True
+except ImportError:
+    HAS_SHAPELY = False
+
+logger = logging.getLogger(__name__)
+
+_build_flight = SingleFlight()
+
+
+def simplify_tolerances(n_levels=None):
+    """各级别的简化容差（像元）：级别 0 不简化，级别 k 为 2^(k-1)"""
+    n_levels = POLYGON_SIMPLIFY_LEVELS if n_levels is None else n_levels
+    return [0.0] + [float(2 ** (k - 1)) for k in range(1, n_levels + 1)]
+
+
+def level_for_zoom(native_zoom, z, n_levels):
+    """缩放级别 z 使用的简化级别（屏幕像元约为 2^(native_zoom - z) 个源像元）"""
+    return int(np.clip(native_zoom - z, 0, n_levels - 1))
+
+
+# ============= 弧段简化 =============
+
+def _junctions(values):
+    """values（四周已含一圈背景/邻域像元）→ 内部角点是否为结点"""
+    a, b = values[:-1, :-1], values[:-1, 1:]
+    c, d = values[1:, :-1], values[1:, 1:]
+    distinct = 1 + (b != a) + ((c != a) & (c != b)) + ((d != a) & (d != b) & (d != c))
+    checker = (a == d) & (b == c) & (a != b)
+    return (distinct >= 3) | checker
+
+
+def _densify(ring):
+    """轴向折线环 → 逐单位步长的顶点，以及每个点是否为拐点"""
+    step = np.diff(ring, axis=0, append=ring[:1])
+    lengths = np.abs(step).sum(axis=1)
+    idx = np.repeat(np.arange(len(ring)), lengths)
+    t = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    pts = ring[idx] + np.sign(step)[idx] * t[:, None]
+    corner = t == 0
+    return pts, corner
+
+
+def _significance(pts):
+    """Douglas-Peucker 显著度：端点为无穷大，其余顶点不超过其父分割点"""
+    sig = np.zeros(len(pts))
+    sig[0] = sig[-1] = np.inf
+    stack = [(0, len(pts) - 1, np.inf)]
+    while stack:
+        i, j, parent = stack.pop()
+        if j - i < 2:
+            continue
+        seg = pts[i + 1:j] - pts[i]
+        chord = pts[j] - pts[i]
+        norm = np.hypot(chord[0], chord[1])
+        if norm == 0:
+            dist = np.hypot(seg[:, 0], seg[:, 1])
+        else:
+            dist = np.abs(chord[0] * seg[:, 1] - chord[1] * seg[:, 0]) / norm
+        k = int(np.argmax(dist))
+        s = min(dist[k], parent)
+        sig[i + 1 + k] = s
+        stack.append((i, i + 1 + k, s))
+        stack.append((i + 1 + k, j, s))
+    return sig
+
+
+def _arc_significance(arc, cache):
+    """按规范方向计算弧的显著度（共享弧两侧结果相同），返回原方向的结果"""
+    first, last = tuple(arc[0]), tuple(arc[-1])
+    if first == last:
+        flip = len(arc) > 2 and tuple(arc[1]) > tuple(arc[-2])
+    else:
+        flip = first > last
+    canonical = arc[::-1] if flip else arc
+    key = canonical.tobytes()
+    sig = cache.get(key)
+    if sig is None:
+        sig = cache[key] = _significance(canonical.astype(np.float64))
+    return sig[::-1] if flip else sig
+
+
+def _simplify_ring(ring, junction, origin, tolerances, cache):
+    """环（全局角点坐标，不含闭合点）→ 各级别简化后的环（退化为 None）"""
+    pts, corner = _densify(ring)
+    rows, cols = pts[:, 1] - origin[0], pts[:, 0] - origin[1]
+    is_junction = junction[rows - 1, cols - 1]
+
+    starts = np.flatnonzero(is_junction)
+    if len(starts) == 0:
+        # 孤立环（只与一个区域相邻）：从最小顶点起作为一条闭合弧
+        anchor = np.lexsort((pts[:, 0], pts[:, 1]))[0]
+        starts = np.array([anchor])
+    if starts[0]:
+        pts = np.concatenate([pts[starts[0]:], pts[:starts[0]]])
+        corner = np.concatenate([corner[starts[0]:], corner[:starts[0]]])
+    bounds = np.append(starts - starts[0], len(pts))
+
+    kept_pts, kept_sig = [], []
+    for s, e in zip(bounds[:-1], bounds[1:]):
+        arc = np.vstack([pts[s:e], pts[e % len(pts)]])
+        keep = np.append(corner[s:e], True)
+        keep[0] = True
+        arc = arc[keep]
+        sig = _arc_significance(arc, cache)
+        kept_pts.append(arc[:-1])
+        kept_sig.append(sig[:-1])
+    pts = np.concatenate(kept_pts)
+    sig = np.concatenate(kept_sig)
+
+    out, prev_count, prev = [], -1, None
+    for tol in tolerances[1:]:
+        keep = sig > tol
+        count = int(keep.sum())
+        if count != prev_count:
+            q = pts[keep]
+            prev = q if count >= 3 and _ring_area(q) != 0 else None
+            prev_count = count
+        out.append(prev)
+    return out
+
+
+def _ring_area(q):
+    """环的有向面积的两倍（整数角点坐标）"""
+    x, y = q[:, 0], q[:, 1]
+    return int(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]) + x[-1] * y[0] - x[0] * y[-1])
+
+
+# ============= 有效性检查 =============
+
+def _orient(p, q, r):
+    """r 相对有向线段 p→q 的方向（-1/0/1），整数坐标精确计算"""
+    return np.sign((q[:, 0] - p[:, 0]) * (r[:, 1] - p[:, 1]) - (q[:, 1] - p[:, 1]) * (r[:, 0] - p[:, 0]))
+
+
+def _strictly_inside(p, q, r):
+    """共线点 r 是否位于线段 p-q 内部（不含端点）"""
+    lo, hi = np.minimum(p, q), np.maximum(p, q)
+    within = np.all((r >= lo) & (r <= hi), axis=1)
+    return within & np.any(r != p, axis=1) & np.any(r != q, axis=1)
+
+
+def _edges_invalid(rings):
+    """边之间存在交叉、共线重叠，或环内顶点落在同环其他边内部时返回 True"""
+    starts = np.concatenate(rings).astype(np.int64)
+    ends = np.concatenate([np.roll(r, -1, axis=0) for r in rings]).astype(np.int64)
+    ring_id = np.repeat(np.arange(len(rings)), [len(r) for r in rings])
+
+    # 扫描线：按 x 下界排序，只比较 x 范围相交的边对
+    lo, hi = np.minimum(starts, ends), np.maximum(starts, ends)
+    order = np.argsort(lo[:, 0], kind="stable")
+    stop = np.searchsorted(lo[order, 0], hi[order, 0], side="right")
+    first = np.arange(len(order)) + 1
+    counts = np.maximum(stop - first, 0)
+    i = np.repeat(np.arange(len(order)), counts)
+    j = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(first, counts)
+    i, j = order[i], order[j]
+    overlap = (lo[i, 1] <= hi[j, 1]) & (lo[j, 1] <= hi[i, 1])
+    i, j = i[overlap], j[overlap]
+
+    p1, p2, q1, q2 = starts[i], ends[i], starts[j], ends[j]
+    o1, o2 = _orient(p1, p2, q1), _orient(p1, p2, q2)
+    o3, o4 = _orient(q1, q2, p1), _orient(q1, q2, p2)
+    if np.any((o1 * o2 < 0) & (o3 * o4 < 0)):
+        return True
+
+    collinear = (o1 == 0) & (o2 == 0)
+    shared = np.maximum(lo[i], lo[j]), np.minimum(hi[i], hi[j])
+    if np.any(collinear & np.any(shared[0] < shared[1], axis=1)):
+        return True
+
+    touch = ((o1 == 0) & _strictly_inside(p1, p2, q1)) | ((o2 == 0) & _strictly_inside(p1, p2, q2)) \
+        | ((o3 == 0) & _strictly_inside(q1, q2, p1)) | ((o4 == 0) & _strictly_inside(q1, q2, p2))
+    return bool(np.any(touch & (ring_id[i] == ring_id[j])))
+
+
+def _outside_ring(points, ring):
+    """点是否严格位于环外（在环上视为不在环外）"""
+    a = ring.astype(np.float64)
+    b = np.roll(a, -1, axis=0)
+    px, py = points[:, :1].astype(np.float64), points[:, 1:].astype(np.float64)
+    ax, ay, bx, by = a[:, 0], a[:, 1], b[:, 0], b[:, 1]
+    cross = (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+    on_edge = (cross == 0) & (px >= np.minimum(ax, bx)) & (px <= np.maximum(ax, bx)) \
+        & (py >= np.minimum(ay, by)) & (py <= np.maximum(ay, by))
+    straddle = (ay > py) != (by > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_at = ax + (py - ay) * (bx - ax) / (by - ay)
+    inside = np.count_nonzero(straddle & (px < x_at), axis=1) % 2 == 1
+    return ~inside & ~on_edge.any(axis=1)
+
+
+def _valid_polygon(rings, signs):
+    """简化后的多边形（外环 + 洞）是否有效；signs 为各环应有的方向（有向面积符号）"""
+    if any(np.sign(_ring_area(r)) != s for r, s in zip(rings, signs)):
+        return False
+    if HAS_SHAPELY:
+        return bool(shapely.Polygon(rings[0], rings[1:]).is_valid)
+    if _edges_invalid(rings):
+        return False
+    return not any(_outside_ring(hole, rings[0]).any() for hole in rings[1:])
+
+
+# ============= 分块多边形化 =============
+
+def _polygonize_window(values, own, origin, tolerances):
+    """多边形化一个分块窗口。
+
+    Args:
+        values: int32 窗口（四周含一圈邻域/背景像元），背景为 0
+        own: 属于本任务的像元
+        origin: 窗口左上角的全局像元坐标 (row, col)
+    Returns:
+        (values, keys, levels)：levels[k] = [多边形的环列表]，坐标为全局角点 (col, row)
+    """
+    junction = _junctions(values)
+    cache = {}
+    offset = np.array([origin[1], origin[0]], dtype=np.int64)
+    out_values, keys = [], []
+    levels = [[] for _ in tolerances]
+    for geom, value in shapes(values, mask=own, connectivity=4):
+        rings = [np.asarray(r[:-1], dtype=np.int64) + offset for r in geom["coordinates"]]
+        exterior = rings[0]
+        top = exterior[:, 1].min()
+        keys.append((int(top), int(exterior[exterior[:, 1] == top, 0].min())))
+        out_values.append(int(value))
+        levels[0].append(rings)
+
+        simplified = []
+        for ring in rings:
+            extent = max(np.ptp(ring[:, 0]), np.ptp(ring[:, 1]))
+            n_kept = sum(1 for tol in tolerances[1:] if tol < extent)
+            s = _simplify_ring(ring, junction, origin, tolerances[:1 + n_kept], cache) if n_kept else []
+            simplified.append(s + [None] * (len(tolerances) - 1 - n_kept))
+        signs = [np.sign(_ring_area(ring)) for ring in rings]
+        for k in range(1, len(tolerances)):
+            if simplified[0][k - 1] is None:
+                levels[k].append([])
+                continue
+            kept = [(s[k - 1], sign) for s, sign in zip(simplified, signs) if s[k - 1] is not None]
+            poly = [ring for ring, _ in kept]
+            previous = levels[k - 1][-1]
+            if previous and not _valid_polygon(poly, [sign for _, sign in kept]):
+                # 简化产生自交等无效几何：退回上一级别
+                poly = previous
+            levels[k].append(poly)
+    return out_values, keys, levels
+
+
+def _read_window(tif_path, row0, row1, col0, col1):
+    """读取像元窗口 [row0, row1) × [col0, col1)，超出栅格的部分为背景。
+
+    Returns:
+        (values, mask)：int32 取值（无效像元为 0）与有效像元掩膜
+    """
+    with open_dataset(tif_path) as ds:
+        r0, r1 = max(row0, 0), min(row1, ds.height)
+        c0, c1 = max(col0, 0), min(col1, ds.width)
+        data = ds.read(1, window=Window(c0, r0, c1 - c0, r1 - r0))
+        nodata = ds.nodata
+    valid = data != 0
+    if nodata is not None:
+        valid &= data != nodata
+    if np.issubdtype(data.dtype, np.floating):
+        valid &= np.isfinite(data)
+
+    values = np.zeros((row1 - row0, col1 - col0), dtype=np.int32)
+    mask = np.zeros(values.shape, dtype=bool)
+    inner = (slice(r0 - row0, r1 - row0), slice(c0 - col0, c1 - col0))
+    values[inner] = np.where(valid, data, 0)
+    mask[inner] = valid
+    return values, mask
+
+
+def _label_window(tif_path, row0, row1, col0, col1):
+    """标记一个窗口的连通区。
+
+    Returns:
+        (bboxes, seeds, edges)：各标记的全局外包框 (n, 4)（top, bottom, left, right，
+        右开）、一个成员像元 (n, 2)，以及上/下/左/右四条边上的标记（0 为背景）
+    """
+    _, mask = _read_window(tif_path, row0, row1, col0, col1)
+    labels, n = ndimage.label(mask)
+    objects = ndimage.find_objects(labels)
+    bboxes = np.array([[o[0].start, o[0].stop, o[1].start, o[1].stop] for o in objects],
+                      dtype=np.int64).reshape(n, 4) + [row0, row0, col0, col0]
+    # 每个标记扫描顺序的首个像元所在行就是外包框上边
+    seeds = np.zeros((n, 2), dtype=np.int64)
+    for i, o in enumerate(objects):
+        seeds[i] = o[0].start, o[1].start + np.argmax(labels[o[0].start, o[1]] == i + 1)
+    seeds += [row0, col0]
+    edges = labels[0], labels[-1], labels[:, 0], labels[:, -1]
+    return bboxes, seeds, edges
+
+
+def _components(windows, results):
+    """合并各窗口的标记 → 全局连通区 (bboxes, seeds)"""
+    offsets = np.cumsum([0] + [len(r[0]) for r in results])
+    n = int(offsets[-1])
+    if n == 0:
+        return np.zeros((0, 4), dtype=np.int64), np.zeros((0, 2), dtype=np.int64)
+    index = {w[::2]: i for i, w in enumerate(windows)}
+
+    pairs = []
+    for i, (row0, row1, col0, col1) in enumerate(windows):
+        top, bottom, left, right = results[i][2]
+        # 与下方、右侧窗口的接缝：本窗口的下/右边对应相邻窗口的上/左边
+        for j, own_edge, side in ((index.get((row1, col0)), bottom, 0), (index.get((row0, col1)), right, 2)):
+            if j is None:
+                continue
+            other = results[j][2][side]
+            both = (own_edge > 0) & (other > 0)
+            pairs.append(np.column_stack([own_edge[both] - 1 + offsets[i], other[both] - 1 + offsets[j]]))
+    pairs = np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype=np.int64)
+
+    graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+    n_comp, comp = connected_components(graph, directed=False)
+    label_bboxes = np.concatenate([r[0] for r in results])
+    label_seeds = np.concatenate([r[1] for r in results])
+
+    bboxes = np.empty((n_comp, 4), dtype=np.int64)
+    bboxes[:, [0, 2]] = np.iinfo(np.int64).max
+    bboxes[:, [1, 3]] = np.iinfo(np.int64).min
+    np.minimum.at(bboxes[:, 0], comp, label_bboxes[:, 0])
+    np.maximum.at(bboxes[:, 1], comp, label_bboxes[:, 1])
+    np.minimum.at(bboxes[:, 2], comp, label_bboxes[:, 2])
+    np.maximum.at(bboxes[:, 3], comp, label_bboxes[:, 3])
+    _, first = np.unique(comp, return_index=True)
+    return bboxes, label_seeds[first]
+
+
+def _tasks(bboxes, seeds, width, tile_size):
+    """按连通区划分任务：(外包框 (top, bottom, left, right), 各连通区的种子像元)"""
+    tile = (bboxes[:, 0] // tile_size) * (-(-width // tile_size)) + bboxes[:, 2] // tile_size
+    order = np.argsort(tile, kind="stable")
+    for group in np.split(order, np.flatnonzero(np.diff(tile[order])) + 1):
+        if len(group):
+            box = (int(bboxes[group, 0].min()), int(bboxes[group, 1].max()),
+                   int(bboxes[group, 2].min()), int(bboxes[group, 3].max()))
+            yield box, seeds[group]
+
+
+def _polygonize_task(tif_path, box, seeds, tolerances):
+    """读取任务窗口（四周多一圈像元），按种子像元选出本任务的连通区并多边形化"""
+    top, bottom, left, right = box
+    values, mask = _read_window(tif_path, top - 1, bottom + 1, left - 1, right + 1)
+    # 任务的连通区完整位于窗口内，局部标记与全局连通区一一对应
+    labels, _ = ndimage.label(mask)
+    own = np.isin(labels, labels[seeds[:, 0] - top + 1, seeds[:, 1] - left + 1])
+    return _polygonize_window(values, own, (top - 1, left - 1), tolerances)
+
+
+def _init_worker(nice):
+    if nice and hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def polygonize_raster(tif_path, tolerances=None, n_workers=None, tile_size=None):
+    """多边形化结果栅格的有效区域（非 0、非 nodata）。
+
+    Returns:
+        dict: values (P), levels[k] = (coords (N, 2) int32 角点坐标 (col, row),
+        ring_offsets (R+1), poly_rings (P+1))，多边形按首个像元的扫描顺序排列
+    """
+    tolerances = simplify_tolerances() if tolerances is None else tolerances
+    n_workers = POLYGONIZE_WORKERS if n_workers is None else n_workers
+    tile_size = tile_size or POLYGONIZE_TILE_SIZE
+
+    with open_dataset(tif_path) as ds:
+        height, width = ds.height, ds.width
+    windows = [(r, min(r + tile_size, height), c, min(c + tile_size, width))
+               for r in range(0, height, tile_size) for c in range(0, width, tile_size)]
+
+    executor = None
+    if n_workers > 0 and len(windows) > 1:
+        ctx = multiprocessing.get_context(
+            "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        )
+        executor = ProcessPoolExecutor(max_workers=n_workers, mp_context=ctx,
+                                       initializer=_init_worker, initargs=(TILE_PYRAMID_NICE,))
+    run = executor.map if executor else map
+    try:
+        labelled = list(run(_label_window, [tif_path] * len(windows), *zip(*windows)))
+        tasks = list(_tasks(*_components(windows, labelled), width, tile_size))
+        results = list(run(_polygonize_task, [tif_path] * len(tasks),
+                           [box for box, _ in tasks], [seeds for _, seeds in tasks],
+                           [tolerances] * len(tasks)))
+    finally:
+        if executor:
+            executor.shutdown()
+
+    values = [v for r in results for v in r[0]]
+    keys = [k for r in results for k in r[1]]
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    levels = []
+    for k in range(len(tolerances)):
+        polys = [p for r in results for p in r[2][k]]
+        polys = [polys[i] for i in order]
+        rings = [ring for poly in polys for ring in poly]
+        lengths = np.array([len(r) for r in rings], dtype=np.int64)
+        coords = np.concatenate(rings).astype(np.int32) if rings else np.zeros((0, 2), dtype=np.int32)
+        poly_rings = np.concatenate([[0], np.cumsum([len(poly) for poly in polys])]).astype(np.int64)
+        levels.append((coords, np.concatenate([[0], np.cumsum(lengths)]), poly_rings))
+    return {"values": np.asarray([values[i] for i in order], dtype=np.int64), "levels": levels}
+
+
+# ============= 结果文件 =============
+
+def polygons_path(tif_path):
+    return os.path.splitext(tif_path)[0] + ".polygons.npz"
+
+
+def build_polygons(tif_path, n_workers=None):
+    """多边形化并写入 <name>.polygons.npz，返回路径"""
+    t0 = time.time()
+    tolerances = simplify_tolerances()
+    result = polygonize_raster(tif_path, tolerances, n_workers)
+    with open_dataset(tif_path) as ds:
+        transform = np.array(ds.transform.to_gdal())
+        crs_string = ds.crs_string or ""
+
+    arrays = {"values": result["values"], "tolerances": np.array(tolerances),
+              "transform": transform, "crs": np.array(crs_string)}
+    for k, (coords, ring_offsets, poly_rings) in enumerate(result["levels"]):
+        arrays[f"coords_{k}"] = coords
+        arrays[f"ring_offsets_{k}"] = ring_offsets
+        arrays[f"poly_rings_{k}"] = poly_rings
+
+    path = polygons_path(tif_path)
+    tmp_path = path[:-len(".npz")] + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    logger.info(f"多边形化完成: {os.path.basename(tif_path)}, {len(result['values'])}个多边形, "
+                f"{len(tolerances)}个级别, 耗时{time.time() - t0:.1f}s")
+    return path
+
+
+class PolygonLevels:
+    """已加载的多级多边形（像元角点坐标）"""
+
+    def __init__(self, arrays):
+        self.values = arrays["values"]
+        self.tolerances = arrays["tolerances"]
+        # GDAL 顺序的仿射参数 (c, a, b, f, d, e)
+        self.transform = arrays["transform"]
+        self.crs_string = str(arrays["crs"]) or None
+        self.levels = [
+            (arrays[f"coords_{k}"], arrays[f"ring_offsets_{k}"], arrays[f"poly_rings_{k}"])
+            for k in range(len(self.tolerances))
+        ]
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def n_levels(self):
+        return len(self.levels)
+
+    def world_coords(self, level=0):
+        """级别 level 的全部顶点 → 栅格坐标系坐标 (N, 2)"""
+        coords = self.levels[level][0].astype(np.float64)
+        gt = self.transform
+        x = gt[0] + coords[:, 0] * gt[1] + coords[:, 1] * gt[2]
+        y = gt[3] + coords[:, 0] * gt[4] + coords[:, 1] * gt[5]
+        return np.column_stack([x, y])
+
+
+@lru_cache(maxsize=16)
+def _load_polygons(path, mtime_ns):
+    with np.load(path, allow_pickle=False) as npz:
+        return PolygonLevels({k: npz[k] for k in npz.files})
+
+
+def get_polygons(tif_path):
+    """加载（必要时先生成）结果栅格的多级多边形"""
+    path = polygons_path(tif_path)
+
+    def current():
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime < os.stat(tif_path).st_mtime_ns:
+            return None
+        return _load_polygons(path, mtime)
+
+    polygons = current()
+    if polygons is None:
+        _build_flight.do(path, lambda: current() or build_polygons(tif_path))
+        polygons = _load_polygons(path, os.stat(path).st_mtime_ns)
+    return polygons
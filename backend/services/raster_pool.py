@@ -0,0 +1,160 @@
+"""栅格句柄池 — 复用已打开的 rasterio 数据集及其派生的坐标系对象
+
+每次请求都 rasterio.open() 会重新解析 TIFF 头/IFD 并重建 CRS，地图平移时
+每秒数十个瓦片请求都要付出这一开销。本模块在每个线程内维护一个按
+(路径, mtime) 索引的 LRU 句柄池（rasterio 数据集不能跨线程共享），
+文件被重写后 mtime 变化即自动重新打开，超出容量时关闭最久未用的句柄。
+
+所有线程的句柄池登记在进程级注册表中：close_datasets() 立即关闭调用线程
+与已退出线程的句柄，其他存活线程的句柄标记为失效，由其所属线程在下次
+open_dataset() 时关闭（删除任务目录前必须先释放句柄，Windows 上被打开的
+文件无法删除）。
+
+同时缓存：
+- 每个句柄的 CRS 字符串（PooledDataset.crs_string）
+- transform_bounds 结果（按 CRS 字符串与边界）
+- pyproj Transformer（每线程按源/目标 CRS 缓存）
+"""
+import os
+import logging
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+
+import rasterio
+from rasterio.warp import transform_bounds
+from pyproj import Transformer
+from config import RASTER_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+# 线程 → _ThreadHandles，登记所有线程的句柄池
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class PooledDataset:
+    """池中的数据集句柄；未定义的属性直接转发给 rasterio 数据集。
+
+    句柄归池所有，调用方不要 close()；用作上下文管理器时退出不会关闭句柄，
+    因此可以直接替换 `with rasterio.open(path) as ds:`。
+    """
+
+    __slots__ = ("dataset", "crs", "crs_string")
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.crs = dataset.crs
+        self.crs_string = dataset.crs.to_string() if dataset.crs else None
+
+    def __getattr__(self, name):
+        return getattr(self.dataset, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _ThreadHandles:
+    """一个线程的句柄池；stale 为其他线程请求关闭的路径（None = 全部）"""
+
+    __slots__ = ("thread", "handles", "stale")
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.handles = OrderedDict()
+        self.stale = []
+
+    def close(self, path=None):
+        """关闭 path 本身或其目录下的句柄（None = 全部）"""
+        for key in [k for k in self.handles if path is None or _under(k[0], path)]:
+            self.handles.pop(key).dataset.close()
+
+
+def _under(path, root):
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _close_dead_threads():
+    """关闭已退出线程遗留的句柄（调用方持有 _registry_lock）"""
+    for thread in [t for t in _registry if not t.is_alive()]:
+        _registry.pop(thread).close()
+
+
+def _state():
+    state = getattr(_local, "state", None)
+    if state is None:
+        state = _local.state = _ThreadHandles(threading.current_thread())
+        with _registry_lock:
+            _close_dead_threads()
+            _registry[state.thread] = state
+    if state.stale:
+        with _registry_lock:
+            paths, state.stale = state.stale, []
+        for path in paths:
+            state.close(path)
+    return state
+
+
+def _handles():
+    return _state().handles
+
+
+def open_dataset(path):
+    """返回当前线程池中 path 的打开句柄（文件 mtime 变化时重新打开）"""
+    path = os.path.abspath(path)
+    key = (path, os.stat(path).st_mtime_ns)
+    handles = _handles()
+
+    pooled = handles.get(key)
+    if pooled is not None:
+        handles.move_to_end(key)
+        return pooled
+
+    pooled = PooledDataset(rasterio.open(path))
+    # 同一路径的旧版本句柄立即关闭
+    for old_key in [k for k in handles if k[0] == path]:
+        handles.pop(old_key).dataset.close()
+    handles[key] = pooled
+    while len(handles) > RASTER_POOL_SIZE:
+        _, evicted = handles.popitem(last=False)
+        evicted.dataset.close()
+    return pooled
+
+
+def close_datasets(path=None):
+    """释放 path（文件或目录）下的句柄（None = 全部）
+
+    调用线程与已退出线程的句柄立即关闭；其他线程的句柄标记为失效，
+    在所属线程下次 open_dataset() 时关闭。
+    """
+    path = os.path.abspath(path) if path else None
+    state = _state()
+    with _registry_lock:
+        _close_dead_threads()
+        for other in _registry.values():
+            if other is not state:
+                other.stale.append(path)
+    state.close(path)
+
+
+@lru_cache(maxsize=4096)
+def cached_transform_bounds(src_crs, dst_crs, left, bottom, right, top):
+    """transform_bounds 的缓存版本（CRS 以字符串传入）"""
+    return transform_bounds(src_crs, dst_crs, left, bottom, right, top)
+
+
+def get_transformer(src_crs, dst_crs):
+    """当前线程缓存的 always_xy Transformer（CRS 以字符串传入）"""
+    transformers = getattr(_local, "transformers", None)
+    if transformers is None:
+        transformers = _local.transformers = {}
+    key = (src_crs, dst_crs)
+    tfm = transformers.get(key)
+    if tfm is None:
+        tfm = transformers[key] = Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+    return tfm
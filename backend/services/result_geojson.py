@@ -0,0 +1,283 @@
+"""结果栅格 → GeoJSON 多边形
+
+多边形取自 polygonize.py 的多级多边形，全部顶点用线程缓存的 Transformer
+（raster_pool.get_transformer）一次投影到 EPSG:4326，再按环偏移切回；
+不再为每个多边形新建 Transformer、为每个顶点调用一次 transform。
+序列化优先使用 orjson（未安装时回退到标准库 json）。
+
+任务完成后每个图层生成一次结果文件（与结果栅格同名、扩展名不同）：
+
+- <name>.ndjson       每行一个要素；接口按行拼出 FeatureCollection 或直接流式返回
+- <name>.geojson.gz   预压缩的 FeatureCollection（gzip）
+- <name>.geojson.br   预压缩的 FeatureCollection（brotli，需安装 brotli）
+- <name>.fgb          FlatGeobuf，自带空间索引（需安装 fiona），可经
+                      /jobs/<job_id>/<filename> 按 Range 读取
+- <name>.features.npz 每个要素的外包框与其在 .ndjson 中的字节偏移
+
+按范围查询（bbox=）和点查询时，由外包框建立 STR R 树（每个进程每个
+图层一次，见 spatial_index.py），只读取命中要素所在的 .ndjson 行。
+
+.ndjson 最后写入，其 mtime 不早于结果栅格即表示整组文件有效；缺失或
+过期时在首次请求时生成。
+"""
+import os
+import json
+import gzip
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+from config import JOB_DIR, GEOJSON_BROTLI_QUALITY
+from services.raster_pool import get_transformer
+from services.polygonize import get_polygons
+from services.single_flight import SingleFlight
+from services.spatial_index import STRTree
+from services.vector_tiles import VECTOR_LAYER_FILES
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+try:
+    import fiona
+    HAS_FIONA = True
+except ImportError:
+    HAS_FIONA = False
+
+logger = logging.getLogger(__name__)
+
+GEOGRAPHIC = "EPSG:4326"
+
+COLLECTION_PREFIX = b'{"type":"FeatureCollection","features":['
+COLLECTION_SUFFIX = b"]}"
+
+_build_flight = SingleFlight()
+
+
+def dumps(obj):
+    """对象 → JSON 字节"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    """JSON 字节 → 对象"""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def polygon_features(tif_path, layer_name, level=0):
+    """结果栅格的多边形（见 polygonize.py，level 为简化级别）→ GeoJSON 要素列表（EPSG:4326）"""
+    polygons = get_polygons(tif_path)
+    coords = polygons.world_coords(level)
+    crs_string = polygons.crs_string
+    if crs_string is not None and crs_string != GEOGRAPHIC and len(coords):
+        tfm = get_transformer(crs_string, GEOGRAPHIC)
+        lon, lat = tfm.transform(coords[:, 0], coords[:, 1])
+        coords = np.column_stack([lon, lat])
+    points = coords.tolist()
+    _, ring_offsets, poly_rings = polygons.levels[level]
+    ring_offsets = ring_offsets.tolist()
+
+    is_year = "year" in layer_name
+    features = []
+    for pid, value in enumerate(polygons.values.tolist()):
+        r0, r1 = int(poly_rings[pid]), int(poly_rings[pid + 1])
+        if r0 == r1:
+            continue  # 该简化级别下已丢弃
+        rings = []
+        for r in range(r0, r1):
+            ring = points[ring_offsets[r]:ring_offsets[r + 1]]
+            ring.append(ring[0])
+            rings.append(ring)
+        properties = {"value": value, "layer": layer_name}
+        if is_year:
+            properties["year"] = value
+        features.append({"type": "Feature", "geometry": {"type": "Polygon", "coordinates": rings},
+                         "properties": properties})
+    return features
+
+
+# ============= 预生成的结果文件 =============
+
+def artifact_paths(job_id, layer_name):
+    """{"ndjson", "gzip", "br", "fgb"} → 结果文件路径"""
+    base = os.path.join(JOB_DIR, job_id, os.path.splitext(VECTOR_LAYER_FILES[layer_name])[0])
+    return {
+        "ndjson": base + ".ndjson",
+        "gzip": base + ".geojson.gz",
+        "br": base + ".geojson.br",
+        "fgb": base + ".fgb",
+        "features": base + ".features.npz",
+    }
+
+
+def _write_bytes(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_flatgeobuf(path, features, layer_name):
+    properties = {"value": "int", "layer": "str"}
+    if "year" in layer_name:
+        properties["year"] = "int"
+    schema = {"geometry": "Polygon", "properties": properties}
+    tmp_path = path[:-len(".fgb")] + ".tmp.fgb"
+    with fiona.open(tmp_path, "w", driver="FlatGeobuf", crs=GEOGRAPHIC, schema=schema) as dst:
+        dst.writerecords(features)
+    os.replace(tmp_path, path)
+
+
+def _envelopes(features):
+    """要素外环的外包框 (N, 4)"""
+    boxes = np.zeros((len(features), 4))
+    for i, feature in enumerate(features):
+        ring = np.asarray(feature["geometry"]["coordinates"][0], dtype=np.float64)
+        boxes[i, :2] = ring.min(axis=0)
+        boxes[i, 2:] = ring.max(axis=0)
+    return boxes
+
+
+def build_geojson_artifacts(job_id, layer_name):
+    """多边形化一次，写出图层的全部结果文件，返回路径字典"""
+    tif_path = os.path.join(JOB_DIR, job_id, VECTOR_LAYER_FILES[layer_name])
+    paths = artifact_paths(job_id, layer_name)
+    features = polygon_features(tif_path, layer_name)
+    lines = [dumps(feature) for feature in features]
+    collection = COLLECTION_PREFIX + b",".join(lines) + COLLECTION_SUFFIX
+
+    _write_bytes(paths["gzip"], gzip.compress(collection, compresslevel=9, mtime=0))
+    if HAS_BROTLI:
+        _write_bytes(paths["br"], brotli.compress(collection, quality=GEOJSON_BROTLI_QUALITY))
+    elif os.path.exists(paths["br"]):
+        os.remove(paths["br"])
+    if HAS_FIONA:
+        _write_flatgeobuf(paths["fgb"], features, layer_name)
+    elif os.path.exists(paths["fgb"]):
+        os.remove(paths["fgb"])
+    offsets = np.concatenate([[0], np.cumsum([len(line) + 1 for line in lines])]).astype(np.int64)
+    tmp_path = paths["features"][:-len(".npz")] + ".tmp.npz"
+    np.savez(tmp_path, bboxes=_envelopes(features), offsets=offsets)
+    os.replace(tmp_path, paths["features"])
+    _write_bytes(paths["ndjson"], b"".join(line + b"\n" for line in lines))
+
+    logger.info(f"GeoJSON结果文件生成完成: job_id={job_id}, layer={layer_name}, "
+                f"{len(features)}个要素")
+    return paths
+
+
+def build_job_geojson_artifacts(job_id):
+    """任务完成后处理步骤：为全部矢量图层生成结果文件"""
+    built = []
+    for layer_name, filename in VECTOR_LAYER_FILES.items():
+        if os.path.exists(os.path.join(JOB_DIR, job_id, filename)):
+            built.append(build_geojson_artifacts(job_id, layer_name))
+    return built
+
+
+def get_geojson_artifacts(job_id, layer_name):
+    """当前有效的结果文件路径字典（必要时先生成）"""
+    tif_path = os.path.join(JOB_DIR, job_id, VECTOR_LAYER_FILES[layer_name])
+    paths = artifact_paths(job_id, layer_name)
+
+    def current():
+        try:
+            fresh = os.stat(paths["ndjson"]).st_mtime_ns >= os.stat(tif_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        return paths if fresh and os.path.exists(paths["features"]) else None
+
+    if current() is None:
+        _build_flight.do((job_id, layer_name),
+                         lambda: current() or build_geojson_artifacts(job_id, layer_name))
+    return paths
+
+
+def iter_feature_collection(ndjson_path, chunk_bytes=1 << 18):
+    """逐块读取 .ndjson，拼成 FeatureCollection 字节流"""
+    yield COLLECTION_PREFIX
+    first = True
+    with open(ndjson_path, "rb") as f:
+        while True:
+            lines = f.readlines(chunk_bytes)
+            if not lines:
+                break
+            chunk = b",".join(line.rstrip(b"\n") for line in lines)
+            yield chunk if first else b"," + chunk
+            first = False
+    yield COLLECTION_SUFFIX
+
+
+# ============= 空间查询 =============
+
+def _point_in_polygon(rings, x, y):
+    """奇偶规则（内环即洞）"""
+    inside = False
+    for ring in rings:
+        pts = np.asarray(ring, dtype=np.float64)
+        x0, y0 = pts[:-1, 0], pts[:-1, 1]
+        x1, y1 = pts[1:, 0], pts[1:, 1]
+        crosses = (y0 > y) != (y1 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            xs = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+        inside ^= bool(np.count_nonzero(crosses & (x < xs)) % 2)
+    return inside
+
+
+class FeatureIndex:
+    """图层要素的 R 树与 .ndjson 行偏移"""
+
+    def __init__(self, ndjson_path, bboxes, offsets):
+        self.ndjson_path = ndjson_path
+        self.bboxes = bboxes
+        self.offsets = offsets
+        self.tree = STRTree(bboxes)
+
+    def __len__(self):
+        return len(self.bboxes)
+
+    def query(self, minx, miny, maxx, maxy):
+        """外包框与查询框相交的要素编号（升序）"""
+        return self.tree.query(minx, miny, maxx, maxy)
+
+    def read_lines(self, ids):
+        """按编号读取要素的 JSON 行（不含换行符）"""
+        lines = []
+        with open(self.ndjson_path, "rb") as f:
+            for i in ids:
+                start, end = self.offsets[i], self.offsets[i + 1]
+                f.seek(start)
+                lines.append(f.read(end - start - 1))
+        return lines
+
+    def features_at(self, x, y):
+        """包含点 (x, y) 的要素"""
+        candidates = self.query(x, y, x, y)
+        features = [loads(line) for line in self.read_lines(candidates)]
+        return [f for f in features if _point_in_polygon(f["geometry"]["coordinates"], x, y)]
+
+
+@lru_cache(maxsize=16)
+def _load_feature_index(ndjson_path, features_path, mtime_ns):
+    with np.load(features_path, allow_pickle=False) as npz:
+        return FeatureIndex(ndjson_path, npz["bboxes"], npz["offsets"])
+
+
+def get_feature_index(job_id, layer_name):
+    """任务图层的要素空间索引（每个进程按结果文件版本缓存）"""
+    paths = get_geojson_artifacts(job_id, layer_name)
+    mtime = os.stat(paths["ndjson"]).st_mtime_ns
+    return _load_feature_index(paths["ndjson"], paths["features"], mtime)
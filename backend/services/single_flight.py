@@ -0,0 +1,55 @@
+"""单飞（single-flight）去重 — 相同键的并发调用只执行一次
+
+第一个调用者（leader）执行函数，执行期间到达的相同键调用等待其结果
+（带超时），结果或异常原样返回给所有等待者。函数返回后键即被移除，
+之后的调用重新执行（结果的复用交给缓存层）。
+"""
+import threading
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout=None):
+        """执行 fn()，或等待正在执行的同键调用的结果。
+
+        Raises:
+            TimeoutError: 等待超过 timeout 秒
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+        elif not call.event.wait(timeout):
+            raise TimeoutError(f"等待同键调用超时: {key}")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
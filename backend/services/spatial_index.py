@@ -0,0 +1,69 @@
+"""STR 打包的静态 R 树（numpy 实现）
+
+Sort-Tile-Recursive 批量构建：按外包框中心 x 排序分成竖条，条内按 y 排序，
+每 NODE_CAPACITY 个相邻外包框打包为一个节点；对节点外包框逐层重复直到
+只剩一个根节点。打包后第 k 层第 i 个节点的子项正好是第 k-1 层的
+[i * NODE_CAPACITY, (i + 1) * NODE_CAPACITY)，不需要存储指针。
+
+查询自顶向下逐层筛选，每层一次向量化比较，耗时只与命中节点数有关。
+"""
+import numpy as np
+
+NODE_CAPACITY = 16
+
+
+def _pack(boxes, capacity):
+    """按 STR 顺序排列 boxes，返回排列顺序"""
+    n = len(boxes)
+    n_nodes = -(-n // capacity)
+    n_slabs = int(np.ceil(np.sqrt(n_nodes)))
+    slab_size = n_slabs * capacity
+
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    order = np.argsort(cx, kind="stable")
+    slab = np.arange(n) // slab_size
+    # 条内按 y 排序（lexsort 以最后一个键为主键）
+    return order[np.lexsort((cy[order], slab))]
+
+
+def _node_boxes(boxes, capacity):
+    """相邻 capacity 个外包框合并为父节点外包框"""
+    n = len(boxes)
+    pad = -n % capacity
+    lo = np.concatenate([boxes[:, :2], np.full((pad, 2), np.inf)])
+    hi = np.concatenate([boxes[:, 2:], np.full((pad, 2), -np.inf)])
+    lo = lo.reshape(-1, capacity, 2).min(axis=1)
+    hi = hi.reshape(-1, capacity, 2).max(axis=1)
+    return np.column_stack([lo, hi])
+
+
+class STRTree:
+    """外包框 (minx, miny, maxx, maxy) 的静态 R 树"""
+
+    def __init__(self, boxes, capacity=NODE_CAPACITY):
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.capacity = capacity
+        self.size = len(boxes)
+        # 叶层：按 STR 顺序排列的原始外包框及其编号
+        self.ids = _pack(boxes, capacity) if self.size else np.zeros(0, dtype=np.int64)
+        self.levels = [boxes[self.ids]]
+        while len(self.levels[-1]) > 1:
+            self.levels.append(_node_boxes(self.levels[-1], capacity))
+
+    def query(self, minx, miny, maxx, maxy):
+        """与查询框相交的外包框编号（升序）"""
+        if self.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        cap = self.capacity
+        hit = np.zeros(1, dtype=np.int64)
+        for depth in range(len(self.levels) - 1, -1, -1):
+            boxes = self.levels[depth]
+            if depth < len(self.levels) - 1:
+                hit = (hit[:, None] * cap + np.arange(cap)).ravel()
+                hit = hit[hit < len(boxes)]
+            b = boxes[hit]
+            hit = hit[(b[:, 0] <= maxx) & (b[:, 2] >= minx) & (b[:, 1] <= maxy) & (b[:, 3] >= miny)]
+            if not len(hit):
+                break
+        return np.sort(self.ids[hit])
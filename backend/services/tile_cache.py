@@ -0,0 +1,305 @@
+"""瓦片缓存 — 进程内 LRU 内存层 + 跨进程共享的磁盘层
+
+内存层：按字节预算限制大小，真正的 LRU 淘汰，线程安全。
+磁盘层：每个任务一个 SQLite 文件 (JOB_DIR/<job_id>/tile_cache.sqlite，WAL 模式)，
+所有 WSGI 工作进程共享读取，一个进程渲染过的瓦片其他进程不再重复渲染。
+
+缓存键包含源 GeoTIFF 的 mtime（version），任务重新运行后旧瓦片自动失效；
+删除/重新运行任务时调用 invalidate_job() 主动清理两层缓存。
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DISK_CACHE_FILENAME = "tile_cache.sqlite"
+
+
+class LRUTileCache:
+    """按字节预算限制的线程安全 LRU 缓存"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = data
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate_job(self, job_id):
+        """删除某任务的全部瓦片（键的第一个元素为 job_id）"""
+        with self._lock:
+            stale = [k for k in self._entries if k[0] == job_id]
+            for k in stale:
+                self._bytes -= len(self._entries.pop(k))
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class TrackedConnection:
+    """登记在册的 SQLite 连接：所属线程独占使用，可在任意线程关闭"""
+
+    __slots__ = ("conn", "ino", "lock", "closed")
+
+    def __init__(self, conn, ino):
+        self.conn = conn
+        self.ino = ino
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.conn.close()
+
+
+class DiskTileStore:
+    """每个任务一个 SQLite 文件的共享磁盘瓦片库（MBTiles 风格的 tiles 表）
+
+    每个线程每个任务一个连接，全部登记在 _conns 中（加锁访问）：
+    invalidate_job 关闭所有线程持有的该任务连接后再删除文件（Windows 上
+    打开的文件无法删除），已退出线程的连接在新建连接时一并关闭。
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS tiles ("
+        " layer TEXT, version INTEGER, z INTEGER, x INTEGER, y INTEGER, data BLOB,"
+        " created_at REAL, PRIMARY KEY (layer, version, z, x, y))"
+    )
+
+    def __init__(self, job_dir):
+        self.job_dir = job_dir
+        # (线程 id, job_id) → TrackedConnection
+        self._conns = {}
+        self._conns_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def path(self, job_id):
+        return os.path.join(self.job_dir, job_id, DISK_CACHE_FILENAME)
+
+    def _open(self, path):
+        conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(self._SCHEMA)
+        conn.commit()
+        return conn
+
+    def _close_dead_threads(self):
+        """关闭已退出线程的连接（调用方持有 _conns_lock）"""
+        alive = {t.ident for t in threading.enumerate()}
+        for key in [k for k in self._conns if k[0] not in alive]:
+            self._conns.pop(key).close()
+
+    def _connect(self, job_id, create=False):
+        """返回本线程的连接；库文件被删除或替换（inode 变化）时重新打开"""
+        path = self.path(job_id)
+        try:
+            ino = os.stat(path).st_ino
+        except FileNotFoundError:
+            if not create or not os.path.isdir(os.path.dirname(path)):
+                return None
+            ino = None
+
+        key = (threading.get_ident(), job_id)
+        with self._conns_lock:
+            cached = self._conns.get(key)
+        if cached is not None and not cached.closed and ino is not None and cached.ino == ino:
+            return cached
+        if cached is not None:
+            cached.close()
+
+        entry = TrackedConnection(self._open(path), os.stat(path).st_ino)
+        with self._conns_lock:
+            self._close_dead_threads()
+            self._conns[key] = entry
+        return entry
+
+    def _run(self, job_id, fn, create=False):
+        """在本线程的连接上执行 fn(conn)；无库文件或连接已被失效时返回 None"""
+        entry = self._connect(job_id, create=create)
+        if entry is None:
+            return None
+        with entry.lock:
+            if entry.closed:
+                return None
+            return fn(entry.conn)
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def get(self, job_id, layer, version, z, x, y):
+        try:
+            row = self._run(job_id, lambda conn: conn.execute(
+                "SELECT data FROM tiles WHERE layer=? AND version=? AND z=? AND x=? AND y=?",
+                (layer, version, z, x, y),
+            ).fetchone())
+        except sqlite3.Error as e:
+            logger.warning(f"磁盘瓦片缓存读取失败: {str(e)}")
+            self._count("errors")
+            return None
+        self._count("hits" if row else "misses")
+        return bytes(row[0]) if row else None
+
+    def put(self, job_id, layer, version, z, x, y, data):
+        def write(conn):
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (layer, version, z, x, y, sqlite3.Binary(data), time.time()),
+                )
+        try:
+            self._run(job_id, write, create=True)
+        except sqlite3.Error as e:
+            logger.warning(f"磁盘瓦片缓存写入失败: {str(e)}")
+            self._count("errors")
+
+    def put_many(self, job_id, layer, version, z, tiles):
+        """在一个事务中写入同一层级的多个瓦片 {(x, y): data}"""
+        def write(conn):
+            now = time.time()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(layer, version, z, x, y, sqlite3.Binary(data), now) for (x, y), data in tiles.items()],
+                )
+        try:
+            self._run(job_id, write, create=True)
+        except sqlite3.Error as e:
+            logger.warning(f"磁盘瓦片缓存写入失败: {str(e)}")
+            self._count("errors")
+
+    def invalidate_job(self, job_id):
+        """关闭所有线程持有的该任务连接并删除磁盘缓存文件
+
+        文件无法删除时（如 Windows 上被其他进程打开）改为清空 tiles 表。
+        """
+        with self._conns_lock:
+            entries = [self._conns.pop(k) for k in list(self._conns) if k[1] == job_id]
+        for entry in entries:
+            entry.close()
+
+        path = self.path(job_id)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning(f"磁盘瓦片缓存文件删除失败，改为清空: {str(e)}")
+            try:
+                conn = self._open(path)
+                with conn:
+                    conn.execute("DELETE FROM tiles")
+                conn.close()
+            except sqlite3.Error as db_err:
+                logger.warning(f"磁盘瓦片缓存清空失败: {str(db_err)}")
+            return
+        for suffix in ("-wal", "-shm"):
+            try:
+                os.remove(path + suffix)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class TileCache:
+    """两级瓦片缓存：内存 LRU → 磁盘 SQLite"""
+
+    def __init__(self, max_bytes, job_dir=None):
+        self.memory = LRUTileCache(max_bytes)
+        self.disk = DiskTileStore(job_dir) if job_dir else None
+
+    def get(self, job_id, layer, version, z, x, y):
+        key = (job_id, layer, version, z, x, y)
+        data = self.memory.get(key)
+        if data is not None or self.disk is None:
+            return data
+        data = self.disk.get(job_id, layer, version, z, x, y)
+        if data is not None:
+            self.memory.put(key, data)
+        return data
+
+    def put(self, job_id, layer, version, z, x, y, data):
+        self.memory.put((job_id, layer, version, z, x, y), data)
+        if self.disk is not None:
+            self.disk.put(job_id, layer, version, z, x, y, data)
+
+    def put_many(self, job_id, layer, version, z, tiles):
+        """写入元瓦片渲染出的一组瓦片 {(x, y): data}"""
+        for (x, y), data in tiles.items():
+            self.memory.put((job_id, layer, version, z, x, y), data)
+        if self.disk is not None:
+            self.disk.put_many(job_id, layer, version, z, tiles)
+
+    def invalidate_job(self, job_id):
+        removed = self.memory.invalidate_job(job_id)
+        if self.disk is not None:
+            self.disk.invalidate_job(job_id)
+        logger.info(f"瓦片缓存已失效: job_id={job_id}, 内存条目={removed}")
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
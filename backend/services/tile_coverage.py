@@ -0,0 +1,200 @@
+"""瓦片覆盖索引 — 空瓦片不打开栅格即可判定
+
+任务范围内请求的大部分瓦片完全透明，却仍要读窗口、重投影、编码。任务
+完成后为每个图层建立覆盖索引：
+
+- 在 native_zoom 级（瓦片像元不大于源像元）标记含非零数据的瓦片：按
+  BLOCK x BLOCK 像元块汇总数据，把含数据块的边界加密后投影到 EPSG:3857，
+  标记其外接矩形触及的所有瓦片（源网格相对墨卡托旋转时，块的四角
+  不一定落在它切过的每个瓦片内）
+- 逐级向上做 2x2 OR 汇聚，得到 0..native_zoom 每级一张位图（位图四叉树）
+- 高于 native_zoom 的瓦片查其 native_zoom 级祖先
+
+“数据”与渲染一致：查找表索引非零（见 tile_service.to_lut_index）。
+索引只会把空瓦片误判为有数据（多渲染一次），不会漏掉有数据的瓦片。
+
+文件：JOB_DIR/<job_id>/tile_coverage.npz，每个图层记录源文件版本，
+源文件重写后该图层的索引自动失效。
+"""
+import os
+import json
+import logging
+import threading
+
+import numpy as np
+from rasterio.windows import Window
+
+from config import JOB_DIR
+from services.tile_service import (
+    LAYER_FILES, ORIGIN_SHIFT, WEB_MERCATOR, tile_version, layer_lut, to_lut_index,
+)
+from services.raster_pool import open_dataset, get_transformer
+
+logger = logging.getLogger(__name__)
+
+COVERAGE_FILENAME = "tile_coverage.npz"
+# 汇总数据的像元块边长；native_zoom 级瓦片宽 128~256 个源像元，块不超过半个瓦片
+BLOCK = 64
+# 块每条边投影前的加密段数
+EDGE_SAMPLES = 8
+
+
+def coverage_path(job_id):
+    return os.path.join(JOB_DIR, job_id, COVERAGE_FILENAME)
+
+
+def _tile_xy(mx, my, z):
+    span = 2 * ORIGIN_SHIFT / 2 ** z
+    n = 2 ** z
+    tx = np.clip(np.floor((mx + ORIGIN_SHIFT) / span), 0, n - 1).astype(np.int64)
+    ty = np.clip(np.floor((ORIGIN_SHIFT - my) / span), 0, n - 1).astype(np.int64)
+    return tx, ty
+
+
+def layer_coverage(tif_path, layer_name):
+    """计算单个图层的覆盖位图。
+
+    Returns:
+        (max_zoom, levels)：levels[z] = (x0, y0, bitmap)，bitmap[y - y0, x - x0]
+        为 True 表示瓦片 (z, x, y) 含数据；没有任何数据时 levels 为空
+    """
+    from services.mercator_raster import plan_grid
+
+    _, scale = layer_lut(tif_path, layer_name)
+    with open_dataset(tif_path) as src:
+        max_zoom = plan_grid(src)["native_zoom"]
+        tfm = get_transformer(src.crs_string, WEB_MERCATOR)
+        width, height = src.width, src.height
+        n_cols = -(-width // BLOCK)
+
+        tiles = []
+        for row in range(0, height, BLOCK):
+            rows = min(BLOCK, height - row)
+            data = src.read(1, window=Window(0, row, width, rows))
+            occupied = to_lut_index(data, layer_name, src.nodata, scale) != 0
+            if not occupied.any():
+                continue
+            padded = np.zeros((rows, n_cols * BLOCK), dtype=bool)
+            padded[:, :width] = occupied
+            cols = np.flatnonzero(padded.reshape(rows, n_cols, BLOCK).any(axis=(0, 2)))
+
+            # 含数据块的边界（每条边 EDGE_SAMPLES 段，投影后边可能弯曲）
+            left = cols * BLOCK
+            right = np.minimum(left + BLOCK, width)
+            t = np.linspace(0.0, 1.0, EDGE_SAMPLES + 1)
+            xs = left[:, None] + (right - left)[:, None] * t
+            ys = row + rows * t
+            px = np.concatenate([xs, xs, np.repeat(left[:, None], len(t), 1),
+                                 np.repeat(right[:, None], len(t), 1)], axis=1)
+            py = np.concatenate([np.full_like(xs, row), np.full_like(xs, row + rows),
+                                 np.broadcast_to(ys, xs.shape), np.broadcast_to(ys, xs.shape)], axis=1)
+
+            sx, sy = src.transform * (px.ravel(), py.ravel())
+            mx, my = tfm.transform(sx, sy)
+            mx = np.asarray(mx).reshape(px.shape)
+            my = np.asarray(my).reshape(px.shape)
+            # 块投影后的外接矩形覆盖的全部瓦片（旋转的块可能以细条切过不含任何角点的瓦片）
+            tx0, ty0 = _tile_xy(mx.min(axis=1), my.max(axis=1), max_zoom)
+            tx1, ty1 = _tile_xy(mx.max(axis=1), my.min(axis=1), max_zoom)
+            for dx in range(int((tx1 - tx0).max()) + 1):
+                for dy in range(int((ty1 - ty0).max()) + 1):
+                    keep = (tx0 + dx <= tx1) & (ty0 + dy <= ty1)
+                    tiles.append(np.stack([tx0[keep] + dx, ty0[keep] + dy], axis=1))
+
+    levels = {}
+    if not tiles:
+        return max_zoom, levels
+
+    xy = np.unique(np.concatenate(tiles), axis=0)
+    for z in range(max_zoom, -1, -1):
+        x0, y0 = xy.min(axis=0)
+        x1, y1 = xy.max(axis=0)
+        bitmap = np.zeros((y1 - y0 + 1, x1 - x0 + 1), dtype=bool)
+        bitmap[xy[:, 1] - y0, xy[:, 0] - x0] = True
+        levels[z] = (int(x0), int(y0), bitmap)
+        xy = np.unique(xy >> 1, axis=0)
+    return max_zoom, levels
+
+
+def build_tile_coverage(job_id):
+    """任务完成后处理步骤：为全部瓦片图层建立覆盖索引，返回索引文件路径"""
+    arrays = {}
+    meta = {}
+    for layer_name, filename in LAYER_FILES.items():
+        tif_path = os.path.join(JOB_DIR, job_id, filename)
+        if not os.path.exists(tif_path):
+            continue
+        version = tile_version(tif_path)
+        max_zoom, levels = layer_coverage(tif_path, layer_name)
+        meta[layer_name] = {"version": version, "max_zoom": max_zoom,
+                            "origins": {z: [x0, y0] for z, (x0, y0, _) in levels.items()}}
+        for z, (_, _, bitmap) in levels.items():
+            arrays[f"{layer_name}/{z}"] = bitmap
+    if not meta:
+        return None
+
+    path = coverage_path(job_id)
+    tmp_path = path[:-len(".npz")] + ".tmp.npz"
+    np.savez_compressed(tmp_path, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, path)
+    logger.info(f"瓦片覆盖索引生成完成: job_id={job_id}, {len(meta)}个图层")
+    return path
+
+
+class TileCoverageIndex:
+    """进程内共享的覆盖索引（按文件 mtime 自动重新加载）"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _layers(self, job_id):
+        try:
+            mtime = os.stat(coverage_path(job_id)).st_mtime_ns
+        except FileNotFoundError:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            return None
+        cached = self._jobs.get(job_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with np.load(coverage_path(job_id), allow_pickle=False) as npz:
+            meta = json.loads(str(npz["meta"]))
+            layers = {}
+            for layer_name, info in meta.items():
+                levels = {}
+                for z, (x0, y0) in info["origins"].items():
+                    levels[int(z)] = (x0, y0, npz[f"{layer_name}/{z}"])
+                layers[layer_name] = (info["version"], info["max_zoom"], levels)
+        with self._lock:
+            self._jobs[job_id] = (mtime, layers)
+        return layers
+
+    def is_empty(self, job_id, layer_name, version, z, x, y):
+        """瓦片确定为空时返回 True；有数据或没有可用索引时返回 False"""
+        try:
+            layers = self._layers(job_id)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取瓦片覆盖索引失败: {str(e)}")
+            return False
+        if layers is None or layer_name not in layers:
+            return False
+        layer_version, max_zoom, levels = layers[layer_name]
+        if layer_version != version:
+            return False
+        if z > max_zoom:
+            x >>= z - max_zoom
+            y >>= z - max_zoom
+            z = max_zoom
+        level = levels.get(z)
+        if level is None:
+            return True
+        x0, y0, bitmap = level
+        i, j = y - y0, x - x0
+        if i < 0 or j < 0 or i >= bitmap.shape[0] or j >= bitmap.shape[1]:
+            return True
+        return not bitmap[i, j]
+
+
+tile_coverage = TileCoverageIndex()
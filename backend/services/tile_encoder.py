@@ -0,0 +1,94 @@
+"""瓦片编码 — 调色板 PNG / RGBA PNG / 无损 WebP
+
+瓦片由配色查找表索引生成（见 tile_service.colormap_lut），类别图层每个瓦片
+只有几十种颜色，因此：
+
+- 颜色不超过 256 种时编码为调色板 PNG（8 位索引 + PLTE + tRNS 透明度），
+  数据量约为 RGBA 的 1/4，压缩也更快；否则回退为 RGBA PNG
+- zlib 压缩级别可配置（TILE_PNG_COMPRESS_LEVEL），不再使用最慢的 optimize=True
+- 请求 Accept 含 image/webp 时可返回无损 WebP（TILE_WEBP_ENABLED）
+- 空瓦片使用模块级共享常量，不再每次重新编码
+
+各选项的字节数与耗时见 benchmarks/bench_tile_encoding.py。
+"""
+import io
+import numpy as np
+from PIL import Image, features
+from config import TILE_PNG_COMPRESS_LEVEL, TILE_PALETTE_PNG, TILE_WEBP_ENABLED, TILE_WEBP_METHOD
+
+TILE_SIZE = 256
+
+PNG = "png"
+WEBP = "webp"
+MIMETYPES = {PNG: "image/png", WEBP: "image/webp"}
+
+# Pillow 编译时可能未包含 libwebp
+WEBP_AVAILABLE = features.check("webp")
+
+
+def palette_from_index(index, lut):
+    """查找表索引 → (8 位紧凑索引, 调色板 RGBA)；瓦片颜色超过 256 种时返回 None"""
+    present = np.bincount(index.ravel(), minlength=len(lut)).astype(bool)
+    if present.sum() > 256:
+        return None
+    remap = (np.cumsum(present) - 1).astype(np.uint8)
+    return remap[index], lut[present]
+
+
+def encode_png_rgba(rgba, compress_level=None):
+    level = TILE_PNG_COMPRESS_LEVEL if compress_level is None else compress_level
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buffer, format="PNG", compress_level=level)
+    return buffer.getvalue()
+
+
+def encode_png_palette(index, lut, compress_level=None):
+    """编码为调色板 PNG；颜色超过 256 种时返回 None"""
+    packed = palette_from_index(index, lut)
+    if packed is None:
+        return None
+    pixels, palette = packed
+    level = TILE_PNG_COMPRESS_LEVEL if compress_level is None else compress_level
+
+    img = Image.fromarray(pixels, "P")
+    img.putpalette(palette[:, :3].tobytes())
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG", compress_level=level, transparency=palette[:, 3].tobytes())
+    return buffer.getvalue()
+
+
+def encode_webp(rgba, method=None):
+    method = TILE_WEBP_METHOD if method is None else method
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buffer, format="WEBP", lossless=True, method=method)
+    return buffer.getvalue()
+
+
+def encode_tile(index, lut, fmt=PNG):
+    """按配置编码瓦片（index 为查找表索引，lut 为 (N, 4) RGBA 查找表）"""
+    if fmt == WEBP:
+        return encode_webp(lut[index])
+    if TILE_PALETTE_PNG:
+        data = encode_png_palette(index, lut)
+        if data is not None:
+            return data
+    return encode_png_rgba(lut[index])
+
+
+def negotiate_format(accept):
+    """根据请求的 Accept 头选择瓦片格式"""
+    if TILE_WEBP_ENABLED and WEBP_AVAILABLE and "image/webp" in (accept or ""):
+        return WEBP
+    return PNG
+
+
+def _empty_tile(fmt):
+    rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    if fmt == WEBP:
+        return encode_webp(rgba) if WEBP_AVAILABLE else None
+    return encode_png_palette(np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8), rgba[0, :1])
+
+
+# 完全透明的空瓦片（共享常量）
+EMPTY_TILES = {PNG: _empty_tile(PNG), WEBP: _empty_tile(WEBP)}
+EMPTY_TILE_PNG = EMPTY_TILES[PNG]
@@ -0,0 +1,316 @@
+"""预渲染瓦片金字塔 — 任务完成后在后台生成
+
+任务完成后，对 LAYER_FILES 中的全部图层在 0..TILE_PYRAMID_MAX_ZOOM 级、
+覆盖任务范围的所有瓦片预先渲染，写入任务目录下的单文件瓦片库
+tile_pyramid.sqlite（先写临时文件，完成后原子替换）。
+
+渲染在低优先级 (nice) 的进程池中进行，写库在提交任务的后台线程中进行。
+空瓦片（完全透明）不入库；已预渲染层级内查不到的瓦片即为空瓦片。
+
+库结构：
+    metadata(name, value)          layers -> {layer: {"version": mtime_ns, "max_zoom": n}}
+    tiles(layer, z, x, y, data)    PNG 字节
+"""
+import os
+import json
+import math
+import time
+import sqlite3
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from config import JOB_DIR, TILE_PYRAMID_MAX_ZOOM, TILE_PYRAMID_WORKERS, TILE_PYRAMID_NICE
+from services.tile_service import (
+    LAYER_FILES, ORIGIN_SHIFT, WEB_MERCATOR,
+    render_tile, tile_version,
+)
+from services.tile_encoder import EMPTY_TILE_PNG
+from services.tile_cache import TrackedConnection
+from services.tile_coverage import tile_coverage
+from services.raster_pool import open_dataset, cached_transform_bounds
+
+logger = logging.getLogger(__name__)
+
+PYRAMID_FILENAME = "tile_pyramid.sqlite"
+# 每个渲染任务包含的瓦片数
+BATCH_SIZE = 64
+# 每个线程最多保持打开的任务瓦片库连接数
+MAX_OPEN_PER_THREAD = 16
+# 每个渲染进程同时排队的批次数；限制在途批次，结果（PNG 字节）随完成随写库
+IN_FLIGHT_PER_WORKER = 2
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS tiles (layer TEXT, z INTEGER, x INTEGER, y INTEGER,"
+    " data BLOB, PRIMARY KEY (layer, z, x, y)) WITHOUT ROWID",
+)
+
+
+def pyramid_path(job_id):
+    return os.path.join(JOB_DIR, job_id, PYRAMID_FILENAME)
+
+
+def tile_range(bounds_3857, z):
+    """覆盖 EPSG:3857 边界的瓦片列/行范围 (x0, y0, x1, y1)，闭区间"""
+    n = 2 ** z
+    span = 2 * ORIGIN_SHIFT / n
+    minx, miny, maxx, maxy = bounds_3857
+
+    def clamp(v):
+        return min(max(v, 0), n - 1)
+
+    x0 = clamp(int(math.floor((minx + ORIGIN_SHIFT) / span)))
+    x1 = clamp(int(math.floor((maxx + ORIGIN_SHIFT) / span)))
+    y0 = clamp(int(math.floor((ORIGIN_SHIFT - maxy) / span)))
+    y1 = clamp(int(math.floor((ORIGIN_SHIFT - miny) / span)))
+    return x0, y0, x1, y1
+
+
+def raster_bounds_3857(tif_path):
+    with open_dataset(tif_path) as src:
+        b = src.bounds
+        minx, miny, maxx, maxy = cached_transform_bounds(
+            src.crs_string, WEB_MERCATOR, b.left, b.bottom, b.right, b.top
+        )
+    return (
+        max(minx, -ORIGIN_SHIFT), max(miny, -ORIGIN_SHIFT),
+        min(maxx, ORIGIN_SHIFT), min(maxy, ORIGIN_SHIFT),
+    )
+
+
+def _init_render_worker(nice):
+    """渲染进程降低优先级，避免影响在线请求"""
+    if nice and hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def _render_batch(tif_path, layer_name, tiles):
+    """渲染一批瓦片，只返回非空瓦片 [(z, x, y, png)]"""
+    out = []
+    for z, x, y in tiles:
+        png = render_tile(tif_path, layer_name, z, x, y)
+        if png is not EMPTY_TILE_PNG:
+            out.append((z, x, y, png))
+    return out
+
+
+def _layer_batches(job_id, layer_name, tif_path, max_zoom):
+    bounds = raster_bounds_3857(tif_path)
+    version = tile_version(tif_path)
+    batch = []
+    for z in range(max_zoom + 1):
+        x0, y0, x1, y1 = tile_range(bounds, z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                # 覆盖索引判定为空的瓦片不渲染
+                if tile_coverage.is_empty(job_id, layer_name, version, z, x, y):
+                    continue
+                batch.append((z, x, y))
+                if len(batch) >= BATCH_SIZE:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def _render_pooled(executor, n_workers, tif_path, layer_name, batches):
+    """在进程池中渲染，在途批次不超过 n_workers * IN_FLIGHT_PER_WORKER，按完成顺序产出结果"""
+    max_in_flight = max(1, n_workers * IN_FLIGHT_PER_WORKER)
+    batches = iter(batches)
+    pending = set()
+    exhausted = False
+    while not exhausted or pending:
+        while not exhausted and len(pending) < max_in_flight:
+            batch = next(batches, None)
+            if batch is None:
+                exhausted = True
+                break
+            pending.add(executor.submit(_render_batch, tif_path, layer_name, batch))
+        if not pending:
+            break
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def build_tile_pyramid(job_id, max_zoom=None, n_workers=None):
+    """为任务生成瓦片金字塔。
+
+    Args:
+        job_id: 任务 ID
+        max_zoom: 最大预渲染层级（默认 TILE_PYRAMID_MAX_ZOOM）
+        n_workers: 渲染进程数（默认 TILE_PYRAMID_WORKERS；0 = 在当前线程渲染）
+    Returns:
+        瓦片库路径；任务没有任何图层文件时返回 None
+    """
+    max_zoom = TILE_PYRAMID_MAX_ZOOM if max_zoom is None else max_zoom
+    n_workers = TILE_PYRAMID_WORKERS if n_workers is None else n_workers
+    job_dir = os.path.join(JOB_DIR, job_id)
+
+    layers = {}
+    for layer_name, filename in LAYER_FILES.items():
+        tif_path = os.path.join(job_dir, filename)
+        if os.path.exists(tif_path):
+            layers[layer_name] = tif_path
+    if not layers:
+        return None
+
+    t0 = time.time()
+    final_path = pyramid_path(job_id)
+    tmp_path = final_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    for stmt in _SCHEMA:
+        conn.execute(stmt)
+
+    executor = None
+    if n_workers > 0:
+        ctx = multiprocessing.get_context(
+            "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        )
+        executor = ProcessPoolExecutor(
+            max_workers=n_workers, mp_context=ctx,
+            initializer=_init_render_worker, initargs=(TILE_PYRAMID_NICE,),
+        )
+
+    n_tiles = 0
+    meta = {}
+    try:
+        for layer_name, tif_path in layers.items():
+            version = tile_version(tif_path)
+            batches = _layer_batches(job_id, layer_name, tif_path, max_zoom)
+            if executor is not None:
+                results = _render_pooled(executor, n_workers, tif_path, layer_name, batches)
+            else:
+                results = (_render_batch(tif_path, layer_name, b) for b in batches)
+
+            for rendered in results:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?)",
+                    [(layer_name, z, x, y, sqlite3.Binary(png)) for z, x, y, png in rendered],
+                )
+                n_tiles += len(rendered)
+            meta[layer_name] = {"version": version, "max_zoom": max_zoom}
+            conn.commit()
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    conn.execute("INSERT OR REPLACE INTO metadata VALUES ('layers', ?)", (json.dumps(meta),))
+    conn.commit()
+    conn.close()
+    # 旧库被读连接打开时（Windows）无法替换
+    pyramid_reader.close_job(job_id)
+    os.replace(tmp_path, final_path)
+
+    logger.info(f"瓦片金字塔生成完成: job_id={job_id}, 0-{max_zoom}级, "
+                f"{n_tiles}个非空瓦片, 耗时{time.time() - t0:.1f}s")
+    return final_path
+
+
+class TilePyramidReader:
+    """读取任务瓦片库（只读连接，库文件替换后自动重新打开）
+
+    每个线程每个任务一个连接，全部登记在 _conns 中（加锁访问）；每个线程
+    最多保留 MAX_OPEN_PER_THREAD 个任务的连接（LRU）。close_job 关闭所有
+    线程持有的该任务连接（Windows 上打开的库文件无法替换或删除），已退出
+    线程的连接在新建连接时一并关闭。
+    """
+
+    def __init__(self):
+        # (线程 id, job_id) → (TrackedConnection, layers)，按最近使用排序
+        self._conns = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _close_dead_threads(self):
+        """关闭已退出线程的连接（调用方持有 _lock）"""
+        alive = {t.ident for t in threading.enumerate()}
+        for key in [k for k in self._conns if k[0] not in alive]:
+            self._conns.pop(key)[0].close()
+
+    def _open(self, job_id):
+        """本线程的 (连接, layers)；没有瓦片库时返回 None"""
+        path = pyramid_path(job_id)
+        try:
+            ino = os.stat(path).st_ino
+        except FileNotFoundError:
+            return None
+
+        ident = threading.get_ident()
+        key = (ident, job_id)
+        with self._lock:
+            cached = self._conns.get(key)
+            if cached is not None:
+                self._conns.move_to_end(key)
+        if cached is not None and not cached[0].closed and cached[0].ino == ino:
+            return cached
+        if cached is not None:
+            cached[0].close()
+
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        row = conn.execute("SELECT value FROM metadata WHERE name='layers'").fetchone()
+        opened = (TrackedConnection(conn, ino), json.loads(row[0]) if row else {})
+        with self._lock:
+            self._close_dead_threads()
+            self._conns[key] = opened
+            own = [k for k in self._conns if k[0] == ident]
+            for old in own[:max(0, len(own) - MAX_OPEN_PER_THREAD)]:
+                self._conns.pop(old)[0].close()
+        return opened
+
+    def covers(self, job_id, layer_name, version, z):
+        """该层级是否已预渲染（且版本一致）"""
+        try:
+            opened = self._open(job_id)
+        except sqlite3.Error as e:
+            logger.warning(f"读取瓦片金字塔失败: {str(e)}")
+            return False
+        if opened is None:
+            return False
+        info = opened[1].get(layer_name)
+        return info is not None and info["version"] == version and z <= info["max_zoom"]
+
+    def get(self, job_id, layer_name, version, z, x, y):
+        """查询预渲染瓦片。
+
+        Returns:
+            (covered, png)：covered 为 False 表示该层级未预渲染（或版本过期），
+            需要动态渲染；covered 为 True 且 png 为 None 表示空瓦片。
+        """
+        try:
+            opened = self._open(job_id)
+            if opened is None:
+                return False, None
+            entry, layers = opened
+            info = layers.get(layer_name)
+            if info is None or info["version"] != version or z > info["max_zoom"]:
+                return False, None
+            with entry.lock:
+                if entry.closed:
+                    return False, None
+                row = entry.conn.execute(
+                    "SELECT data FROM tiles WHERE layer=? AND z=? AND x=? AND y=?",
+                    (layer_name, z, x, y),
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"读取瓦片金字塔失败: {str(e)}")
+            return False, None
+        return True, bytes(row[0]) if row else None
+
+    def close_job(self, job_id):
+        """关闭所有线程持有的该任务瓦片库连接"""
+        with self._lock:
+            entries = [self._conns.pop(k)[0] for k in list(self._conns) if k[1] == job_id]
+        for entry in entries:
+            entry.close()
+
+
+pyramid_reader = TilePyramidReader()
@@ -1,23 +1,42 @@
 """瓦片服务 — 从 app.py 抽取"""
-import io
+import os
 import math
 import logging
+import threading
+from functools import lru_cache
 import numpy as np
-import rasterio
+from rasterio.crs import CRS
 from rasterio.windows import from_bounds, Window
-from rasterio.warp import transform_bounds, calculate_default_transform, reproject
+from rasterio.transform import from_bounds as from_bounds_transform
+from rasterio.warp import reproject
 from rasterio.enums import Resampling
-from PIL import Image
+from config import (
+    UPLOAD_DIR, JOB_DIR, TILE_CACHE_MAX_BYTES, TILE_DISK_CACHE, TILE_RENDER_CONCURRENCY,
+    TILE_RENDER_TIMEOUT, TILE_METATILE_SIZE,
+)
+from services.tile_cache import TileCache
+from services.tile_encoder import PNG, EMPTY_TILES, encode_tile
+from services.raster_pool import open_dataset, close_datasets, cached_transform_bounds
+from services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
 TILE_SIZE = 256
 EARTH_RADIUS = 6378137.0
 ORIGIN_SHIFT = 2 * math.pi * EARTH_RADIUS / 2.0
+WEB_MERCATOR = "EPSG:3857"
+WEB_MERCATOR_CRS = CRS.from_epsg(3857)
 
-# 简单内存瓦片缓存
-_tile_cache = {}
-_tile_cache_max = 500
+# 两级瓦片缓存（进程内 LRU + 任务目录下共享 SQLite）
+tile_cache = TileCache(TILE_CACHE_MAX_BYTES, JOB_DIR if TILE_DISK_CACHE else None)
+
+# 同一瓦片的并发渲染合并为一次；每个进程同时渲染的瓦片数有上限
+_render_flight = SingleFlight()
+_render_slots = threading.BoundedSemaphore(TILE_RENDER_CONCURRENCY)
+
+
+class TileRenderBusy(Exception):
+    """等待渲染槽位或同一瓦片的渲染结果超时"""
 
 
 def tile_bounds_3857(z, x, y):
@@ -30,21 +49,27 @@ def tile_bounds_3857(z, x, y):
     return (minx, miny, maxx, maxy)
 
 
-def get_tile_cache_key(job_id, layer_name, z, x, y):
-    return f"{job_id}:{layer_name}:{z}:{x}:{y}"
+def tile_version(tif_path):
+    """源栅格版本号（mtime），任务重新运行后缓存键随之变化"""
+    return os.stat(tif_path).st_mtime_ns
+
+
+def cache_tile(job_id, layer_name, version, z, x, y, png_bytes):
+    tile_cache.put(job_id, layer_name, version, z, x, y, png_bytes)
 
 
-def cache_tile(key, png_bytes):
-    global _tile_cache
-    if len(_tile_cache) >= _tile_cache_max:
-        keys_to_remove = list(_tile_cache.keys())[: int(_tile_cache_max * 0.2)]
-        for k in keys_to_remove:
-            del _tile_cache[k]
-    _tile_cache[key] = png_bytes
+def get_cached_tile(job_id, layer_name, version, z, x, y):
+    return tile_cache.get(job_id, layer_name, version, z, x, y)
 
 
-def get_cached_tile(key):
-    return _tile_cache.get(key)
+def invalidate_job_tiles(job_id):
+    """任务删除或重新运行时清理其瓦片缓存，并释放各线程持有的该任务栅格句柄与瓦片库连接"""
+    from services.tile_pyramid import pyramid_reader
+
+    tile_cache.invalidate_job(job_id)
+    pyramid_reader.close_job(job_id)
+    close_datasets(os.path.join(JOB_DIR, job_id))
+    close_datasets(os.path.join(UPLOAD_DIR, job_id))
 
 
 LAYER_COLORMAPS = {
@@ -52,7 +77,18 @@ LAYER_COLORMAPS = {
     "disturbance_year": {"type": "year_gradient", "start": (255, 100, 100), "end": (139, 0, 0), "range": (1980, 2050)},
     "recovery_year": {"type": "year_gradient", "start": (144, 238, 144), "end": (0, 100, 0), "range": (1980, 2050)},
     "potential_disturbance": {"type": "continuous", "color": (255, 165, 0)},
-    "res_disturbance_type": {"type": "categorical_range"},
+    # 49 类模板按行为分组（见 sample_generator.creat_sample），组内颜色由浅到深渐变
+    "res_disturbance_type": {
+        "type": "categorical_range",
+        "ranges": [
+            ((1, 9), (254, 202, 202), (185, 28, 28)),      # 仅扰动
+            ((10, 36), (254, 215, 170), (194, 65, 12)),    # 扰动后恢复
+            ((37, 37), (134, 239, 172), (134, 239, 172)),  # 稳定植被
+            ((38, 40), (168, 162, 158), (87, 83, 78)),     # 持续低值
+            ((41, 49), (191, 219, 254), (29, 78, 216)),    # 仅恢复
+        ],
+        "alpha": 180,
+    },
 }
 
 LAYER_FILES = {
@@ -63,65 +99,246 @@ LAYER_FILES = {
     "res_disturbance_type": "res_disturbance_type.tif",
 }
 
+# 查找表大小：类别图层 256 项（uint8 索引），年份/连续图层 65536 项（uint16 索引）
+LUT_SIZES = {"categorical": 256, "categorical_range": 256, "year_gradient": 65536, "continuous": 65536}
 
-def apply_colormap(data, layer_name, nodata=None):
-    """将栅格数据转换为 RGBA 图像数组"""
-    h, w = data.shape
-    rgba = np.zeros((h, w, 4), dtype=np.uint8)
 
-    config = LAYER_COLORMAPS.get(layer_name, {"type": "default"})
+@lru_cache(maxsize=64)
+def colormap_lut(layer_name, vmax=None):
+    """构建图层的 RGBA 查找表。
 
-    valid = np.ones((h, w), dtype=bool)
-    if nodata is not None:
-        valid = valid & (data != nodata)
-    valid = valid & ~np.isnan(data) & (data != 0)
+    索引 0 固定为透明（无效/无数据）。连续图层的索引 i 表示数值 i * scale，
+    scale = vmax / 65535，即 [0, vmax] 均匀量化到 uint16。
+
+    Returns:
+        (lut, scale)：lut 为 (N, 4) uint8 数组
+    """
+    config = LAYER_COLORMAPS[layer_name]
+    kind = config["type"]
+    size = LUT_SIZES[kind]
+    lut = np.zeros((size, 4), dtype=np.uint8)
+    values = np.arange(size, dtype=np.float64)
+    scale = 1.0
 
-    if config["type"] == "categorical":
+    if kind == "categorical":
         for val, color in config["colors"].items():
-            mask = (data == val) & valid
-            rgba[mask] = color
+            lut[val] = color
 
-    elif config["type"] == "year_gradient":
+    elif kind == "categorical_range":
+        for (lo, hi), start, end in config["ranges"]:
+            t = (values[lo:hi + 1] - lo) / max(hi - lo, 1)
+            for c in range(3):
+                lut[lo:hi + 1, c] = (start[c] + t * (end[c] - start[c])).astype(np.uint8)
+            lut[lo:hi + 1, 3] = config["alpha"]
+
+    elif kind == "year_gradient":
         y_min, y_max = config["range"]
         start = np.array(config["start"])
         end = np.array(config["end"])
-        normalized = np.clip((data - y_min) / (y_max - y_min), 0, 1)
+        normalized = np.clip((values - y_min) / (y_max - y_min), 0, 1)
         for c in range(3):
-            rgba[valid, c] = (start[c] + normalized[valid] * (end[c] - start[c])).astype(np.uint8)
-        rgba[valid, 3] = 180
-
-    elif config["type"] == "continuous":
-        color = config["color"]
-        rgba[valid, 0] = color[0]
-        rgba[valid, 1] = color[1]
-        rgba[valid, 2] = color[2]
-        max_val = np.nanmax(data[valid]) if np.any(valid) else 1
-        if max_val > 0:
-            rgba[valid, 3] = (150 * np.minimum(data[valid] / max_val, 1)).astype(np.uint8)
-
-    else:
-        rgba[valid, 0] = ((data[valid] * 37) % 200 + 55).astype(np.uint8)
-        rgba[valid, 1] = ((data[valid] * 73) % 200 + 55).astype(np.uint8)
-        rgba[valid, 2] = ((data[valid] * 113) % 200 + 55).astype(np.uint8)
-        rgba[valid, 3] = 180
+            lut[:, c] = (start[c] + normalized * (end[c] - start[c])).astype(np.uint8)
+        lut[:, 3] = 180
 
-    return rgba
+    elif kind == "continuous":
+        lut[:, :3] = config["color"]
+        if vmax and vmax > 0:
+            scale = vmax / (size - 1)
+            lut[:, 3] = (150 * np.minimum(values * scale / vmax, 1)).astype(np.uint8)
 
+    lut[0] = 0
+    return lut, scale
 
-def make_transparent_tile():
-    """生成透明 PNG 瓦片的字节"""
-    img = Image.new("RGBA", (TILE_SIZE, TILE_SIZE), (0, 0, 0, 0))
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    return buffer.getvalue()
 
+def lut_index_dtype(layer_name):
+    return np.uint8 if LUT_SIZES[LAYER_COLORMAPS[layer_name]["type"]] == 256 else np.uint16
 
-def render_tile(tif_path, layer_name, z, x, y):
-    """渲染一个瓦片，返回 PNG 字节"""
-    tile_b = tile_bounds_3857(z, x, y)
 
-    with rasterio.open(tif_path) as src:
-        src_bounds = transform_bounds("EPSG:3857", src.crs, *tile_b)
+def to_lut_index(data, layer_name, nodata=None, scale=1.0):
+    """将栅格数值转换为查找表索引（无效值、无数据、0 → 0）"""
+    dtype = lut_index_dtype(layer_name)
+    size = np.iinfo(dtype).max + 1
+
+    values = data if scale == 1.0 else np.rint(data / scale)
+    valid = np.isfinite(values)
+    if nodata is not None:
+        valid &= data != nodata
+    idx = np.clip(np.where(valid, values, 0), 0, size - 1)
+    return idx.astype(dtype)
+
+
+@lru_cache(maxsize=256)
+def _raster_max(tif_path, mtime_ns):
+    with open_dataset(tif_path) as src:
+        vmax = 0.0
+        for _, window in src.block_windows(1):
+            data = src.read(1, window=window).astype(np.float64)
+            valid = np.isfinite(data)
+            if src.nodata is not None:
+                valid &= data != src.nodata
+            if valid.any():
+                vmax = max(vmax, float(data[valid].max()))
+    return vmax
+
+
+def layer_value_max(tif_path):
+    """图层全局最大值（按文件版本缓存），用于连续图层的统一配色"""
+    return _raster_max(tif_path, tile_version(tif_path))
+
+
+def layer_lut(tif_path, layer_name):
+    """图层文件对应的查找表 (lut, scale)"""
+    vmax = None
+    if LAYER_COLORMAPS[layer_name]["type"] == "continuous":
+        vmax = layer_value_max(tif_path)
+    return colormap_lut(layer_name, vmax)
+
+
+def apply_colormap(data, layer_name, nodata=None, lut=None):
+    """将栅格数据转换为 RGBA 图像数组。
+
+    已配置的图层通过查找表一次索引完成；lut 为 None 时按数据本身构建
+    （连续图层此时退化为按瓦片最大值归一化）。
+    """
+    if layer_name not in LAYER_COLORMAPS:
+        return _apply_default_colormap(data, nodata)
+
+    if lut is None:
+        vmax = None
+        if LAYER_COLORMAPS[layer_name]["type"] == "continuous":
+            valid = np.isfinite(data) & (data != 0)
+            if nodata is not None:
+                valid &= data != nodata
+            vmax = float(np.max(data[valid])) if valid.any() else None
+        lut = colormap_lut(layer_name, vmax)
+
+    table, scale = lut
+    return table[to_lut_index(data, layer_name, nodata, scale)]
+
+
+def _apply_default_colormap(data, nodata=None):
+    """未配置图层：按数值生成伪随机颜色"""
+    h, w = data.shape
+    rgba = np.zeros((h, w, 4), dtype=np.uint8)
+
+    valid = np.ones((h, w), dtype=bool)
+    if nodata is not None:
+        valid = valid & (data != nodata)
+    valid = valid & ~np.isnan(data) & (data != 0)
+
+    rgba[valid, 0] = ((data[valid] * 37) % 200 + 55).astype(np.uint8)
+    rgba[valid, 1] = ((data[valid] * 73) % 200 + 55).astype(np.uint8)
+    rgba[valid, 2] = ((data[valid] * 113) % 200 + 55).astype(np.uint8)
+    rgba[valid, 3] = 180
+
+    return rgba
+
+
+def render_tile(tif_path, layer_name, z, x, y, fmt=PNG):
+    """渲染一个瓦片，返回编码后的字节（空瓦片返回共享的空瓦片常量）"""
+    index = render_tile_index(tif_path, layer_name, z, x, y)
+    if index is None or not index.any():
+        return EMPTY_TILES[fmt]
+    return encode_tile(index, layer_lut(tif_path, layer_name)[0], fmt)
+
+
+def render_metatile(tif_path, layer_name, z, x0, y0, n, fmt=PNG):
+    """渲染 n×n 瓦片块并逐个编码，返回 {(x, y): bytes}（空瓦片为共享常量）"""
+    index = render_metatile_index(tif_path, layer_name, z, x0, y0, n)
+    lut = layer_lut(tif_path, layer_name)[0]
+    tiles = {}
+    for j in range(n):
+        for i in range(n):
+            sub = None
+            if index is not None:
+                sub = index[j * TILE_SIZE:(j + 1) * TILE_SIZE, i * TILE_SIZE:(i + 1) * TILE_SIZE]
+            if sub is None or not sub.any():
+                tiles[(x0 + i, y0 + j)] = EMPTY_TILES[fmt]
+            else:
+                tiles[(x0 + i, y0 + j)] = encode_tile(sub, lut, fmt)
+    return tiles
+
+
+def metatile_origin(z, x, y):
+    """瓦片所在元瓦片的左上角与边长 (x0, y0, n)"""
+    n = max(1, min(TILE_METATILE_SIZE, 2 ** z))
+    return x - x % n, y - y % n, n
+
+
+def _cached_metatile(job_id, cache_layer, version, z, x0, y0, n):
+    """元瓦片内全部瓦片都已缓存时返回 {(x, y): bytes}，否则返回 None"""
+    tiles = {}
+    for y in range(y0, y0 + n):
+        for x in range(x0, x0 + n):
+            cached = get_cached_tile(job_id, cache_layer, version, z, x, y)
+            if cached is None:
+                return None
+            tiles[(x, y)] = cached
+    return tiles
+
+
+def render_tile_coalesced(job_id, cache_layer, version, tif_path, layer_name, z, x, y, fmt=PNG):
+    """渲染并缓存一个瓦片。
+
+    按元瓦片渲染：第一次未命中时渲染瓦片所在的整个 n×n 块并全部写入缓存；
+    同一元瓦片的并发请求等待同一次渲染的结果（结果总是包含整个元瓦片）。
+
+    Raises:
+        TileRenderBusy: 在 TILE_RENDER_TIMEOUT 内拿不到渲染槽位或等不到结果
+    """
+    x0, y0, n = metatile_origin(z, x, y)
+
+    def work():
+        # 可能刚有另一次渲染完成并写入缓存
+        tiles = _cached_metatile(job_id, cache_layer, version, z, x0, y0, n)
+        if tiles is not None:
+            return tiles
+        if not _render_slots.acquire(timeout=TILE_RENDER_TIMEOUT):
+            raise TileRenderBusy(f"渲染槽位已满: {job_id}/{layer_name}/{z}/{x}/{y}")
+        try:
+            tiles = render_metatile(tif_path, layer_name, z, x0, y0, n, fmt)
+        finally:
+            _render_slots.release()
+        tile_cache.put_many(job_id, cache_layer, version, z, tiles)
+        return tiles
+
+    try:
+        tiles = _render_flight.do((job_id, cache_layer, version, z, x0, y0), work, TILE_RENDER_TIMEOUT)
+    except TimeoutError as e:
+        raise TileRenderBusy(str(e))
+    return tiles[(x, y)]
+
+
+def render_tile_rgba(tif_path, layer_name, z, x, y):
+    """渲染一个瓦片的 RGBA 数组；瓦片与数据不相交时返回 None"""
+    index = render_tile_index(tif_path, layer_name, z, x, y)
+    return None if index is None else layer_lut(tif_path, layer_name)[0][index]
+
+
+def render_tile_index(tif_path, layer_name, z, x, y):
+    """渲染一个瓦片的查找表索引数组；瓦片与数据不相交时返回 None"""
+    return render_metatile_index(tif_path, layer_name, z, x, y, 1)
+
+
+def render_metatile_index(tif_path, layer_name, z, x0, y0, n):
+    """渲染以 (x0, y0) 为左上角的 n×n 瓦片块，一次读取、一次重投影。
+
+    Returns:
+        (n*256, n*256) 查找表索引数组；瓦片块与数据不相交时返回 None
+    """
+    from services.mercator_raster import read_mercator_block
+
+    # 优先使用预投影的 EPSG:3857 副本（已是查找表索引，无需重投影）
+    handled, index = read_mercator_block(tif_path, z, x0, y0, n)
+    if handled:
+        return index
+
+    minx, _, _, maxy = tile_bounds_3857(z, x0, y0)
+    _, miny, maxx, _ = tile_bounds_3857(z, x0 + n - 1, y0 + n - 1)
+    size = TILE_SIZE * n
+
+    with open_dataset(tif_path) as src:
+        src_bounds = cached_transform_bounds(WEB_MERCATOR, src.crs_string, minx, miny, maxx, maxy)
 
         data_bounds = src.bounds
         if (
@@ -130,47 +347,32 @@ def render_tile(tif_path, layer_name, z, x, y):
             or src_bounds[3] < data_bounds.bottom
             or src_bounds[1] > data_bounds.top
         ):
-            return make_transparent_tile()
+            return None
 
+        # 多读 1 个像元的边缘，保证最近邻采样不缺边
         window = from_bounds(*src_bounds, src.transform)
-
-        row_off = max(0, int(window.row_off))
-        col_off = max(0, int(window.col_off))
-        row_end = min(src.height, int(window.row_off + window.height))
-        col_end = min(src.width, int(window.col_off + window.width))
+        row_off = max(0, int(math.floor(window.row_off)) - 1)
+        col_off = max(0, int(math.floor(window.col_off)) - 1)
+        row_end = min(src.height, int(math.ceil(window.row_off + window.height)) + 1)
+        col_end = min(src.width, int(math.ceil(window.col_off + window.width)) + 1)
 
         if row_end <= row_off or col_end <= col_off:
-            return make_transparent_tile()
+            return None
 
         read_window = Window(col_off, row_off, col_end - col_off, row_end - row_off)
         data = src.read(1, window=read_window)
-        window_transform = src.window_transform(read_window)
-
-        dst_transform, dst_width, dst_height = calculate_default_transform(
-            src.crs,
-            "EPSG:3857",
-            data.shape[1],
-            data.shape[0],
-            *src_bounds,
-            dst_width=TILE_SIZE,
-            dst_height=TILE_SIZE,
-        )
-
-        dst_data = np.zeros((TILE_SIZE, TILE_SIZE), dtype=data.dtype)
 
+        dst_data = np.zeros((size, size), dtype=data.dtype)
         reproject(
             source=data,
             destination=dst_data,
-            src_transform=window_transform,
+            src_transform=src.window_transform(read_window),
             src_crs=src.crs,
-            dst_transform=dst_transform,
-            dst_crs="EPSG:3857",
+            src_nodata=src.nodata,
+            dst_transform=from_bounds_transform(minx, miny, maxx, maxy, size, size),
+            dst_crs=WEB_MERCATOR_CRS,
+            dst_nodata=src.nodata,
             resampling=Resampling.nearest,
         )
 
-        rgba = apply_colormap(dst_data, layer_name, src.nodata)
-
-    img = Image.fromarray(rgba, "RGBA")
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG", optimize=True)
-    return buffer.getvalue()
+        return to_lut_index(dst_data, layer_name, src.nodata, layer_lut(tif_path, layer_name)[1])
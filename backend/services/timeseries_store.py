@@ -0,0 +1,186 @@
+"""像元优先的 NDVI 时间序列存储 — 单像元序列连续存放
+
+上传的 NDVI GeoTIFF 按波段交错存储，读取一个像元的完整时间序列要
+在每个波段各解码一个内部块，多边形统计要读的块更多。上传完成后在后台
+为 ndvi.tif 生成一份派生存储（与之同目录）：
+
+- <name>.pixels.<版本>.npy  内存映射数组，形状 (行块数, 列块数, 块内像元数, 波段数)，
+                            块为 TIMESERIES_STORE_BLOCK 见方，块内像元按行优先编号；
+                            每个像元的序列是连续的 波段数×字节数，一次顺序读取即得
+- <name>.pixels.json        栅格元数据（尺寸、块边长、nodata、源文件 mtime、数组文件名）
+
+右/下边缘不满的块以 nodata（无 nodata 时为 0）填充。元数据最后写入，
+其中记录的源文件 mtime 与 ndvi.tif 一致即表示存储有效；缺失或过期时
+调用方回退到 GeoTIFF 窗口读取，不在请求中同步生成。
+
+每次生成写入新的数组文件，原子替换元数据即切换引用：正在被其他请求
+内存映射的旧数组不会被覆盖（Windows 上也无法替换被映射的文件），
+旧数组在下次生成时删除，删除失败（仍被映射）则留待以后。
+
+iter_blocks 按块顺序遍历整幅数据，可用于分块（out-of-core）计算。
+"""
+import os
+import glob
+import json
+import time
+import logging
+from functools import lru_cache
+
+import numpy as np
+from rasterio.windows import Window
+
+from config import UPLOAD_DIR, TIMESERIES_STORE_BLOCK
+from services.raster_pool import open_dataset
+
+logger = logging.getLogger(__name__)
+
+# 生成时每次读取的源数据上限（字节）
+READ_BUDGET = 64 * 1024 * 1024
+
+
+def store_meta_path(tif_path):
+    return os.path.splitext(tif_path)[0] + ".pixels.json"
+
+
+def _array_pattern(tif_path):
+    return glob.escape(os.path.splitext(tif_path)[0]) + ".pixels.*.npy"
+
+
+def _remove_stale_arrays(tif_path, current):
+    """删除未被元数据引用的旧数组文件（仍被映射而删除失败的留待下次）"""
+    for path in glob.glob(_array_pattern(tif_path)):
+        if os.path.basename(path) == current:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class TimeseriesStore:
+    """像元优先存储的只读视图"""
+
+    def __init__(self, array, meta):
+        self.array = array
+        self.height = meta["height"]
+        self.width = meta["width"]
+        self.block = meta["block"]
+        self.count = meta["count"]
+        self.nodata = meta["nodata"]
+
+    def pixel(self, row, col):
+        """(row, col) 处的时间序列，shape (波段数,)"""
+        b = self.block
+        return self.array[row // b, col // b, (row % b) * b + col % b]
+
+    def pixels(self, rows, cols):
+        """多个像元的时间序列，shape (点数, 波段数)；按块分组依次读取"""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        b = self.block
+        flat = ((rows // b) * self.array.shape[1] + cols // b) * b * b + (rows % b) * b + cols % b
+        order = np.argsort(flat, kind="stable")
+        out = np.empty((len(flat), self.count), dtype=self.array.dtype)
+        out[order] = self.array.reshape(-1, self.count)[flat[order]]
+        return out
+
+    def read_window(self, row_off, col_off, height, width):
+        """窗口内全部像元的时间序列，shape (height, width, 波段数)"""
+        b = self.block
+        out = np.empty((height, width, self.count), dtype=self.array.dtype)
+        for rb in range(row_off // b, (row_off + height - 1) // b + 1):
+            for cb in range(col_off // b, (col_off + width - 1) // b + 1):
+                r0, c0 = max(rb * b, row_off), max(cb * b, col_off)
+                r1 = min((rb + 1) * b, row_off + height)
+                c1 = min((cb + 1) * b, col_off + width)
+                chunk = self.array[rb, cb].reshape(b, b, self.count)
+                out[r0 - row_off:r1 - row_off, c0 - col_off:c1 - col_off] = \
+                    chunk[r0 - rb * b:r1 - rb * b, c0 - cb * b:c1 - cb * b]
+        return out
+
+    def iter_blocks(self):
+        """按块遍历：yield (row_off, col_off, values)，values 形状 (h, w, 波段数)，已裁去边缘填充"""
+        b = self.block
+        n_row_blocks, n_col_blocks = self.array.shape[:2]
+        for rb in range(n_row_blocks):
+            h = min(b, self.height - rb * b)
+            for cb in range(n_col_blocks):
+                w = min(b, self.width - cb * b)
+                yield rb * b, cb * b, self.array[rb, cb].reshape(b, b, self.count)[:h, :w]
+
+
+def build_timeseries_store(tif_path, block=None):
+    """由多波段 GeoTIFF 生成像元优先存储，返回 TimeseriesStore"""
+    block = block or TIMESERIES_STORE_BLOCK
+    meta_path = store_meta_path(tif_path)
+    array_path = f"{os.path.splitext(tif_path)[0]}.pixels.{time.time_ns():x}.npy"
+    source_mtime = os.stat(tif_path).st_mtime_ns
+
+    with open_dataset(tif_path) as ds:
+        count, height, width = ds.count, ds.height, ds.width
+        dtype = np.dtype(ds.dtypes[0])
+        nodata = ds.nodata
+        n_row_blocks = -(-height // block)
+        n_col_blocks = -(-width // block)
+        # 每次读取一行块中的若干列块，控制内存占用
+        span = max(1, min(n_col_blocks, READ_BUDGET // (count * block * block * dtype.itemsize)))
+        fill = nodata if nodata is not None else 0
+
+        array = np.lib.format.open_memmap(
+            array_path, mode="w+", dtype=dtype, shape=(n_row_blocks, n_col_blocks, block * block, count))
+        for rb in range(n_row_blocks):
+            row0 = rb * block
+            h = min(block, height - row0)
+            for cb0 in range(0, n_col_blocks, span):
+                k = min(span, n_col_blocks - cb0)
+                col0 = cb0 * block
+                w = min(k * block, width - col0)
+                data = ds.read(window=Window(col0, row0, w, h))
+                padded = np.full((count, block, k * block), fill, dtype=dtype)
+                padded[:, :h, :w] = data
+                # (波段, 行, 列块, 列) → (列块, 行, 列, 波段)
+                array[rb, cb0:cb0 + k] = padded.reshape(count, block, k, block) \
+                    .transpose(2, 1, 3, 0).reshape(k, block * block, count)
+        array.flush()
+        del array
+
+    meta = {
+        "height": height, "width": width, "count": count, "block": block,
+        "dtype": dtype.str, "nodata": nodata, "source_mtime_ns": source_mtime,
+        "array": os.path.basename(array_path),
+    }
+    tmp_meta = meta_path + ".tmp"
+    with open(tmp_meta, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, meta_path)
+    _remove_stale_arrays(tif_path, meta["array"])
+
+    logger.info(f"时间序列存储生成完成: {tif_path}, {height}x{width}x{count}")
+    return _load_store(meta_path, os.stat(meta_path).st_mtime_ns)[0]
+
+
+@lru_cache(maxsize=8)
+def _load_store(meta_path, mtime_ns):
+    with open(meta_path) as f:
+        meta = json.load(f)
+    array_path = os.path.join(os.path.dirname(meta_path), meta["array"])
+    return TimeseriesStore(np.load(array_path, mmap_mode="r"), meta), meta["source_mtime_ns"]
+
+
+def get_timeseries_store(tif_path):
+    """tif_path 当前有效的像元优先存储；未生成或已过期返回 None"""
+    meta_path = store_meta_path(tif_path)
+    try:
+        mtime = os.stat(meta_path).st_mtime_ns
+        source_mtime = os.stat(tif_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    store, built_from = _load_store(meta_path, mtime)
+    return store if built_from == source_mtime else None
+
+
+def build_upload_timeseries_store(job_id):
+    """上传后处理步骤：为 ndvi.tif 生成像元优先存储"""
+    tif_path = os.path.join(UPLOAD_DIR, job_id, "ndvi.tif")
+    if os.path.exists(tif_path):
+        build_timeseries_store(tif_path)
@@ -0,0 +1,319 @@
+"""矢量瓦片 — 结果栅格多边形化后按瓦片裁剪、按缩放级别简化，输出 MVT
+
+/api/result-geojson 每次都把整幅栅格多边形化并以全分辨率返回全部要素，
+省级任务的响应可达数十 MB。本模块为每个任务图层建立一次多边形索引
+(JOB_DIR/<job_id>/vector_<layer>.npz)：
+
+- 多级多边形（polygonize.py）的顶点一次性投影到 EPSG:3857，按环/多边形的
+  偏移数组存储；低于原生分辨率的缩放级别使用对应的简化级别
+- 网格索引：把每个多边形的外包框登记到 index_zoom 级的瓦片单元中
+  （CSR 结构：单元键、偏移、多边形编号）
+
+请求瓦片时只取出与瓦片相交的多边形：
+
+1. 外包框小于半个屏幕像元的多边形直接丢弃
+2. 变换到瓦片坐标（extent 4096），超出瓦片（含缓冲区）的环用
+   Sutherland–Hodgman 算法裁剪
+3. 按屏幕像元网格吸附顶点并去掉重复点与共线点（随缩放级别简化），
+   退化的环丢弃
+4. 手写 protobuf 编码为 MVT（见 mvt_encoder.py）
+
+索引在任务完成后的后处理中生成；缺失或过期时在首次请求时生成。
+"""
+import os
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+from config import JOB_DIR
+from services.tile_service import ORIGIN_SHIFT, WEB_MERCATOR, tile_bounds_3857, tile_version
+from services.raster_pool import open_dataset, get_transformer
+from services.single_flight import SingleFlight
+from services.mvt_encoder import encode_tile
+from services.polygonize import build_polygons, get_polygons, level_for_zoom
+
+logger = logging.getLogger(__name__)
+
+VECTOR_LAYER_FILES = {
+    "disturbance_mask": "mining_disturbance_mask.tif",
+    "disturbance_year": "mining_disturbance_year.tif",
+    "recovery_year": "mining_recovery_year.tif",
+}
+
+MVT_MIMETYPE = "application/vnd.mapbox-vector-tile"
+EXTENT = 4096
+# 瓦片四周的缓冲区（瓦片坐标单位），避免相邻瓦片接缝处描边断开
+BUFFER = 64
+# 顶点吸附网格（瓦片坐标单位）：一个屏幕像元
+SNAP = EXTENT // 256
+# 网格索引层级比原生分辨率低几级
+INDEX_ZOOM_OFFSET = 3
+
+_build_flight = SingleFlight()
+
+
+def vector_index_path(job_id, layer_name):
+    return os.path.join(JOB_DIR, job_id, f"vector_{layer_name}.npz")
+
+
+# ============= 索引构建 =============
+
+def project_polygons(tif_path):
+    """结果栅格的多级多边形（见 polygonize.py）投影到 EPSG:3857。
+
+    Returns:
+        dict: 每个级别 k 的 coords_k (N, 2), ring_offsets_k (R+1), poly_rings_k (P+1)，
+        以及 values (P)、bboxes (P, 4，取自级别 0 外环)、n_levels
+    """
+    polygons = get_polygons(tif_path)
+    tfm = get_transformer(polygons.crs_string, WEB_MERCATOR) if polygons.crs_string else None
+
+    out = {"values": polygons.values, "n_levels": polygons.n_levels}
+    for k in range(polygons.n_levels):
+        coords = polygons.world_coords(k)
+        if tfm is not None and len(coords):
+            x, y = tfm.transform(coords[:, 0], coords[:, 1])
+            coords = np.column_stack([x, y])
+        _, ring_offsets, poly_rings = polygons.levels[k]
+        out[f"coords_{k}"] = coords
+        out[f"ring_offsets_{k}"] = ring_offsets
+        out[f"poly_rings_{k}"] = poly_rings
+
+    # 外环决定外包框（简化只会删除顶点，各级别外包框不超过级别 0）
+    coords, ring_offsets, poly_rings = out["coords_0"], out["ring_offsets_0"], out["poly_rings_0"]
+    bboxes = np.zeros((len(polygons), 4))
+    if len(polygons):
+        lo = np.minimum.reduceat(coords, ring_offsets[:-1])[poly_rings[:-1]]
+        hi = np.maximum.reduceat(coords, ring_offsets[:-1])[poly_rings[:-1]]
+        bboxes = np.column_stack([lo, hi])
+    out["bboxes"] = bboxes
+    return out
+
+
+def _tile_index(v, z, axis):
+    span = 2 * ORIGIN_SHIFT / 2 ** z
+    i = (v + ORIGIN_SHIFT) / span if axis == "x" else (ORIGIN_SHIFT - v) / span
+    return np.clip(np.floor(i), 0, 2 ** z - 1).astype(np.int64)
+
+
+def build_grid(bboxes, index_zoom):
+    """外包框 → index_zoom 级网格单元的 CSR 索引 (cell_keys, cell_offsets, cell_items)"""
+    n = 2 ** index_zoom
+    x0, x1 = _tile_index(bboxes[:, 0], index_zoom, "x"), _tile_index(bboxes[:, 2], index_zoom, "x")
+    y0, y1 = _tile_index(bboxes[:, 3], index_zoom, "y"), _tile_index(bboxes[:, 1], index_zoom, "y")
+    nx, ny = x1 - x0 + 1, y1 - y0 + 1
+    counts = nx * ny
+
+    pid = np.repeat(np.arange(len(bboxes)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    keys = (y0[pid] + k // nx[pid]) * n + x0[pid] + k % nx[pid]
+
+    order = np.argsort(keys, kind="stable")
+    cell_keys, starts = np.unique(keys[order], return_index=True)
+    return cell_keys, np.append(starts, len(keys)), pid[order]
+
+
+def build_vector_index(job_id, layer_name):
+    """多边形化并建立网格索引，写入 vector_<layer>.npz，返回路径"""
+    from services.mercator_raster import plan_grid
+
+    tif_path = os.path.join(JOB_DIR, job_id, VECTOR_LAYER_FILES[layer_name])
+    with open_dataset(tif_path) as ds:
+        native_zoom = plan_grid(ds)["native_zoom"]
+    index_zoom = max(0, native_zoom - INDEX_ZOOM_OFFSET)
+
+    polys = project_polygons(tif_path)
+    cell_keys, cell_offsets, cell_items = build_grid(polys["bboxes"], index_zoom)
+
+    path = vector_index_path(job_id, layer_name)
+    tmp_path = path[:-len(".npz")] + ".tmp.npz"
+    np.savez(tmp_path, index_zoom=index_zoom, native_zoom=native_zoom, version=tile_version(tif_path),
+             cell_keys=cell_keys, cell_offsets=cell_offsets, cell_items=cell_items, **polys)
+    os.replace(tmp_path, path)
+    logger.info(f"矢量瓦片索引生成完成: job_id={job_id}, layer={layer_name}, "
+                f"{len(polys['values'])}个多边形")
+    return path
+
+
+def build_job_polygons(job_id):
+    """任务完成后处理步骤：为全部矢量图层生成多级多边形"""
+    built = []
+    for filename in VECTOR_LAYER_FILES.values():
+        tif_path = os.path.join(JOB_DIR, job_id, filename)
+        if os.path.exists(tif_path):
+            built.append(build_polygons(tif_path))
+    return built
+
+
+def build_job_vector_indexes(job_id):
+    """任务完成后处理步骤：为全部矢量图层建立索引"""
+    built = []
+    for layer_name, filename in VECTOR_LAYER_FILES.items():
+        if os.path.exists(os.path.join(JOB_DIR, job_id, filename)):
+            built.append(build_vector_index(job_id, layer_name))
+    return built
+
+
+class VectorIndex:
+    """已加载的任务图层多边形索引"""
+
+    def __init__(self, arrays):
+        for name in ("values", "bboxes", "cell_keys", "cell_offsets", "cell_items"):
+            setattr(self, name, arrays[name])
+        self.index_zoom = int(arrays["index_zoom"])
+        self.native_zoom = int(arrays["native_zoom"])
+        self.levels = [
+            (arrays[f"coords_{k}"], arrays[f"ring_offsets_{k}"], arrays[f"poly_rings_{k}"])
+            for k in range(int(arrays["n_levels"]))
+        ]
+
+    def query(self, z, x, y, margin=0.0):
+        """与瓦片 (z, x, y)（四周扩展 margin 米）外包框相交的多边形编号"""
+        iz = self.index_zoom
+        minx, miny, maxx, maxy = tile_bounds_3857(z, x, y)
+        # 缓冲区可能伸入相邻单元
+        x0, x1 = _tile_index(np.array([minx - margin, maxx + margin]), iz, "x")
+        y0, y1 = _tile_index(np.array([maxy + margin, miny - margin]), iz, "y")
+        # 单元键按 (y, x) 排序：每一行覆盖的单元在 CSR 中连续，逐行取一段，
+        # 开销与瓦片覆盖的登记项成正比（低缩放级别不再扫描全部登记项）
+        rows = np.arange(y0, y1 + 1) * 2 ** iz
+        lo = self.cell_offsets[np.searchsorted(self.cell_keys, rows + x0, side="left")]
+        hi = self.cell_offsets[np.searchsorted(self.cell_keys, rows + x1, side="right")]
+        parts = [self.cell_items[a:b] for a, b in zip(lo, hi) if b > a]
+        candidates = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+        b = self.bboxes[candidates]
+        hit = ((b[:, 0] <= maxx + margin) & (b[:, 2] >= minx - margin)
+               & (b[:, 1] <= maxy + margin) & (b[:, 3] >= miny - margin))
+        return candidates[hit]
+
+    def level_for_zoom(self, z):
+        return level_for_zoom(self.native_zoom, z, len(self.levels))
+
+    def rings(self, pid, level=0):
+        coords, ring_offsets, poly_rings = self.levels[level]
+        r0, r1 = poly_rings[pid], poly_rings[pid + 1]
+        return [coords[ring_offsets[r]:ring_offsets[r + 1]] for r in range(r0, r1)]
+
+
+@lru_cache(maxsize=16)
+def _load_index(path, mtime_ns):
+    with np.load(path, allow_pickle=False) as npz:
+        return VectorIndex({k: npz[k] for k in npz.files})
+
+
+def get_vector_index(job_id, layer_name):
+    """加载（必要时先生成）任务图层的多边形索引"""
+    tif_path = os.path.join(JOB_DIR, job_id, VECTOR_LAYER_FILES[layer_name])
+    path = vector_index_path(job_id, layer_name)
+
+    def current():
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime < os.stat(tif_path).st_mtime_ns:
+            return None
+        return _load_index(path, mtime)
+
+    index = current()
+    if index is None:
+        _build_flight.do((job_id, layer_name), lambda: current() or build_vector_index(job_id, layer_name))
+        index = _load_index(path, os.stat(path).st_mtime_ns)
+    return index
+
+
+# ============= 瓦片生成 =============
+
+def _clip_axis(pts, axis, bound, keep_below):
+    """Sutherland–Hodgman：用一条轴向直线裁剪闭合环"""
+    if len(pts) == 0:
+        return pts
+    prev = np.roll(pts, 1, axis=0)
+    cur_in = pts[:, axis] <= bound if keep_below else pts[:, axis] >= bound
+    prev_in = np.roll(cur_in, 1)
+    cross = cur_in != prev_in
+
+    out = np.empty((2 * len(pts), 2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (bound - prev[:, axis]) / (pts[:, axis] - prev[:, axis])
+        out[0::2] = prev + t[:, None] * (pts - prev)
+    out[1::2] = pts
+    keep = np.empty(2 * len(pts), dtype=bool)
+    keep[0::2] = cross
+    keep[1::2] = cur_in
+    return out[keep]
+
+
+def clip_ring(pts, lo, hi):
+    """把环裁剪到 [lo, hi] 见方的范围内"""
+    if pts[:, 0].min() >= lo and pts[:, 1].min() >= lo and pts[:, 0].max() <= hi and pts[:, 1].max() <= hi:
+        return pts
+    for axis in (0, 1):
+        pts = _clip_axis(pts, axis, lo, keep_below=False)
+        pts = _clip_axis(pts, axis, hi, keep_below=True)
+    return pts
+
+
+def simplify_ring(pts, snap):
+    """吸附到 snap 网格，去掉重复点和共线点；退化（少于 3 点或面积为 0）时返回 None"""
+    q = (np.round(pts / snap) * snap).astype(np.int64)
+    q = q[np.any(q != np.roll(q, 1, axis=0), axis=1)]
+    if len(q) < 3:
+        return None
+    prev, nxt = np.roll(q, 1, axis=0), np.roll(q, -1, axis=0)
+    cross = (q[:, 0] - prev[:, 0]) * (nxt[:, 1] - q[:, 1]) - (q[:, 1] - prev[:, 1]) * (nxt[:, 0] - q[:, 0])
+    q = q[cross != 0]
+    if len(q) < 3:
+        return None
+    return q
+
+
+def _signed_area(q):
+    x, y = q[:, 0], q[:, 1]
+    return (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2
+
+
+def vector_tile(job_id, layer_name, z, x, y):
+    """生成瓦片 (z, x, y) 的 MVT 字节；瓦片内没有要素时返回 b""。"""
+    index = get_vector_index(job_id, layer_name)
+    minx, miny, maxx, maxy = tile_bounds_3857(z, x, y)
+    scale = EXTENT / (maxx - minx)
+    margin = BUFFER / scale
+    candidates = index.query(z, x, y, margin)
+
+    # 外包框小于半个屏幕像元的多边形在该级别不可见
+    b = index.bboxes[candidates]
+    visible = np.maximum(b[:, 2] - b[:, 0], b[:, 3] - b[:, 1]) * scale >= SNAP / 2
+    candidates = candidates[visible]
+
+    level = index.level_for_zoom(z)
+    is_year = "year" in layer_name
+    features = []
+    for pid in candidates:
+        rings = []
+        for i, ring in enumerate(index.rings(pid, level)):
+            pts = np.column_stack([(ring[:, 0] - minx) * scale, (maxy - ring[:, 1]) * scale])
+            pts = clip_ring(pts, -BUFFER, EXTENT + BUFFER)
+            q = simplify_ring(pts, SNAP) if len(pts) >= 3 else None
+            if q is None:
+                if i == 0:
+                    break  # 外环退化，整个多边形丢弃
+                continue
+            # 瓦片坐标 y 向下：外环面积为正（顺时针），内环为负
+            area = _signed_area(q)
+            if area == 0:
+                if i == 0:
+                    break
+                continue
+            if (area > 0) != (i == 0):
+                q = q[::-1]
+            rings.append(q.tolist())
+        if not rings:
+            continue
+        value = int(index.values[pid])
+        properties = {"value": value, "year": value} if is_year else {"value": value}
+        features.append((int(pid) + 1, properties, rings))
+
+    return encode_tile([(layer_name, features, EXTENT)])
@@ -0,0 +1,431 @@
+"""多边形区域统计
+
+polygon_timeseries：多边形内像元的逐波段 NDVI 统计（均值、中位数、百分位数、
+有效像元数）。多边形（EPSG:4326 GeoJSON）投影到栅格坐标系后，只处理其外包框
+对应的窗口，并按 CHUNK_SIZE 见方分块：每块先栅格化掩膜（像元中心在多边形内），
+块内无像元时不读取数据；有像元优先存储（timeseries_store.py）时从存储读取，
+否则窗口读取 GeoTIFF。全部计算在像元 × 波段矩阵上向量化完成。
+
+内存上限：命中像元的值总量不超过 POLYGON_STATS_MAX_BYTES 时保留全部值，
+百分位数为精确值；超过后改为第二遍扫描，按波段在 [最小值, 最大值] 内做
+HIST_BINS 级直方图求近似百分位数（误差不超过一个直方图宽度），
+响应中 approximate 为 true。
+
+zonal_disturbance：任务结果的逐区域、逐年扰动/恢复面积。区域为 GeoJSON
+FeatureCollection（按要素顺序编号 1..n 栅格化为标签栅格，重叠部分计入靠后的
+区域）或区域栅格（整数标签，0/nodata 为区域外，最近邻重采样到结果网格）。
+按 CHUNK_SIZE 分块读取扰动年份、恢复年份与标签，(区域, 年份) 组合键一次
+bincount 累加像元数与面积（地理坐标系按行计算像元面积）。结果按
+(任务, 区域集哈希) 缓存在 JOB_DIR/<job_id>/zonal/<哈希>.json，结果栅格
+重新生成后失效。
+"""
+import os
+import json
+import hashlib
+import logging
+import warnings
+
+import numpy as np
+from rasterio.io import MemoryFile
+from rasterio.errors import RasterioIOError
+from rasterio.vrt import WarpedVRT
+from rasterio.enums import Resampling
+from rasterio.windows import Window, union
+from rasterio.features import geometry_mask, rasterize
+
+from config import JOB_DIR, POLYGON_STATS_MAX_BYTES
+from services.raster_pool import open_dataset, get_transformer
+from services.single_flight import SingleFlight
+from services.timeseries_store import get_timeseries_store
+
+logger = logging.getLogger(__name__)
+
+GEOGRAPHIC = "EPSG:4326"
+# 分块边长（像元）
+CHUNK_SIZE = 512
+# 近似百分位数的直方图级数
+HIST_BINS = 4096
+DEFAULT_PERCENTILES = (10, 25, 75, 90)
+
+DISTURBANCE_FILE = "mining_disturbance_year.tif"
+RECOVERY_FILE = "mining_recovery_year.tif"
+ZONAL_DIRNAME = "zonal"
+# 年份分箱范围 [YEAR_BASE, YEAR_BASE + YEAR_BINS)
+YEAR_BASE = 1900
+YEAR_BINS = 256
+# 地理坐标系像元面积所用的地球半径（米）
+EARTH_RADIUS = 6371008.8
+
+_zonal_flight = SingleFlight()
+
+
+def _geometry(obj):
+    """GeoJSON Feature / 几何 → Polygon 或 MultiPolygon 几何"""
+    if obj.get("type") == "Feature":
+        obj = obj.get("geometry") or {}
+    if obj.get("type") not in ("Polygon", "MultiPolygon"):
+        raise ValueError("几何类型应为 Polygon 或 MultiPolygon")
+    return obj
+
+
+def project_geometry(geometry, dst_crs):
+    """EPSG:4326 的 Polygon/MultiPolygon 投影到 dst_crs（每个环一次向量化投影）"""
+    if dst_crs is None or dst_crs == GEOGRAPHIC:
+        return geometry
+    tfm = get_transformer(GEOGRAPHIC, dst_crs)
+
+    def ring(coords):
+        pts = np.asarray(coords, dtype=np.float64)
+        x, y = tfm.transform(pts[:, 0], pts[:, 1])
+        return np.column_stack([x, y]).tolist()
+
+    if geometry["type"] == "Polygon":
+        return {"type": "Polygon", "coordinates": [ring(r) for r in geometry["coordinates"]]}
+    return {"type": "MultiPolygon",
+            "coordinates": [[ring(r) for r in poly] for poly in geometry["coordinates"]]}
+
+
+def geometry_window(ds, geometry):
+    """投影后几何的外包框对应的栅格窗口（已裁剪到栅格内；不相交返回 None）"""
+    rings = geometry["coordinates"] if geometry["type"] == "Polygon" else \
+        [r for poly in geometry["coordinates"] for r in poly]
+    pts = np.concatenate([np.asarray(r, dtype=np.float64) for r in rings])
+    inv = ~ds.transform
+    cols = inv.a * pts[:, 0] + inv.b * pts[:, 1] + inv.c
+    rows = inv.d * pts[:, 0] + inv.e * pts[:, 1] + inv.f
+    col0 = max(int(np.floor(cols.min())), 0)
+    row0 = max(int(np.floor(rows.min())), 0)
+    col1 = min(int(np.ceil(cols.max())), ds.width)
+    row1 = min(int(np.ceil(rows.max())), ds.height)
+    if col1 <= col0 or row1 <= row0:
+        return None
+    return Window(col0, row0, col1 - col0, row1 - row0)
+
+
+def iter_chunks(window, size=CHUNK_SIZE):
+    """窗口按 size 见方分块"""
+    for r in range(window.row_off, window.row_off + window.height, size):
+        for c in range(window.col_off, window.col_off + window.width, size):
+            yield Window(c, r, min(size, window.col_off + window.width - c),
+                         min(size, window.row_off + window.height - r))
+
+
+def _masked_values(ds, store, geometry, window):
+    """yield 每块多边形内像元的值，shape (像元数, 波段数) float64，nodata 为 NaN"""
+    for chunk in iter_chunks(window):
+        inside = geometry_mask([geometry], out_shape=(chunk.height, chunk.width),
+                               transform=ds.window_transform(chunk), invert=True)
+        if not inside.any():
+            continue
+        if store is not None:
+            data = store.read_window(chunk.row_off, chunk.col_off, chunk.height, chunk.width)[inside]
+        else:
+            data = ds.read(window=chunk)[:, inside].T
+        values = data.astype(np.float64)
+        if ds.nodata is not None:
+            values[values == ds.nodata] = np.nan
+        values[~np.isfinite(values)] = np.nan
+        yield values
+
+
+def _histogram_percentiles(chunks, lo, hi, counts, qs):
+    """按波段直方图求近似百分位数，shape (len(qs), 波段数)"""
+    n_bands = len(lo)
+    width = np.where(hi > lo, (hi - lo) / HIST_BINS, 1.0)
+    hist = np.zeros(n_bands * HIST_BINS, dtype=np.int64)
+    offsets = np.arange(n_bands) * HIST_BINS
+    for values in chunks:
+        valid = ~np.isnan(values)
+        with np.errstate(invalid="ignore"):
+            bins = np.clip(((values - lo) / width).astype(np.int64), 0, HIST_BINS - 1)
+        hist += np.bincount((bins + offsets)[valid], minlength=len(hist))
+    cdf = np.cumsum(hist.reshape(n_bands, HIST_BINS), axis=1)
+
+    out = np.full((len(qs), n_bands), np.nan)
+    for b in np.flatnonzero(counts):
+        # 与 numpy 线性插值一致的目标秩，取所在直方图格的中心
+        ranks = np.asarray(qs) / 100 * (counts[b] - 1)
+        idx = np.searchsorted(cdf[b], ranks, side="right")
+        out[:, b] = np.minimum(lo[b] + (idx + 0.5) * width[b], hi[b])
+    return out
+
+
+def polygon_timeseries(geotiff_path, geometry, percentiles=DEFAULT_PERCENTILES):
+    """多边形（EPSG:4326 GeoJSON）内像元的逐波段统计
+
+    返回 dict：pixel_count（多边形内像元数）、count / mean / median（每波段）、
+    percentiles（{百分位: 每波段值}）、approximate；无有效值的波段统计为 NaN。
+    """
+    percentiles = [float(p) for p in percentiles]
+    if any(p < 0 or p > 100 for p in percentiles):
+        raise ValueError("百分位数应在 0-100 之间")
+    qs = [50.0] + percentiles
+
+    with open_dataset(geotiff_path) as ds:
+        if ds.crs is None:
+            raise ValueError("GeoTIFF 没有 CRS 信息")
+        geometry = project_geometry(_geometry(geometry), ds.crs_string)
+        window = geometry_window(ds, geometry)
+        store = get_timeseries_store(geotiff_path)
+        n_bands = ds.count
+
+        pixel_count = 0
+        counts = np.zeros(n_bands, dtype=np.int64)
+        sums = np.zeros(n_bands)
+        lo = np.full(n_bands, np.inf)
+        hi = np.full(n_bands, -np.inf)
+        kept, kept_bytes = [], 0
+        chunks = _masked_values(ds, store, geometry, window) if window is not None else []
+        for values in chunks:
+            valid = ~np.isnan(values)
+            pixel_count += len(values)
+            counts += valid.sum(axis=0)
+            sums += np.where(valid, values, 0).sum(axis=0)
+            lo = np.minimum(lo, np.where(valid, values, np.inf).min(axis=0))
+            hi = np.maximum(hi, np.where(valid, values, -np.inf).max(axis=0))
+            if kept is not None:
+                kept.append(values)
+                kept_bytes += values.nbytes
+                if kept_bytes > POLYGON_STATS_MAX_BYTES:
+                    kept = None
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(counts > 0, sums / counts, np.nan)
+        approximate = kept is None
+        if approximate:
+            stats = _histogram_percentiles(_masked_values(ds, store, geometry, window),
+                                           lo, hi, counts, qs)
+        elif kept:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # 全为 NaN 的波段
+                stats = np.nanpercentile(np.concatenate(kept), qs, axis=0)
+        else:
+            stats = np.full((len(qs), n_bands), np.nan)
+
+    logger.info(f"多边形统计完成: {geotiff_path}, {pixel_count}个像元"
+                f"{'（近似百分位数）' if approximate else ''}")
+    return {
+        "pixel_count": pixel_count,
+        "count": counts,
+        "mean": mean,
+        "median": stats[0],
+        "percentiles": {p: stats[i + 1] for i, p in enumerate(percentiles)},
+        "approximate": approximate,
+    }
+
+
+# ============= 逐区域扰动统计 =============
+
+def zone_hash(data):
+    """区域集（GeoJSON 对象或区域栅格字节）的哈希"""
+    if not isinstance(data, (bytes, bytearray)):
+        data = json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def _zone_features(zones):
+    """FeatureCollection → [(区域 id, Polygon/MultiPolygon 几何)]"""
+    if zones.get("type") != "FeatureCollection" or not zones.get("features"):
+        raise ValueError("zones 应为非空的 FeatureCollection")
+    out = []
+    for i, feature in enumerate(zones["features"]):
+        properties = feature.get("properties") or {}
+        zone_id = feature.get("id", properties.get("id", properties.get("name", i)))
+        out.append((zone_id, _geometry(feature)))
+    return out
+
+
+def _row_areas(ds, window):
+    """窗口内每行像元的面积（平方米），shape (height, 1)"""
+    t = ds.transform
+    if ds.crs is not None and ds.crs.is_geographic:
+        lat = t.f + t.e * np.arange(window.row_off, window.row_off + window.height + 1)
+        band = np.abs(np.diff(np.sin(np.radians(lat))))
+        return (EARTH_RADIUS ** 2 * np.radians(abs(t.a)) * band)[:, None]
+    factor = ds.crs.linear_units_factor[1] if ds.crs is not None else 1.0
+    return np.full((window.height, 1), abs(t.a * t.e) * factor ** 2)
+
+
+def _valid_years(ds, window):
+    """年份栅格窗口 → int64 年份偏移（无效为 -1）"""
+    years = ds.read(1, window=window)
+    valid = years != 0
+    if ds.nodata is not None:
+        valid &= years != ds.nodata
+    offset = np.where(valid, years, -1).astype(np.int64)
+    offset[valid] -= YEAR_BASE
+    offset[(offset < 0) | (offset >= YEAR_BINS)] = -1
+    return offset
+
+
+def _accumulate(totals, labels, area, year_offsets):
+    """一块内按 (区域, 年份) bincount，累加到 totals[标签]"""
+    in_zone = labels > 0
+    if not in_zone.any():
+        return
+    zone_labels, inv = np.unique(labels[in_zone], return_inverse=True)
+    weights = np.broadcast_to(area, labels.shape)[in_zone]
+    n = len(zone_labels)
+    pixels = np.bincount(inv, minlength=n)
+    zone_area = np.bincount(inv, weights=weights, minlength=n)
+    per_year = []
+    for offsets in year_offsets:
+        if offsets is None:
+            per_year.append((np.zeros((n, YEAR_BINS)), np.zeros((n, YEAR_BINS))))
+            continue
+        year = offsets[in_zone]
+        ok = year >= 0
+        key = inv[ok] * YEAR_BINS + year[ok]
+        counts = np.bincount(key, minlength=n * YEAR_BINS).reshape(n, YEAR_BINS)
+        areas = np.bincount(key, weights=weights[ok], minlength=n * YEAR_BINS).reshape(n, YEAR_BINS)
+        per_year.append((counts, areas))
+
+    for j, label in enumerate(zone_labels.tolist()):
+        acc = totals.get(label)
+        if acc is None:
+            acc = totals[label] = {"pixels": 0, "area": 0.0, "years": np.zeros((4, YEAR_BINS))}
+        acc["pixels"] += int(pixels[j])
+        acc["area"] += float(zone_area[j])
+        for k, (counts, areas) in enumerate(per_year):
+            acc["years"][2 * k] += counts[j]
+            acc["years"][2 * k + 1] += areas[j]
+
+
+def _geojson_labels(ds, zone_geoms, zone_windows):
+    """chunk → 标签栅格（要素编号 1..n）"""
+    def labels(chunk):
+        shapes = [(geom, i + 1) for i, (geom, win) in enumerate(zip(zone_geoms, zone_windows))
+                  if win is not None and _overlaps(win, chunk)]
+        if not shapes:
+            return np.zeros((chunk.height, chunk.width), dtype=np.int64)
+        return rasterize(shapes, out_shape=(chunk.height, chunk.width),
+                         transform=ds.window_transform(chunk), fill=0, dtype="int32").astype(np.int64)
+    return labels
+
+
+def _overlaps(a, b):
+    return (a.col_off < b.col_off + b.width and b.col_off < a.col_off + a.width
+            and a.row_off < b.row_off + b.height and b.row_off < a.row_off + a.height)
+
+
+def compute_zonal_disturbance(job_dir, zones=None, zone_raster=None):
+    """逐区域、逐年的扰动/恢复像元数与面积（不使用缓存）
+
+    zones 为 EPSG:4326 GeoJSON FeatureCollection，zone_raster 为区域栅格
+    GeoTIFF 字节，二者择一。
+    """
+    dist_path = os.path.join(job_dir, DISTURBANCE_FILE)
+    recv_path = os.path.join(job_dir, RECOVERY_FILE)
+    recv_exists = os.path.exists(recv_path)
+    totals = {}
+
+    with open_dataset(dist_path) as ds:
+        recv = open_dataset(recv_path) if recv_exists else None
+        full = Window(0, 0, ds.width, ds.height)
+        if zones is not None:
+            features = _zone_features(zones)
+            zone_ids = [zone_id for zone_id, _ in features]
+            zone_geoms = [project_geometry(geom, ds.crs_string) for _, geom in features]
+            zone_windows = [geometry_window(ds, geom) for geom in zone_geoms]
+            present = [w for w in zone_windows if w is not None]
+            window = union(*present) if present else None
+            labels_for = _geojson_labels(ds, zone_geoms, zone_windows)
+            vrt = None
+        else:
+            memfile = MemoryFile(bytes(zone_raster))
+            try:
+                src = memfile.open()
+            except RasterioIOError as e:
+                memfile.close()
+                raise ValueError(f"无法读取区域栅格: {e}")
+            if src.crs is None:
+                src.close()
+                memfile.close()
+                raise ValueError("区域栅格没有 CRS 信息")
+            vrt = WarpedVRT(src, crs=ds.crs, transform=ds.transform, width=ds.width,
+                            height=ds.height, resampling=Resampling.nearest)
+            zone_nodata = src.nodata
+
+            def labels_for(chunk):
+                labels = vrt.read(1, window=chunk)
+                if zone_nodata is not None:
+                    labels = np.where(labels == zone_nodata, 0, labels)
+                return labels.astype(np.int64)
+            window = full
+
+        try:
+            for chunk in iter_chunks(window) if window is not None else []:
+                labels = labels_for(chunk)
+                if not (labels > 0).any():
+                    continue
+                offsets = [_valid_years(ds, chunk), _valid_years(recv, chunk) if recv is not None else None]
+                _accumulate(totals, labels, _row_areas(ds, chunk), offsets)
+        finally:
+            if vrt is not None:
+                vrt.close()
+                src.close()
+                memfile.close()
+
+    if zones is not None:
+        entries = [(zone_id, totals.get(i + 1)) for i, zone_id in enumerate(zone_ids)]
+    else:
+        entries = [(label, totals[label]) for label in sorted(totals)]
+
+    year_mask = np.zeros(YEAR_BINS, dtype=bool)
+    for _, acc in entries:
+        if acc is not None:
+            year_mask |= (acc["years"][0] > 0) | (acc["years"][2] > 0)
+    year_idx = np.flatnonzero(year_mask)
+
+    def hectares(values):
+        return [round(v / 10000, 4) for v in values.tolist()]
+
+    out_zones = []
+    for zone_id, acc in entries:
+        years = acc["years"][:, year_idx] if acc is not None else np.zeros((4, len(year_idx)))
+        out_zones.append({
+            "id": zone_id,
+            "pixel_count": acc["pixels"] if acc is not None else 0,
+            "area_ha": round(acc["area"] / 10000, 4) if acc is not None else 0.0,
+            "disturbed_pixels": years[0].astype(np.int64).tolist(),
+            "disturbed_ha": hectares(years[1]),
+            "recovered_pixels": years[2].astype(np.int64).tolist(),
+            "recovered_ha": hectares(years[3]),
+            "disturbed_total_ha": round(float(years[1].sum()) / 10000, 4),
+            "recovered_total_ha": round(float(years[3].sum()) / 10000, 4),
+        })
+    return {"years": (year_idx + YEAR_BASE).tolist(), "zones": out_zones}
+
+
+def zonal_disturbance(job_id, zones=None, zone_raster=None):
+    """compute_zonal_disturbance 的缓存版本：按 (任务, 区域集哈希) 缓存到任务目录"""
+    job_dir = os.path.join(JOB_DIR, job_id)
+    digest = zone_hash(zones if zones is not None else zone_raster)
+    cache_path = os.path.join(job_dir, ZONAL_DIRNAME, digest + ".json")
+    sources = [os.path.join(job_dir, f) for f in (DISTURBANCE_FILE, RECOVERY_FILE)]
+    source_mtime = max(os.stat(p).st_mtime_ns for p in sources if os.path.exists(p))
+
+    def cached():
+        try:
+            if os.stat(cache_path).st_mtime_ns < source_mtime:
+                return None
+            with open(cache_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def build():
+        result = cached()
+        if result is not None:
+            return result
+        result = compute_zonal_disturbance(job_dir, zones=zones, zone_raster=zone_raster)
+        result["zone_hash"] = digest
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+        logger.info(f"区域扰动统计完成: job_id={job_id}, {len(result['zones'])}个区域")
+        return result
+
+    return cached() or _zonal_flight.do((job_id, digest), build)
@@ -0,0 +1,107 @@
+"""
+Execution backend auto-tuning tests.
+
+Checks the backend/chunk selection logic against synthetic profiles and
+that every backend returns identical classifications.
+"""
+
+import sys
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runners.algorithm import autotune
+from runners.algorithm.autotune import select_execution, MIN_CHUNK_SIZE, job_running, schedule_idle_calibration
+from runners.algorithm.sample_generator import creat_sample
+from runners.algorithm.knn_dtw import knn_classify
+
+
+PROFILE = {
+    "pixel_cost": {"a": 1e-7, "b": 1e-5},
+    "backends": {
+        "processes": {"n_workers": 8, "chunk_size": 1000, "overhead_s": 0.05, "efficiency": 0.9},
+        "threads": {"n_workers": 8, "chunk_size": 500, "overhead_s": 0.005, "efficiency": 0.3},
+    },
+}
+
+
+def test_select_execution():
+    """Small jobs stay sequential, mid jobs use cheap threads, big jobs use processes."""
+    tiny = select_execution(10, 20, 8, PROFILE)
+    assert tiny["backend"] == "sequential"
+
+    # 1999 pixels no longer falls back to one core
+    mid = select_execution(1999, 20, 8, PROFILE)
+    print(f"  1999 px -> {mid}")
+    assert mid["backend"] != "sequential"
+    assert mid["chunk_size"] * 8 < 1999 * 2
+
+    big = select_execution(1_000_000, 40, 8, PROFILE)
+    assert big["backend"] == "processes"
+    assert big["chunk_size"] == 1000 and big["n_jobs"] == 8
+
+    # Worker count capped by what the caller can provide
+    capped = select_execution(1_000_000, 40, 4, PROFILE)
+    assert capped["n_jobs"] == 4
+
+    # Without a profile: heuristics
+    assert select_execution(100, 10, 8)["backend"] == "sequential"
+    fallback = select_execution(200_000, 30, 8)
+    assert fallback["backend"] == "processes"
+    assert fallback["chunk_size"] >= MIN_CHUNK_SIZE
+    assert select_execution(200_000, 30, 1)["backend"] == "sequential"
+    return True
+
+
+def test_backends_agree():
+    """Sequential, threaded and process backends classify identically."""
+    samples = creat_sample([0.15, 0.75], 10, 0.8, 0.6)
+    rng = np.random.default_rng(11)
+    test_data = rng.uniform(0.1, 0.8, size=(120, 10))
+
+    results = {}
+    for backend in ("sequential", "threads", "processes"):
+        stats = {}
+        results[backend] = knn_classify(samples[:, :-1], samples[:, -1], test_data,
+                                        n_jobs=2, backend=backend, chunk_size=32, stats=stats)
+        assert stats["backend"] == backend
+        assert stats["n_pixels"] == 120
+    for backend in ("threads", "processes"):
+        for a, b in zip(results["sequential"], results[backend]):
+            assert np.array_equal(a, b)
+    print("  All backends agree ✓")
+    return True
+
+
+def test_idle_calibration(tmp_path, monkeypatch):
+    """Calibration runs out of process only when idle; overlapping a job discards it."""
+    path = str(tmp_path / "knn_tuning.json")
+    runs = []
+
+    def fake_run(cmd, **kwargs):
+        runs.append(cmd)
+        if len(runs) == 2:
+            with job_running():  # a job starts while calibrating
+                pass
+        with open(path, "w") as f:
+            f.write("{}")
+        return type("Result", (), {"returncode": 0, "stderr": ""})()
+
+    monkeypatch.setattr(autotune.subprocess, "run", fake_run)
+    monkeypatch.setattr(autotune, "load_tuning_profile", lambda p: None)
+
+    with job_running():
+        assert schedule_idle_calibration(path) is None  # busy
+    thread = schedule_idle_calibration(path)
+    thread.join()
+    assert "runners.algorithm.autotune" in runs[0] and os.path.exists(path)
+    assert not os.path.exists(path + ".lock")
+
+    schedule_idle_calibration(path).join()
+    assert len(runs) == 2 and not os.path.exists(path)  # overlapped: discarded
+
+    monkeypatch.setattr(autotune, "load_tuning_profile", lambda p: PROFILE)
+    assert schedule_idle_calibration(path) is None  # profile is current
+    print("  Idle calibration ✓")
+    return True
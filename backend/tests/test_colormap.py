@@ -0,0 +1,88 @@
+"""
+Lookup-table colormap tests.
+"""
+
+import sys
+import os
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.tile_service import (
+    LAYER_COLORMAPS, apply_colormap, colormap_lut, layer_lut, to_lut_index, render_tile_rgba,
+)
+from services.tile_pyramid import tile_range, raster_bounds_3857
+
+
+def test_lut_matches_per_pixel_colormap():
+    """Float and integer inputs give the same colours as the per-pixel formula."""
+    rng = np.random.default_rng(0)
+    years = rng.integers(1970, 2060, size=(64, 64)).astype(np.float64)
+    years[:8] = -9999
+    years[8:12] = np.nan
+    years[12:16] = 0
+
+    rgba = apply_colormap(years, "disturbance_year", nodata=-9999)
+    assert np.array_equal(apply_colormap(years.astype(np.float32), "disturbance_year", -9999), rgba)
+    assert not rgba[:16].any()
+
+    cfg = LAYER_COLORMAPS["disturbance_year"]
+    norm = np.clip((years[16:] - 1980) / 70, 0, 1)
+    for c in range(3):
+        expected = (cfg["start"][c] + norm * (cfg["end"][c] - cfg["start"][c])).astype(np.uint8)
+        assert np.array_equal(rgba[16:, :, c], expected)
+    assert (rgba[16:, :, 3] == 180).all()
+
+    # Already-compact integer data is a single gather
+    mask = rng.integers(0, 2, size=(32, 32)).astype(np.uint8)
+    lut, _ = colormap_lut("disturbance_mask")
+    assert np.array_equal(apply_colormap(mask, "disturbance_mask"), lut[mask])
+    print("  LUT colours ✓")
+    return True
+
+
+def test_categorical_range_classes():
+    """Every template class 1..49 gets an opaque colour, by group."""
+    data = np.arange(50, dtype=np.float64).reshape(1, 50)
+    rgba = apply_colormap(data, "res_disturbance_type")
+    assert rgba[0, 0, 3] == 0
+    assert (rgba[0, 1:, 3] == 180).all()
+    assert tuple(rgba[0, 1, :3]) == (254, 202, 202) and tuple(rgba[0, 9, :3]) == (185, 28, 28)
+    assert tuple(rgba[0, 37, :3]) == (134, 239, 172)
+    print("  Template classes ✓")
+    return True
+
+
+def test_continuous_uses_global_max(tmp_path):
+    """Tiles of a continuous layer share one scale: the raster-wide maximum."""
+    tif = str(tmp_path / "potential_disturbance.tif")
+    data = np.zeros((200, 200), dtype=np.float64)
+    data[:100, :100] = 10
+    data[150:, 150:] = 100
+    with rasterio.open(tif, "w", driver="GTiff", width=200, height=200, count=1, dtype="float64",
+                       crs="EPSG:32649", transform=from_origin(500000, 4000000, 30, 30),
+                       nodata=-1) as dst:
+        dst.write(data, 1)
+
+    table, scale = layer_lut(tif, "potential_disturbance")
+    assert scale == 100 / 65535 and table[6554, 3] == 15 and table[65535, 3] == 150
+
+    z = 14
+    x0, y0, x1, y1 = tile_range(raster_bounds_3857(tif), z)
+    alphas = set()
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            rgba = render_tile_rgba(tif, "potential_disturbance", z, x, y)
+            if rgba is not None:
+                alphas.update(np.unique(rgba[:, :, 3]).tolist())
+    assert alphas <= {0, 15, 150} and 15 in alphas
+
+    # Fractional and large values are quantised, not truncated or wrapped
+    idx = to_lut_index(np.array([[0.0, 1.5e6, 2e6]]), "potential_disturbance", scale=2e6 / 65535)
+    assert idx.tolist() == [[0, 49151, 65535]]
+    idx = to_lut_index(np.array([[0.25, 1.0]]), "potential_disturbance", scale=1 / 65535)
+    assert idx.tolist() == [[16384, 65535]]
+    print("  Global continuous scale ✓")
+    return True
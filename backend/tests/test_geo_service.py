@@ -0,0 +1,70 @@
+"""
+Point sampling tests.
+"""
+
+import sys
+import os
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+from pyproj import Transformer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.geo_service import sample_timeseries, sample_singleband, sample_points
+
+
+def _write(path, data, nodata=-9999, tiled=True):
+    layout = {"tiled": True, "blockxsize": 64, "blockysize": 64} if tiled else {}
+    with rasterio.open(path, "w", driver="GTiff", width=data.shape[2], height=data.shape[1],
+                       count=data.shape[0], dtype=data.dtype, crs="EPSG:32649",
+                       transform=from_origin(500000, 4000000, 30, 30), nodata=nodata,
+                       **layout) as dst:
+        dst.write(data)
+    return path
+
+
+def _lonlat(row, col):
+    tfm = Transformer.from_crs("EPSG:32649", "EPSG:4326", always_xy=True)
+    return tfm.transform(500000 + 30 * (col + 0.5), 4000000 - 30 * (row + 0.5))
+
+
+def test_point_samples_match_full_read(tmp_path):
+    """1x1 window reads return the same values as indexing the full stack."""
+    rng = np.random.default_rng(0)
+    stack = rng.uniform(-0.2, 0.9, (6, 200, 150)).astype(np.float32)
+    stack[2, 77, 91] = -9999
+    path = _write(str(tmp_path / "ndvi.tif"), stack)
+    years = np.zeros((1, 200, 150), dtype=np.int16)
+    years[0, 77, 91] = 2005
+    year_path = _write(str(tmp_path / "year.tif"), years)
+
+    for row, col in [(0, 0), (77, 91), (199, 149), (130, 64)]:
+        vals, count = sample_timeseries(path, *_lonlat(row, col))
+        expected = [None if v == -9999 else float(v) for v in stack[:, row, col]]
+        assert count == 6 and vals == expected
+    assert sample_singleband(year_path, *_lonlat(77, 91)) == 2005
+    assert sample_singleband(year_path, *_lonlat(10, 10)) is None
+    assert sample_singleband(year_path, 0.0, 0.0) is None
+    print("  Point sampling ✓")
+    return True
+
+
+def test_batch_samples_match_single_points(tmp_path):
+    """Block-grouped batch sampling agrees with per-point sampling; outside points are NaN."""
+    rng = np.random.default_rng(1)
+    stack = rng.uniform(-0.2, 0.9, (5, 150, 170)).astype(np.float32)
+    stack[:, 5, 5] = -9999
+    for tiled in (True, False):
+        path = _write(str(tmp_path / f"ndvi_{tiled}.tif"), stack, tiled=tiled)
+        pixels = [(5, 5), (0, 169)] + [tuple(p) for p in rng.integers(0, 150, (40, 2))]
+        lonlat = np.array([_lonlat(r, c) for r, c in pixels] + [(0.0, 0.0)])
+        values, inside = sample_points(path, lonlat[:, 0], lonlat[:, 1])
+        assert values.shape == (len(lonlat), 5)
+        assert inside.tolist() == [True] * len(pixels) + [False]
+        assert np.isnan(values[-1]).all()
+        for (lon, lat), row in zip(lonlat[:-1], values[:-1]):
+            single, _ = sample_timeseries(path, lon, lat)
+            assert [None if np.isnan(v) else float(v) for v in row] == single
+    print("  Batch point sampling ✓")
+    return True
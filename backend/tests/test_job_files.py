@@ -0,0 +1,32 @@
+"""
+Job output file listing tests.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.job_routes import _available_outputs
+
+
+def _touch(path, mtime_ns):
+    with open(path, "wb") as f:
+        f.write(b"x")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_flatgeobuf_listed_only_when_fresh(tmp_path):
+    """Post-processed .fgb files appear once written and are hidden while stale after a re-run."""
+    tif = str(tmp_path / "mining_disturbance_mask.tif")
+    fgb = str(tmp_path / "mining_disturbance_mask.fgb")
+    _touch(tif, 2_000_000_000)
+    assert [f[0] for f in _available_outputs(str(tmp_path))] == ["mining_disturbance_mask.tif"]
+
+    _touch(fgb, 3_000_000_000)  # written by post-processing
+    assert "mining_disturbance_mask.fgb" in [f[0] for f in _available_outputs(str(tmp_path))]
+
+    _touch(tif, 4_000_000_000)  # re-run rewrote the raster, .fgb not yet regenerated
+    assert "mining_disturbance_mask.fgb" not in [f[0] for f in _available_outputs(str(tmp_path))]
+    print("  Job file listing ✓")
+    return True
@@ -0,0 +1,131 @@
+"""
+Pre-reprojected Web Mercator raster tests.
+"""
+
+import sys
+import os
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.transform import from_origin, from_bounds
+from rasterio.warp import reproject
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.mercator_raster import build_mercator_raster, read_mercator_tile, plan_grid
+from services.raster_pool import open_dataset
+from services.tile_pyramid import tile_range, raster_bounds_3857
+from services.tile_service import tile_bounds_3857, WEB_MERCATOR_CRS
+
+
+def _make_raster(path):
+    rng = np.random.default_rng(1)
+    data = rng.integers(0, 8, size=(150, 180)).astype(np.uint8)
+    with rasterio.open(path, "w", driver="GTiff", width=180, height=150, count=1, dtype="uint8",
+                       crs="EPSG:32649", transform=from_origin(500000, 4000000, 30, 30),
+                       nodata=0) as dst:
+        dst.write(data, 1)
+
+
+def test_native_zoom_tiles_match_reprojection(tmp_path):
+    """Native-zoom tiles equal a nearest reprojection onto the tile grid."""
+    tif = str(tmp_path / "res_disturbance_type.tif")
+    _make_raster(tif)
+    build_mercator_raster(tif)
+
+    src = open_dataset(tif)
+    grid = plan_grid(src)
+    z = grid["native_zoom"]
+    x0, y0, x1, y1 = tile_range(raster_bounds_3857(tif), z)
+    for x in range(x0 - 1, x1 + 2):
+        for y in range(y0 - 1, y1 + 2):
+            handled, data = read_mercator_tile(tif, z, x, y)
+            assert handled
+            expected = np.zeros((256, 256), dtype=np.uint8)
+            reproject(source=src.read(1), destination=expected, src_transform=src.transform,
+                      src_crs=src.crs, dst_transform=from_bounds(*tile_bounds_3857(z, x, y), 256, 256),
+                      dst_crs=WEB_MERCATOR_CRS, resampling=Resampling.nearest)
+            if data is None:
+                assert not expected.any()
+            else:
+                assert np.array_equal(data, expected)
+    print("  Web Mercator tiles ✓")
+    return True
+
+
+def test_other_zooms_match_baseline_renderer(tmp_path):
+    """Overview and overzoom tiles render exactly as without the copy."""
+    from services.tile_service import render_tile_index
+
+    tif = str(tmp_path / "res_disturbance_type.tif")
+    _make_raster(tif)
+    grid = plan_grid(open_dataset(tif))
+    native_zoom = grid["native_zoom"]
+    zooms = [grid["base_zoom"], native_zoom - 2, native_zoom - 1, native_zoom + 1, native_zoom + 2]
+
+    def render_all():
+        tiles = {}
+        for z in zooms:
+            x0, y0, x1, y1 = tile_range(raster_bounds_3857(tif), z)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    tiles[z, x, y] = render_tile_index(tif, "res_disturbance_type", z, x, y)
+        return tiles
+
+    baseline = render_all()
+    build_mercator_raster(tif)
+    for z in zooms:
+        assert read_mercator_tile(tif, z, *tile_range(raster_bounds_3857(tif), z)[:2]) == (False, None)
+    with_copy = render_all()
+    assert baseline.keys() == with_copy.keys()
+    for key, expected in baseline.items():
+        assert (expected is None and with_copy[key] is None) or np.array_equal(with_copy[key], expected)
+    print("  Non-native zooms ✓")
+    return True
+
+
+def test_stale_copy_is_ignored(tmp_path):
+    """A copy older than its source raster is not used."""
+    tif = str(tmp_path / "mining_disturbance_mask.tif")
+    _make_raster(tif)
+    out = build_mercator_raster(tif)
+    st = os.stat(out)
+    os.utime(tif, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    z = plan_grid(open_dataset(tif))["native_zoom"]
+    assert read_mercator_tile(tif, z, 0, 0) == (False, None)
+    return True
+
+
+def test_metatile_matches_single_tiles(tmp_path, monkeypatch):
+    """An 8x8 metatile read slices into the same tiles as single reads, and
+    one render fills the cache for the whole block."""
+    from services import tile_service
+    from services.mercator_raster import read_mercator_block
+    from services.tile_cache import TileCache
+
+    tif = str(tmp_path / "res_disturbance_type.tif")
+    _make_raster(tif)
+    build_mercator_raster(tif)
+    grid = plan_grid(open_dataset(tif))
+
+    z = grid["native_zoom"]
+    x0, y0, x1, y1 = tile_range(raster_bounds_3857(tif), z)
+    mx, my = x0 - x0 % 8, y0 - y0 % 8
+    handled, block = read_mercator_block(tif, z, mx, my, 8)
+    assert handled and block.shape == (2048, 2048)
+    for j in range(8):
+        for i in range(8):
+            _, tile = read_mercator_tile(tif, z, mx + i, my + j)
+            sub = block[j * 256:(j + 1) * 256, i * 256:(i + 1) * 256]
+            if tile is None:
+                assert not sub.any()
+            else:
+                assert np.array_equal(sub, tile)
+
+    monkeypatch.setattr(tile_service, "tile_cache", TileCache(1 << 24))
+    png = tile_service.render_tile_coalesced("job", "res_disturbance_type", 1, tif,
+                                             "res_disturbance_type", z, x0, y0)
+    assert png == tile_service.render_tile(tif, "res_disturbance_type", z, x0, y0)
+    assert tile_service.tile_cache.memory.stats()["entries"] == 64
+    print("  Metatiles ✓")
+    return True
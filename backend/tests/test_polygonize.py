@@ -0,0 +1,173 @@
+"""
+Tiled polygonisation and multi-level simplification tests.
+"""
+
+import sys
+import os
+import numpy as np
+import rasterio
+from rasterio.features import shapes
+from rasterio.transform import from_origin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import polygonize
+from services.polygonize import polygonize_raster, get_polygons, level_for_zoom
+
+
+def _write(path, data):
+    with rasterio.open(path, "w", driver="GTiff", width=data.shape[1], height=data.shape[0], count=1,
+                       dtype=data.dtype, crs="EPSG:32649",
+                       transform=from_origin(500000, 4000000, 30, 30), nodata=-9999) as dst:
+        dst.write(data, 1)
+    return path
+
+
+def _speckled(seed=0):
+    """Patches with holes and touching neighbours, plus scattered single pixels."""
+    rng = np.random.default_rng(seed)
+    data = np.zeros((160, 160), dtype=np.float64)
+    data[10:70, 10:70] = 2001
+    data[30:40, 30:40] = 0
+    data[10:70, 70:100] = 2005
+    data[90:150, 20:140] = 2010
+    data[rng.random(data.shape) < 0.03] = 1999
+    data[0:3, 150:] = -9999
+    return data
+
+
+def _canonical(values, levels, k):
+    coords, ring_offsets, poly_rings = levels[k]
+    out = []
+    for pid, value in enumerate(values):
+        rings = tuple(tuple(map(tuple, coords[ring_offsets[r]:ring_offsets[r + 1]].tolist()))
+                      for r in range(poly_rings[pid], poly_rings[pid + 1]))
+        out.append((int(value), rings))
+    return out
+
+
+def test_tiles_match_whole_raster_shapes(tmp_path):
+    """Tiled output (serial and parallel) has exactly the geometry of a single shapes() pass."""
+    data = _speckled()
+    path = _write(str(tmp_path / "year.tif"), data)
+    mask = (data != 0) & (data != -9999)
+    expected = sorted(
+        (int(v), tuple(tuple((int(x), int(y)) for x, y in ring[:-1]) for ring in g["coordinates"]))
+        for g, v in shapes(data.astype(np.int32), mask=mask)
+    )
+
+    serial = polygonize_raster(path, n_workers=0, tile_size=32)
+    parallel = polygonize_raster(path, n_workers=2, tile_size=32)
+    assert sorted(_canonical(serial["values"], serial["levels"], 0)) == expected
+    for k in range(len(serial["levels"])):
+        assert _canonical(serial["values"], serial["levels"], k) == \
+            _canonical(parallel["values"], parallel["levels"], k)
+    print("  Tiled polygonisation ✓")
+    return True
+
+
+def test_shared_boundaries_simplify_identically(tmp_path):
+    """Neighbouring polygons keep one common boundary at every level (no gaps or overlaps)."""
+    rng = np.random.default_rng(1)
+    data = np.full((120, 120), 1, dtype=np.int16)
+    # Wiggly vertical boundary between two regions
+    for row in range(120):
+        data[row, 60 + int(rng.integers(-4, 5)):] = 2
+    path = _write(str(tmp_path / "two.tif"), data)
+    result = polygonize_raster(path, n_workers=0)
+
+    for k, (coords, ring_offsets, poly_rings) in enumerate(result["levels"]):
+        edges = []
+        for pid in range(2):
+            ring = coords[ring_offsets[poly_rings[pid]]:ring_offsets[poly_rings[pid] + 1]]
+            nxt = np.roll(ring, -1, axis=0)
+            inner = ~(((ring[:, 0] == nxt[:, 0]) & np.isin(ring[:, 0], [0, 120]))
+                      | ((ring[:, 1] == nxt[:, 1]) & np.isin(ring[:, 1], [0, 120])))
+            edges.append({tuple(sorted((tuple(a), tuple(b)))) for a, b in zip(ring[inner], nxt[inner])})
+        assert edges[0] and edges[0] == edges[1]
+        if k:
+            assert len(edges[0]) <= len(prev) if k > 1 else len(edges[0]) < len(prev)
+        prev = edges[0]
+    print("  Shared boundaries ✓")
+    return True
+
+
+def test_levels_file_and_zoom_bands(tmp_path):
+    """The cached levels file reloads; coarser levels carry fewer vertices."""
+    path = _write(str(tmp_path / "year.tif"), _speckled())
+    polygons = get_polygons(path)
+    assert get_polygons(path) is polygons
+    counts = [len(coords) for coords, _, _ in polygons.levels]
+    assert counts == sorted(counts, reverse=True) and counts[1] < counts[0]
+    assert polygons.world_coords(0)[0].tolist() == \
+        [500000 + 30 * polygons.levels[0][0][0][0], 4000000 - 30 * polygons.levels[0][0][0][1]]
+
+    assert level_for_zoom(14, 16, 5) == 0
+    assert level_for_zoom(14, 13, 5) == 1
+    assert level_for_zoom(14, 2, 5) == 4
+    print("  Simplification levels ✓")
+    return True
+
+
+def test_invalid_simplifications_fall_back(tmp_path, monkeypatch):
+    """Crossing edges, flipped rings and escaped holes are rejected; output is valid at every level."""
+    monkeypatch.setattr(polygonize, "HAS_SHAPELY", False)
+    square = np.array([[0, 0], [4, 0], [4, 4], [0, 4]])
+    hole = np.array([[1, 1], [1, 2], [2, 2], [2, 1]])
+    assert polygonize._valid_polygon([square, hole], [1, -1])
+    assert not polygonize._valid_polygon([np.array([[0, 0], [4, 4], [4, 0], [0, 4]]), ], [1])  # bow-tie
+    assert not polygonize._valid_polygon([square[::-1]], [1])  # orientation flipped
+    assert not polygonize._valid_polygon([square, hole + 5], [1, -1])  # hole outside the shell
+    assert not polygonize._valid_polygon([np.array([[0, 0], [4, 0], [2, 0], [2, 3]])], [1])  # spike
+    # A hole touching the shell at one vertex stays valid
+    assert polygonize._valid_polygon([square, np.array([[0, 2], [1, 3], [1, 1]])], [1, -1])
+
+    rejected = []
+    check = polygonize._valid_polygon
+    monkeypatch.setattr(polygonize, "_valid_polygon",
+                        lambda rings, signs: check(rings, signs) or rejected.append(rings))
+
+    rng = np.random.default_rng(0)
+    data = np.kron(rng.integers(1, 5, (20, 20)), np.ones((12, 12))).astype(np.float64)
+    data[rng.random(data.shape) < 0.2] = 0
+    result = polygonize_raster(_write(str(tmp_path / "noisy.tif"), data), n_workers=0)
+    assert rejected
+    for coords, ring_offsets, poly_rings in result["levels"]:
+        for pid in range(len(result["values"])):
+            rings = [coords[ring_offsets[r]:ring_offsets[r + 1]] for r in range(poly_rings[pid], poly_rings[pid + 1])]
+            assert not rings or not polygonize._edges_invalid(rings)
+    print("  Validity fallback ✓")
+    return True
+
+
+def test_components_merged_across_windows(tmp_path):
+    """A comb whose teeth join only along its base is one polygon; windows are read, not the raster."""
+    data = np.zeros((96, 96), dtype=np.int16)
+    data[4:90, 4:92:6] = 7  # teeth, one column wide, in different windows
+    data[86:90, 4:92] = 7    # base in the bottom window row
+    data[20:30, 41:46] = 3   # a patch between two teeth
+    path = _write(str(tmp_path / "comb.tif"), data)
+    mask = data != 0
+    expected = sorted(
+        (int(v), tuple(tuple((int(x), int(y)) for x, y in ring[:-1]) for ring in g["coordinates"]))
+        for g, v in shapes(data.astype(np.int32), mask=mask)
+    )
+
+    windows = []
+    read_window = polygonize._read_window
+
+    def spy(tif_path, row0, row1, col0, col1):
+        windows.append((row1 - row0, col1 - col0))
+        return read_window(tif_path, row0, row1, col0, col1)
+
+    polygonize._read_window = spy
+    try:
+        result = polygonize_raster(path, n_workers=0, tile_size=16)
+    finally:
+        polygonize._read_window = read_window
+    assert sorted(_canonical(result["values"], result["levels"], 0)) == expected
+    assert sum(1 for v in result["values"] if v == 7) == 1
+    # 36 labelling windows of 16 x 16, then one window per task
+    assert windows[:36] == [(16, 16)] * 36
+    print("  Cross-window components ✓")
+    return True
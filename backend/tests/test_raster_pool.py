@@ -0,0 +1,109 @@
+"""
+Pooled raster handle tests.
+"""
+
+import sys
+import os
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import raster_pool
+from services.raster_pool import open_dataset, cached_transform_bounds, get_transformer
+
+
+def _write(path, value, mtime=None):
+    with rasterio.open(path, "w", driver="GTiff", width=4, height=4, count=1, dtype="uint8",
+                       crs="EPSG:32649", transform=from_origin(500000, 4000000, 30, 30)) as dst:
+        dst.write(np.full((1, 4, 4), value, dtype=np.uint8))
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+def test_handles_reused_and_reopened(tmp_path):
+    """Same path/mtime reuses the handle; a rewritten file is reopened."""
+    path = str(tmp_path / "a.tif")
+    _write(path, 1, mtime=1_000_000_000)
+
+    ds = open_dataset(path)
+    with open_dataset(path) as again:
+        assert again is ds
+    assert not ds.closed and ds.crs_string == "EPSG:32649"
+
+    _write(path, 2, mtime=2_000_000_000)
+    fresh = open_dataset(path)
+    assert fresh is not ds and ds.closed
+    assert fresh.read(1)[0, 0] == 2
+    print("  Handle reuse ✓")
+    return True
+
+
+def test_lru_closes_oldest(tmp_path, monkeypatch):
+    """Handles beyond the pool size are closed least recently used first."""
+    monkeypatch.setattr(raster_pool, "RASTER_POOL_SIZE", 2)
+    raster_pool.close_datasets()
+    paths = [str(tmp_path / f"{i}.tif") for i in range(3)]
+    for p in paths:
+        _write(p, 1)
+    first = open_dataset(paths[0])
+    open_dataset(paths[1])
+    open_dataset(paths[0])  # refresh
+    open_dataset(paths[2])
+    assert not first.closed
+    assert len(raster_pool._handles()) == 2
+    assert all(k[0] != os.path.abspath(paths[1]) for k in raster_pool._handles())
+    print("  LRU close ✓")
+    return True
+
+
+def test_close_datasets_across_threads(tmp_path):
+    """Other threads' handles are marked stale; handles of exited threads are closed."""
+    import threading
+
+    job_dir = tmp_path / "job"
+    job_dir.mkdir()
+    path = str(job_dir / "a.tif")
+    other = str(tmp_path / "b.tif")
+    _write(path, 1)
+    _write(other, 1)
+
+    opened = {}
+    started, release = threading.Event(), threading.Event()
+
+    def live_worker():
+        opened["live"] = open_dataset(path)
+        started.set()
+        release.wait()
+        open_dataset(other)  # next use drops stale handles
+
+    def short_worker():
+        opened["dead"] = open_dataset(path)
+
+    short = threading.Thread(target=short_worker)
+    short.start()
+    short.join()
+    live = threading.Thread(target=live_worker)
+    live.start()
+    started.wait()
+
+    raster_pool.close_datasets(str(job_dir))
+    assert opened["dead"].closed
+    assert not opened["live"].closed
+
+    release.set()
+    live.join()
+    assert opened["live"].closed
+    print("  Cross-thread close ✓")
+    return True
+
+
+def test_cached_projection_helpers():
+    """Transformers and transformed bounds are cached."""
+    assert get_transformer("EPSG:4326", "EPSG:3857") is get_transformer("EPSG:4326", "EPSG:3857")
+    b1 = cached_transform_bounds("EPSG:3857", "EPSG:32649", 0.0, 0.0, 100.0, 100.0)
+    b2 = cached_transform_bounds("EPSG:3857", "EPSG:32649", 0.0, 0.0, 100.0, 100.0)
+    assert b1 == b2
+    assert cached_transform_bounds.cache_info().hits >= 1
+    return True
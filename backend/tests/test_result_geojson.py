@@ -0,0 +1,121 @@
+"""
+Result GeoJSON tests.
+"""
+
+import sys
+import os
+import json
+import gzip
+import numpy as np
+import rasterio
+from rasterio.features import shapes
+from rasterio.transform import from_origin
+from pyproj import Transformer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import result_geojson
+from services.result_geojson import polygon_features, dumps, VECTOR_LAYER_FILES
+
+
+def _reference_features(tif_path, layer_name):
+    """Previous per-vertex implementation."""
+    features = []
+    with rasterio.open(tif_path) as ds:
+        data = ds.read(1)
+        mask = (data != ds.nodata) & (data != 0)
+        for geom, value in shapes(data.astype(np.int32), mask=mask, transform=ds.transform):
+            tfm = Transformer.from_crs(ds.crs, "EPSG:4326", always_xy=True)
+            geom["coordinates"] = [[list(tfm.transform(x, y)) for x, y in ring]
+                                   for ring in geom["coordinates"]]
+            properties = {"value": int(value), "layer": layer_name}
+            if "year" in layer_name:
+                properties["year"] = int(value)
+            features.append({"type": "Feature", "geometry": geom, "properties": properties})
+    return features
+
+
+def _make_year_raster(path):
+    data = np.zeros((120, 120), dtype=np.float64)
+    data[10:40, 10:40] = 2001
+    data[20:25, 20:25] = 0
+    data[60:62, 90:119] = 2015
+    data[100:, :3] = -9999
+    with rasterio.open(path, "w", driver="GTiff", width=120, height=120, count=1, dtype="float64",
+                       crs="EPSG:32649", transform=from_origin(500000, 4000000, 30, 30),
+                       nodata=-9999) as dst:
+        dst.write(data, 1)
+    return path
+
+
+def test_polygon_features_match_reference(tmp_path):
+    """Vectorised transform gives exactly the per-vertex coordinates."""
+    path = _make_year_raster(str(tmp_path / "year.tif"))
+
+    features = polygon_features(path, "disturbance_year")
+    expected = _reference_features(path, "disturbance_year")
+    assert len(features) == 2
+    assert json.loads(dumps(features)) == expected
+    print("  Vectorised GeoJSON ✓")
+    return True
+
+
+def test_dumps_without_orjson(monkeypatch):
+    """Standard-library fallback produces the same document."""
+    obj = {"type": "FeatureCollection", "features": [{"properties": {"layer": "矿区", "value": 1}}]}
+    fast = dumps(obj)
+    monkeypatch.setattr(result_geojson, "HAS_ORJSON", False)
+    assert json.loads(dumps(obj)) == json.loads(fast)
+    print("  JSON fallback ✓")
+    return True
+
+
+def test_geojson_artifacts(tmp_path, monkeypatch):
+    """NDJSON, streamed collection and precompressed copies hold the same features."""
+    monkeypatch.setattr(result_geojson, "JOB_DIR", str(tmp_path))
+    os.makedirs(tmp_path / "job1")
+    tif = _make_year_raster(str(tmp_path / "job1" / VECTOR_LAYER_FILES["disturbance_year"]))
+    expected = polygon_features(tif, "disturbance_year")
+
+    paths = result_geojson.get_geojson_artifacts("job1", "disturbance_year")
+    with open(paths["ndjson"], "rb") as f:
+        assert [json.loads(line) for line in f] == json.loads(dumps(expected))
+
+    streamed = b"".join(result_geojson.iter_feature_collection(paths["ndjson"], chunk_bytes=64))
+    collection = json.loads(streamed)
+    assert collection["type"] == "FeatureCollection"
+    assert collection["features"] == json.loads(dumps(expected))
+    with open(paths["gzip"], "rb") as f:
+        assert gzip.decompress(f.read()) == streamed
+
+    # Rewritten raster: artifacts are rebuilt on the next request
+    mtime = os.stat(paths["ndjson"]).st_mtime_ns
+    os.utime(tif, ns=(mtime + 10**9, mtime + 10**9))
+    result_geojson.get_geojson_artifacts("job1", "disturbance_year")
+    assert os.stat(paths["ndjson"]).st_mtime_ns > mtime
+    print("  GeoJSON artifacts ✓")
+    return True
+
+
+def test_feature_index(tmp_path, monkeypatch):
+    """bbox queries and point identification agree with the full feature list."""
+    monkeypatch.setattr(result_geojson, "JOB_DIR", str(tmp_path))
+    os.makedirs(tmp_path / "job1")
+    tif = _make_year_raster(str(tmp_path / "job1" / VECTOR_LAYER_FILES["disturbance_year"]))
+    features = json.loads(dumps(polygon_features(tif, "disturbance_year")))
+    index = result_geojson.get_feature_index("job1", "disturbance_year")
+    assert len(index) == len(features)
+
+    everything = index.query(-180, -90, 180, 90)
+    assert [json.loads(line) for line in index.read_lines(everything)] == features
+
+    # Centre of the hole in the large patch, then a point inside the patch itself
+    hole = features[0]["geometry"]["coordinates"][1]
+    hx, hy = np.mean([p[0] for p in hole[:-1]]), np.mean([p[1] for p in hole[:-1]])
+    assert index.features_at(hx, hy) == []
+    outer = features[0]["geometry"]["coordinates"][0]
+    x0, y0 = outer[0]
+    assert index.features_at(x0 + (hx - x0) * 0.1, y0 + (hy - y0) * 0.1) == [features[0]]
+    assert index.features_at(0.0, 0.0) == []
+    print("  Feature index ✓")
+    return True
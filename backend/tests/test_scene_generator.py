@@ -0,0 +1,100 @@
+"""
+Synthetic scene generator tests.
+
+Generates small scenes and checks georeferencing, label proportions,
+NaN gaps and that the NDVI stack classifies back to its ground truth.
+"""
+
+import sys
+import os
+import tempfile
+import numpy as np
+import rasterio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runners.algorithm.scene_generator import generate_scene, parse_proportions
+from runners.algorithm.sample_generator import creat_sample
+from runners.algorithm.knn_dtw import knn_classify
+
+
+def test_parse_proportions():
+    """Proportion specs support single labels, ranges and defaults."""
+    uniform = parse_proportions(None)
+    assert uniform.shape == (49,)
+    assert np.allclose(uniform, 1 / 49)
+
+    probs = parse_proportions("37:0.5,38-40:0.3,41-49:0.2")
+    assert np.isclose(probs.sum(), 1.0)
+    assert np.isclose(probs[36], 0.5)
+    assert np.isclose(probs[37:40].sum(), 0.3)
+    assert probs[0] == 0
+
+    try:
+        parse_proportions("50:1")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("label 50 should be rejected")
+    return True
+
+
+def test_generate_scene_layout():
+    """Outputs are georeferenced, sized and consistent with ground truth."""
+    with tempfile.TemporaryDirectory() as tmp:
+        result = generate_scene(
+            tmp, width=80, height=48, n_bands=12, n_polygons=3,
+            mining_radius=10, nan_fraction=0.1, empty_fraction=0.05,
+            block_size=32, seed=7,
+        )
+
+        with rasterio.open(result["ndvi"]) as ds:
+            assert (ds.width, ds.height, ds.count) == (80, 48, 12)
+            assert ds.crs.to_epsg() == 32649
+            ndvi = ds.read()
+        with rasterio.open(result["labels"]) as ds:
+            labels = ds.read(1)
+        with rasterio.open(result["coal"]) as ds:
+            assert ds.count == 12
+
+        empty = labels == 0
+        assert np.all(np.isnan(ndvi[:, empty]))
+        valid = ndvi[:, ~empty]
+        nan_rate = np.isnan(valid).mean()
+        print(f"  NaN gap rate: {nan_rate:.3f}")
+        assert 0.05 < nan_rate < 0.15
+        assert np.nanmin(valid) > 0 and np.nanmax(valid) < 1
+        assert result["label_counts"].sum() == 80 * 48
+
+        # Same seed -> identical scene
+        with tempfile.TemporaryDirectory() as tmp2:
+            again = generate_scene(
+                tmp2, width=80, height=48, n_bands=12, n_polygons=3,
+                mining_radius=10, nan_fraction=0.1, empty_fraction=0.05,
+                block_size=32, seed=7,
+            )
+            with rasterio.open(again["labels"]) as ds:
+                assert np.array_equal(ds.read(1), labels)
+    return True
+
+
+def test_generated_pixels_classify_to_truth():
+    """Noise-free stable pixels are recovered by the KNN-DTW classifier."""
+    with tempfile.TemporaryDirectory() as tmp:
+        result = generate_scene(
+            tmp, width=16, height=16, n_bands=15, proportions="37:0.5,38:0.5",
+            n_polygons=0, noise=0.0, nan_fraction=0.0, empty_fraction=0.0,
+            block_size=16, seed=3,
+        )
+        with rasterio.open(result["ndvi"]) as ds:
+            ndvi = ds.read().reshape(15, -1).T
+        with rasterio.open(result["labels"]) as ds:
+            truth = ds.read(1).ravel()
+
+    samples = creat_sample([0.15, 0.75], 15, 0.8, 0.6)
+    pick = np.arange(0, truth.size, 17)
+    c, _, _ = knn_classify(samples[:, :-1], samples[:, -1], ndvi[pick], n_jobs=1)
+    agreement = np.mean(c == truth[pick])
+    print(f"  Label agreement: {agreement:.2f}")
+    assert agreement == 1.0
+    return True
@@ -0,0 +1,63 @@
+"""
+Cost-balanced chunk scheduling tests.
+"""
+
+import sys
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runners.algorithm.scheduler import (
+    estimate_pixel_costs, balanced_chunk_ranges, fixed_chunk_ranges,
+    run_work_queue, summarize_timeline,
+)
+
+
+def test_pixel_costs_follow_valid_samples():
+    """Empty pixels are cheapest, full series most expensive."""
+    data = np.full((3, 20), 0.5)
+    data[0] = np.nan
+    data[1, :15] = np.nan
+    costs = estimate_pixel_costs(data)
+    assert costs[0] < costs[1] < costs[2]
+    return True
+
+
+def test_balanced_ranges_cover_and_shrink():
+    """Chunks cover every pixel once, balance cost and shrink towards the tail."""
+    rng = np.random.default_rng(0)
+    costs = np.where(rng.random(10000) < 0.5, 1e-6, 1e-4)
+    costs[:3000] = 1e-6  # a cheap run at the start
+    ranges = balanced_chunk_ranges(costs, n_workers=4)
+
+    covered = np.concatenate([np.arange(s, e) for s, e in ranges])
+    assert np.array_equal(covered, np.arange(10000))
+
+    chunk_costs = np.array([costs[s:e].sum() for s, e in ranges])
+    print(f"  {len(ranges)} chunks, first cost {chunk_costs[0]:.4f}, last {chunk_costs[-1]:.5f}")
+    assert chunk_costs[0] > chunk_costs[-1] * 5
+    # Largest chunk is at most ~1/(2 * workers) of the total
+    assert chunk_costs.max() <= costs.sum() / 8 + costs.max()
+
+    capped = balanced_chunk_ranges(costs, n_workers=4, max_chunk_size=500)
+    assert max(e - s for s, e in capped) <= 500
+
+    assert fixed_chunk_ranges(10, 4) == [(0, 4), (4, 8), (8, 10)]
+    assert balanced_chunk_ranges(np.zeros(0), 4) == []
+    return True
+
+
+def test_work_queue_preserves_order():
+    """Results come back in task order with per-chunk timings."""
+    tasks = [(i,) for i in range(50)]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = run_work_queue(executor, lambda i: i * i, tasks, 3)
+    assert results == [i * i for i in range(50)]
+
+    summary = summarize_timeline([(0.0, 1.0, "a"), (0.0, 2.0, "b"), (1.0, 1.5, "a")])
+    assert summary["makespan_s"] == 2.0
+    assert summary["tail_s"] == 0.5
+    assert summary["n_workers_used"] == 2
+    return True
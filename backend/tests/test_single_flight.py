@@ -0,0 +1,132 @@
+"""
+Tile render coalescing tests.
+"""
+
+import sys
+import os
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import tile_service
+from services.single_flight import SingleFlight
+from services.tile_cache import TileCache
+
+
+def test_concurrent_calls_share_one_execution():
+    """Concurrent calls for one key run the function once; errors reach everyone."""
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return b"tile"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow, timeout=5)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [b"tile"] * 8 and len(calls) == 1
+    assert flight.in_flight() == 0
+
+    def boom():
+        time.sleep(0.1)
+        raise ValueError("bad")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("e", boom, timeout=5)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(errors) == 4
+
+    # Followers give up after the timeout
+    leader = threading.Thread(target=lambda: flight.do("t", lambda: time.sleep(0.5)))
+    leader.start()
+    time.sleep(0.05)
+    try:
+        flight.do("t", lambda: None, timeout=0.05)
+        assert False, "expected TimeoutError"
+    except TimeoutError:
+        pass
+    leader.join()
+    print("  Single flight ✓")
+    return True
+
+
+def test_render_concurrency_is_bounded(monkeypatch, tmp_path):
+    """At most TILE_RENDER_CONCURRENCY renders run at once; results are cached."""
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def fake_render(tif_path, layer_name, z, x, y, n, fmt="png"):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.pop()
+        return {(x, y): b"tile-%d" % x}
+
+    monkeypatch.setattr(tile_service, "render_metatile", fake_render)
+    monkeypatch.setattr(tile_service, "TILE_METATILE_SIZE", 1)
+    monkeypatch.setattr(tile_service, "_render_slots", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(tile_service, "tile_cache", TileCache(1 << 20))
+
+    results = {}
+    threads = [
+        threading.Thread(target=lambda x=x: results.__setitem__(x, tile_service.render_tile_coalesced(
+            "job", "disturbance_mask", 1, "unused.tif", "disturbance_mask", 10, x, 0)))
+        for x in range(6)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) <= 2 and len(peak) == 6
+    assert results[3] == b"tile-3"
+    assert tile_service.get_cached_tile("job", "disturbance_mask", 1, 10, 3, 0) == b"tile-3"
+    print("  Render slots ✓")
+    return True
+
+
+def test_followers_get_whole_metatile_from_cache(monkeypatch):
+    """A leader that finds its tile cached still hands followers the whole metatile."""
+    renders = []
+
+    def fake_render(tif_path, layer_name, z, x0, y0, n, fmt="png"):
+        renders.append((x0, y0))
+        return {(x0 + i, y0 + j): b"tile-%d-%d" % (x0 + i, y0 + j) for j in range(n) for i in range(n)}
+
+    monkeypatch.setattr(tile_service, "render_metatile", fake_render)
+    monkeypatch.setattr(tile_service, "TILE_METATILE_SIZE", 2)
+    monkeypatch.setattr(tile_service, "tile_cache", TileCache(1 << 20))
+
+    # Whole metatile already cached: served from the cache, nothing rendered
+    tile_service.tile_cache.put_many("job", "disturbance_mask", 1, 10, fake_render(None, None, 10, 0, 0, 2))
+    renders.clear()
+    assert tile_service.render_tile_coalesced(
+        "job", "disturbance_mask", 1, "unused.tif", "disturbance_mask", 10, 1, 1) == b"tile-1-1"
+
+    # Only some tiles cached: the whole metatile is rendered once
+    tile_service.tile_cache.memory.clear()
+    tile_service.tile_cache.put("job", "disturbance_mask", 1, 10, 0, 0, b"tile-0-0")
+    assert tile_service.render_tile_coalesced(
+        "job", "disturbance_mask", 1, "unused.tif", "disturbance_mask", 10, 1, 0) == b"tile-1-0"
+    assert renders == [(0, 0)]
+    print("  Metatile followers ✓")
+    return True
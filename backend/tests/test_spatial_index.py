@@ -0,0 +1,43 @@
+"""
+STR R-tree tests.
+"""
+
+import sys
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.spatial_index import STRTree
+
+
+def _random_boxes(rng, n):
+    lo = rng.uniform(0, 1000, size=(n, 2))
+    return np.column_stack([lo, lo + rng.exponential(5, size=(n, 2))])
+
+
+def test_query_matches_brute_force():
+    """Every query returns exactly the intersecting boxes, for any tree size."""
+    rng = np.random.default_rng(0)
+    for n in (0, 1, 15, 16, 17, 257, 5000):
+        boxes = _random_boxes(rng, n)
+        tree = STRTree(boxes)
+        for _ in range(50):
+            minx, miny = rng.uniform(-50, 1000, size=2)
+            maxx, maxy = minx + rng.exponential(40), miny + rng.exponential(40)
+            expected = np.flatnonzero((boxes[:, 0] <= maxx) & (boxes[:, 2] >= minx)
+                                      & (boxes[:, 1] <= maxy) & (boxes[:, 3] >= miny)) if n else []
+            assert tree.query(minx, miny, maxx, maxy).tolist() == list(expected)
+    print("  STR tree query ✓")
+    return True
+
+
+def test_point_query():
+    """Degenerate (point) query boxes hit boxes containing the point."""
+    boxes = np.array([[0, 0, 10, 10], [5, 5, 15, 15], [20, 20, 30, 30]], dtype=float)
+    tree = STRTree(boxes, capacity=2)
+    assert tree.query(7, 7, 7, 7).tolist() == [0, 1]
+    assert tree.query(10, 10, 10, 10).tolist() == [0, 1]
+    assert tree.query(17, 17, 17, 17).tolist() == []
+    print("  STR tree point query ✓")
+    return True
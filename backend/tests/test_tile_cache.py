@@ -0,0 +1,96 @@
+"""
+Tile cache tests.
+
+Covers the byte-bounded LRU memory tier, the shared SQLite disk tier and
+per-job invalidation.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.tile_cache import LRUTileCache, TileCache
+
+
+def test_lru_byte_budget_and_order():
+    """Least recently used tiles are evicted first, within the byte budget."""
+    cache = LRUTileCache(max_bytes=30)
+    cache.put(("j", "a", 1, 0, 0, 0), b"x" * 10)
+    cache.put(("j", "a", 1, 0, 0, 1), b"x" * 10)
+    cache.put(("j", "a", 1, 0, 0, 2), b"x" * 10)
+    assert cache.get(("j", "a", 1, 0, 0, 0)) is not None  # refresh oldest
+    cache.put(("j", "a", 1, 0, 0, 3), b"x" * 10)
+
+    assert cache.get(("j", "a", 1, 0, 0, 1)) is None
+    assert cache.get(("j", "a", 1, 0, 0, 0)) is not None
+    stats = cache.stats()
+    assert stats["bytes"] <= 30 and stats["evictions"] == 1
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    print("  LRU eviction ✓")
+    return True
+
+
+def test_disk_tier_shared_and_invalidated(tmp_path):
+    """A second cache instance (another process) reads tiles from disk."""
+    job_dir = tmp_path / "jobs"
+    (job_dir / "job1").mkdir(parents=True)
+
+    writer = TileCache(1024, str(job_dir))
+    writer.put("job1", "disturbance_mask", 7, 3, 1, 2, b"png-bytes")
+
+    reader = TileCache(1024, str(job_dir))
+    assert reader.get("job1", "disturbance_mask", 7, 3, 1, 2) == b"png-bytes"
+    assert reader.get("job1", "disturbance_mask", 8, 3, 1, 2) is None  # new version
+    assert reader.stats()["disk"]["hits"] == 1
+
+    writer.invalidate_job("job1")
+    reader.memory.clear()
+    assert reader.get("job1", "disturbance_mask", 7, 3, 1, 2) is None
+    assert not (job_dir / "job1" / "tile_cache.sqlite").exists()
+
+    # Jobs without an output directory are never created by the cache
+    writer.put("missing", "disturbance_mask", 1, 0, 0, 0, b"x")
+    assert not (job_dir / "missing").exists()
+    print("  Disk tier ✓")
+    return True
+
+
+def test_invalidate_closes_other_threads_connections(tmp_path, monkeypatch):
+    """Connections opened by worker threads are closed; removal failures empty the table."""
+    import sqlite3
+    import threading
+
+    job_dir = tmp_path / "jobs"
+    (job_dir / "job1").mkdir(parents=True)
+    cache = TileCache(1024, str(job_dir))
+
+    def worker():
+        cache.disk.put("job1", "disturbance_mask", 1, 0, 0, 0, b"tile")
+
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join()
+    opened = [entry.conn for entry in cache.disk._conns.values()]
+    assert len(opened) == 1
+
+    cache.invalidate_job("job1")
+    assert not cache.disk._conns
+    try:
+        opened[0].execute("SELECT 1")
+        raise AssertionError("connection left open")
+    except sqlite3.ProgrammingError:
+        pass
+    assert not (job_dir / "job1" / "tile_cache.sqlite").exists()
+
+    # A file that cannot be removed (e.g. open elsewhere on Windows) is emptied instead
+    cache.disk.put("job1", "disturbance_mask", 1, 0, 0, 0, b"tile")
+
+    def refuse(path):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(os, "remove", refuse)
+    cache.invalidate_job("job1")
+    assert cache.disk.get("job1", "disturbance_mask", 1, 0, 0, 0) is None
+    print("  Cross-thread invalidation ✓")
+    return True
@@ -0,0 +1,98 @@
+"""
+Tile coverage index tests.
+"""
+
+import sys
+import os
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import tile_coverage
+from services.mercator_raster import plan_grid
+from services.raster_pool import open_dataset
+from services.tile_pyramid import tile_range, raster_bounds_3857
+from services.tile_service import render_tile_index, tile_version, LAYER_FILES
+
+
+def _make_job(job_dir):
+    """Sparse disturbance patches in a mostly empty scene."""
+    data = np.zeros((600, 600), dtype=np.float64)
+    data[40:60, 500:530] = 2001
+    data[300:310, 100:104] = 1995
+    data[590:, :5] = 2010
+    data[200:220, 200:220] = -9999
+    path = os.path.join(job_dir, LAYER_FILES["disturbance_year"])
+    with rasterio.open(path, "w", driver="GTiff", width=600, height=600, count=1, dtype="float64",
+                       crs="EPSG:32649", transform=from_origin(500000, 4000000, 30, 30),
+                       nodata=-9999) as dst:
+        dst.write(data, 1)
+    return path
+
+
+def test_empty_tiles_never_have_data(tmp_path, monkeypatch):
+    """Tiles reported empty render nothing; most tiles over the job are empty."""
+    monkeypatch.setattr(tile_coverage, "JOB_DIR", str(tmp_path))
+    os.makedirs(tmp_path / "job1")
+    tif = _make_job(str(tmp_path / "job1"))
+    assert tile_coverage.build_tile_coverage("job1")
+
+    index = tile_coverage.TileCoverageIndex()
+    version = tile_version(tif)
+    native = plan_grid(open_dataset(tif))["native_zoom"]
+    bounds = raster_bounds_3857(tif)
+    n_empty = n_total = 0
+    for z in range(native - 4, native + 2):
+        x0, y0, x1, y1 = tile_range(bounds, z)
+        for x in range(x0 - 1, x1 + 2):
+            for y in range(y0 - 1, y1 + 2):
+                n_total += 1
+                if index.is_empty("job1", "disturbance_year", version, z, x, y):
+                    n_empty += 1
+                    data = render_tile_index(tif, "disturbance_year", z, x, y)
+                    assert data is None or not data.any()
+    assert n_empty > n_total // 2
+
+    # Stale version or unknown layer: never claimed empty
+    assert not index.is_empty("job1", "disturbance_year", version + 1, native, 0, 0)
+    assert not index.is_empty("job1", "recovery_year", version, native, 0, 0)
+    assert not index.is_empty("missing", "disturbance_year", version, native, 0, 0)
+    print("  Coverage index ✓")
+    return True
+
+
+def test_rotated_grid_never_misses_data(tmp_path, monkeypatch):
+    """Blocks rotated against the Mercator grid (polar stereographic) mark every touched tile."""
+    monkeypatch.setattr(tile_coverage, "JOB_DIR", str(tmp_path))
+    os.makedirs(tmp_path / "job1")
+    # One pixel in every other 64-px block: isolated blocks, no neighbouring corners
+    rng = np.random.default_rng(4)
+    data = np.full((512, 512), -9999, dtype=np.float64)
+    for bi in range(0, 8, 2):
+        for bj in range(0, 8, 2):
+            r, c = rng.integers(0, 64, 2)
+            data[bi * 64 + r, bj * 64 + c] = 2005
+    tif = os.path.join(tmp_path / "job1", LAYER_FILES["disturbance_year"])
+    # ~70°N, 45° off the projection's central meridian: pixel grid rotated ~45°
+    with rasterio.open(tif, "w", driver="GTiff", width=512, height=512, count=1, dtype="float64",
+                       crs="EPSG:3413", transform=from_origin(1500000, -1500000, 30, 30),
+                       nodata=-9999) as dst:
+        dst.write(data, 1)
+    assert tile_coverage.build_tile_coverage("job1")
+
+    index = tile_coverage.TileCoverageIndex()
+    version = tile_version(tif)
+    native = plan_grid(open_dataset(tif))["native_zoom"]
+    x0, y0, x1, y1 = tile_range(raster_bounds_3857(tif), native)
+    n_data = 0
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            rendered = render_tile_index(tif, "disturbance_year", native, x, y)
+            if rendered is not None and rendered.any():
+                n_data += 1
+                assert not index.is_empty("job1", "disturbance_year", version, native, x, y), (x, y)
+    assert n_data > 0
+    print("  Rotated grid coverage ✓")
+    return True
@@ -0,0 +1,61 @@
+"""
+Tile encoder tests.
+"""
+
+import io
+import sys
+import os
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import tile_encoder
+from services.tile_service import colormap_lut
+from services.tile_encoder import (
+    PNG, WEBP, WEBP_AVAILABLE, EMPTY_TILE_PNG,
+    encode_png_palette, encode_png_rgba, encode_tile, negotiate_format,
+)
+
+
+def _decode(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGBA"))
+
+
+def test_palette_png_is_lossless():
+    """Palette PNG (with tRNS) decodes to exactly the LUT colours."""
+    rng = np.random.default_rng(0)
+    lut, _ = colormap_lut("disturbance_year")
+    index = rng.integers(1975, 2030, size=(256, 256)).astype(np.uint16)
+    index[:64] = 0
+
+    data = encode_png_palette(index, lut)
+    assert Image.open(io.BytesIO(data)).mode == "P"
+    assert np.array_equal(_decode(data), lut[index])
+    assert len(data) < len(encode_png_rgba(lut[index]))
+    if WEBP_AVAILABLE:
+        assert np.array_equal(_decode(encode_tile(index, lut, WEBP)), lut[index])
+    print("  Palette PNG ✓")
+    return True
+
+
+def test_many_colours_fall_back_to_rgba(monkeypatch):
+    """Tiles with more than 256 colours are encoded as RGBA PNG."""
+    lut = np.zeros((65536, 4), dtype=np.uint8)
+    lut[:, 0] = np.arange(65536) % 256
+    lut[:, 1] = np.arange(65536) // 256
+    lut[:, 3] = 255
+    index = np.arange(65536, dtype=np.uint16).reshape(256, 256)
+
+    assert encode_png_palette(index, lut) is None
+    data = encode_tile(index, lut, PNG)
+    assert Image.open(io.BytesIO(data)).mode == "RGBA"
+    assert np.array_equal(_decode(data), lut[index])
+
+    assert not _decode(EMPTY_TILE_PNG).any()
+    assert negotiate_format("image/png,*/*") == PNG
+    assert negotiate_format("image/webp,*/*") == PNG  # WebP is opt-in
+    monkeypatch.setattr(tile_encoder, "TILE_WEBP_ENABLED", True)
+    assert negotiate_format("image/webp,*/*") == (WEBP if WEBP_AVAILABLE else PNG)
+    print("  RGBA fallback ✓")
+    return True
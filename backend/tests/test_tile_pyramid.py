@@ -0,0 +1,112 @@
+"""
+Pre-rendered tile pyramid tests.
+"""
+
+import sys
+import os
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import tile_pyramid
+from services.tile_service import render_tile, tile_version, LAYER_FILES
+
+
+def _make_job(job_dir):
+    rng = np.random.default_rng(0)
+    mask = (rng.random((200, 200)) < 0.3).astype(np.uint8)
+    path = os.path.join(job_dir, LAYER_FILES["disturbance_mask"])
+    with rasterio.open(path, "w", driver="GTiff", width=200, height=200, count=1, dtype="uint8",
+                       crs="EPSG:32649", transform=from_origin(500000, 4000000, 30, 30),
+                       nodata=0) as dst:
+        dst.write(mask, 1)
+    return path
+
+
+def test_pyramid_matches_dynamic_render(tmp_path, monkeypatch):
+    """Archived tiles equal render_tile output; deeper zooms are not covered."""
+    monkeypatch.setattr(tile_pyramid, "JOB_DIR", str(tmp_path))
+    os.makedirs(tmp_path / "job1")
+    tif = _make_job(str(tmp_path / "job1"))
+
+    assert tile_pyramid.build_tile_pyramid("job1", max_zoom=12, n_workers=0)
+    reader = tile_pyramid.TilePyramidReader()
+    version = tile_version(tif)
+
+    bounds = tile_pyramid.raster_bounds_3857(tif)
+    x0, y0, x1, y1 = tile_pyramid.tile_range(bounds, 12)
+    n_data = 0
+    for x in range(x0 - 1, x1 + 2):
+        for y in range(y0 - 1, y1 + 2):
+            covered, png = reader.get("job1", "disturbance_mask", version, 12, x, y)
+            assert covered
+            if png is not None:
+                assert png == render_tile(tif, "disturbance_mask", 12, x, y)
+                n_data += 1
+    assert n_data > 0
+
+    assert reader.get("job1", "disturbance_mask", version, 13, x0, y0) == (False, None)
+    assert reader.get("job1", "disturbance_mask", version + 1, 12, x0, y0) == (False, None)
+    assert reader.get("job1", "disturbance_year", version, 12, x0, y0) == (False, None)
+    print("  Pyramid ✓")
+    return True
+
+
+def test_pooled_render_bounds_in_flight_batches(monkeypatch):
+    """Batches are submitted lazily; at most n_workers * IN_FLIGHT_PER_WORKER are outstanding."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr(tile_pyramid, "_render_batch", lambda tif, layer, batch: batch)
+    submitted = []
+
+    def batches():
+        for i in range(50):
+            submitted.append(i)
+            yield [(0, i, 0)]
+
+    consumed = 0
+    max_outstanding = 0
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for rendered in tile_pyramid._render_pooled(executor, 2, "a.tif", "disturbance_mask", batches()):
+            consumed += len(rendered)
+            max_outstanding = max(max_outstanding, len(submitted) - consumed)
+    assert consumed == 50
+    assert max_outstanding <= 2 * tile_pyramid.IN_FLIGHT_PER_WORKER
+    print("  Bounded in-flight batches ✓")
+    return True
+
+
+def test_reader_connections_released_across_threads(tmp_path, monkeypatch):
+    """close_job closes every thread's connection; each thread keeps a bounded LRU."""
+    import sqlite3
+    import threading
+
+    monkeypatch.setattr(tile_pyramid, "JOB_DIR", str(tmp_path))
+    monkeypatch.setattr(tile_pyramid, "MAX_OPEN_PER_THREAD", 2)
+    for job in ("job1", "job2", "job3"):
+        os.makedirs(tmp_path / job)
+        _make_job(str(tmp_path / job))
+        assert tile_pyramid.build_tile_pyramid(job, max_zoom=8, n_workers=0)
+    reader = tile_pyramid.TilePyramidReader()
+
+    worker = threading.Thread(target=lambda: reader.covers("job1", "disturbance_mask", 0, 0))
+    worker.start()
+    worker.join()
+    opened = [entry.conn for entry, _ in reader._conns.values()]
+    assert len(opened) == 1
+
+    reader.close_job("job1")
+    assert not reader._conns
+    try:
+        opened[0].execute("SELECT 1")
+        raise AssertionError("connection left open")
+    except sqlite3.ProgrammingError:
+        pass
+
+    for job in ("job1", "job2", "job3"):
+        reader.covers(job, "disturbance_mask", 0, 0)
+    assert [k[1] for k in reader._conns] == ["job2", "job3"]
+    print("  Reader connection registry ✓")
+    return True
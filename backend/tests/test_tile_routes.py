@@ -0,0 +1,104 @@
+"""
+Raster tile route tests.
+
+Covers format negotiation against the pre-rendered pyramid and HTTP cache
+headers for versioned and unversioned URLs.
+"""
+
+import sys
+import os
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes import tile_routes
+from services import tile_pyramid, tile_coverage, tile_encoder
+from services.tile_service import tile_version, LAYER_FILES
+
+BROWSER_ACCEPT = "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8"
+
+
+def _make_job(job_dir):
+    rng = np.random.default_rng(0)
+    mask = (rng.random((200, 200)) < 0.3).astype(np.uint8)
+    path = os.path.join(job_dir, LAYER_FILES["disturbance_mask"])
+    with rasterio.open(path, "w", driver="GTiff", width=200, height=200, count=1, dtype="uint8",
+                       crs="EPSG:32649", transform=from_origin(500000, 4000000, 30, 30),
+                       nodata=0) as dst:
+        dst.write(mask, 1)
+    return path
+
+
+def _client(tmp_path, monkeypatch):
+    for module in (tile_routes, tile_pyramid, tile_coverage):
+        monkeypatch.setattr(module, "JOB_DIR", str(tmp_path))
+    app = Flask(__name__)
+    app.register_blueprint(tile_routes.tile_bp)
+    return app.test_client()
+
+
+def test_browser_accept_served_from_pyramid(tmp_path, monkeypatch):
+    """A browser Accept header (with image/webp) still hits the PNG pyramid."""
+    job_dir = tmp_path / "job1"
+    job_dir.mkdir()
+    tif = _make_job(str(job_dir))
+    client = _client(tmp_path, monkeypatch)
+    assert tile_pyramid.build_tile_pyramid("job1", max_zoom=12, n_workers=0)
+    monkeypatch.setattr(tile_encoder, "TILE_WEBP_ENABLED", True)
+
+    reads = []
+    real_get = tile_pyramid.pyramid_reader.get
+    monkeypatch.setattr(tile_pyramid.pyramid_reader, "get",
+                        lambda *args: reads.append(args) or real_get(*args))
+
+    version = tile_version(tif)
+    x0, y0, x1, y1 = tile_pyramid.tile_range(tile_pyramid.raster_bounds_3857(tif), 12)
+    x, y = next((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)
+                if real_get("job1", "disturbance_mask", version, 12, x, y)[1])
+
+    response = client.get(f"/api/tiles/job1/disturbance_mask/12/{x}/{y}.png",
+                          headers={"Accept": BROWSER_ACCEPT})
+    assert response.status_code == 200
+    assert response.mimetype == "image/png"
+    assert response.data == real_get("job1", "disturbance_mask", version, 12, x, y)[1]
+    assert response.headers["Vary"] == "Accept"
+    assert len(reads) == 1
+
+    revalidated = client.get(f"/api/tiles/job1/disturbance_mask/12/{x}/{y}.png",
+                             headers={"Accept": BROWSER_ACCEPT, "If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["Vary"] == "Accept"
+
+    # Levels beyond the pyramid are rendered dynamically and negotiated
+    if tile_encoder.WEBP_AVAILABLE:
+        deeper = client.get(f"/api/tiles/job1/disturbance_mask/13/{2 * x}/{2 * y}.png",
+                            headers={"Accept": BROWSER_ACCEPT})
+        assert deeper.mimetype in ("image/webp", "image/png")
+        assert deeper.headers["Vary"] == "Accept"
+    print("  Pyramid hit with browser Accept ✓")
+    return True
+
+
+def test_only_versioned_urls_are_immutable(tmp_path, monkeypatch):
+    """Unversioned URLs revalidate; ?v=<current version> is cached long term."""
+    job_dir = tmp_path / "job1"
+    job_dir.mkdir()
+    tif = _make_job(str(job_dir))
+    client = _client(tmp_path, monkeypatch)
+    version = tile_version(tif)
+    url = "/api/tiles/job1/disturbance_mask/0/0/0.png"
+
+    plain = client.get(url)
+    assert plain.headers["Cache-Control"] == "no-cache" and plain.headers["ETag"]
+    assert "immutable" in client.get(f"{url}?v={version}").headers["Cache-Control"]
+    assert client.get(f"{url}?v={version - 1}").headers["Cache-Control"] == "no-cache"
+
+    # A re-run rewrites the file: same unversioned URL, new ETag
+    os.utime(tif, ns=(version + 10**9, version + 10**9))
+    rerun = client.get(url, headers={"If-None-Match": plain.headers["ETag"]})
+    assert rerun.status_code == 200 and rerun.headers["ETag"] != plain.headers["ETag"]
+    print("  Versioned cache control ✓")
+    return True
@@ -0,0 +1,84 @@
+"""
+Pixel-major time-series store tests.
+"""
+
+import sys
+import os
+import glob
+import time
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.timeseries_store import build_timeseries_store, get_timeseries_store
+from services.geo_service import sample_points
+
+
+def _write(path, data):
+    with rasterio.open(path, "w", driver="GTiff", width=data.shape[2], height=data.shape[1],
+                       count=data.shape[0], dtype=data.dtype, crs="EPSG:4326",
+                       transform=from_origin(110, 40, 0.001, 0.001), nodata=-9999) as dst:
+        dst.write(data)
+    return path
+
+
+def test_store_matches_source(tmp_path):
+    """Pixel, batch, window and block reads all reproduce the band-interleaved source."""
+    rng = np.random.default_rng(0)
+    stack = rng.uniform(-0.2, 0.9, (7, 83, 101)).astype(np.float32)
+    path = _write(str(tmp_path / "ndvi.tif"), stack)
+    assert get_timeseries_store(path) is None
+
+    store = build_timeseries_store(path, block=16)
+    assert get_timeseries_store(path) is store
+    series = stack.transpose(1, 2, 0)
+    assert np.array_equal(store.pixel(82, 100), series[82, 100])
+    rows, cols = rng.integers(0, 83, 300), rng.integers(0, 101, 300)
+    assert np.array_equal(store.pixels(rows, cols), series[rows, cols])
+    assert np.array_equal(store.read_window(5, 30, 70, 71), series[5:75, 30:101])
+
+    rebuilt = np.zeros_like(series)
+    for row_off, col_off, values in store.iter_blocks():
+        rebuilt[row_off:row_off + values.shape[0], col_off:col_off + values.shape[1]] = values
+    assert np.array_equal(rebuilt, series)
+
+    # Batch sampling gives the same answer through the store
+    lons, lats = 110 + 0.001 * (cols + 0.5), 40 - 0.001 * (rows + 0.5)
+    values, inside = sample_points(path, lons, lats, indexes=[2, 5])
+    assert inside.all() and np.array_equal(values, series[rows, cols][:, [1, 4]])
+
+    # A rebuild writes a new array and swaps the reference; the mapped one stays readable
+    mapped = store.array
+    rebuilt_store = build_timeseries_store(path, block=16)
+    assert get_timeseries_store(path) is rebuilt_store
+    assert np.array_equal(mapped[0, 0], rebuilt_store.array[0, 0])
+    assert len(glob.glob(str(tmp_path / "ndvi.pixels.*.npy"))) == 1
+
+    # Rewriting the source invalidates the store
+    time.sleep(0.01)
+    _write(path, stack + 1)
+    assert get_timeseries_store(path) is None
+    print("  Time-series store ✓")
+    return True
+
+
+def test_upload_postprocess_not_queued_behind_jobs(monkeypatch):
+    """Upload post-processing runs on its own thread, not behind job post-processing."""
+    import threading
+    from services import job_postprocess
+
+    release = threading.Event()
+    monkeypatch.setattr(job_postprocess, "_steps", lambda: [("slow", lambda job_id: release.wait(5))])
+    monkeypatch.setattr(job_postprocess, "_upload_steps", lambda: [("store", lambda job_id: None)])
+
+    busy = job_postprocess.schedule_job_postprocess("job1")
+    try:
+        job_postprocess.schedule_upload_postprocess("job2").result(timeout=2)
+        assert not busy.done()
+    finally:
+        release.set()
+    busy.result(timeout=5)
+    print("  Upload executor ✓")
+    return True
@@ -0,0 +1,200 @@
+"""
+Vector tile (MVT) tests.
+"""
+
+import sys
+import os
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import vector_tiles
+from services.vector_tiles import VECTOR_LAYER_FILES, EXTENT, BUFFER
+from services.tile_pyramid import tile_range, raster_bounds_3857
+
+
+def _varint(buf, i):
+    value = shift = 0
+    while True:
+        b = buf[i]
+        i += 1
+        value |= (b & 0x7F) << shift
+        shift += 7
+        if b < 0x80:
+            return value, i
+
+
+def _fields(buf):
+    """Minimal protobuf reader: [(field, wire_type, value)]."""
+    out, i = [], 0
+    while i < len(buf):
+        key, i = _varint(buf, i)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            value, i = _varint(buf, i)
+        elif wire == 2:
+            n, i = _varint(buf, i)
+            value, i = buf[i:i + n], i + n
+        elif wire == 1:
+            value, i = buf[i:i + 8], i + 8
+        else:
+            raise ValueError(wire)
+        out.append((field, wire, value))
+    return out
+
+
+def _packed(buf):
+    values, i = [], 0
+    while i < len(buf):
+        v, i = _varint(buf, i)
+        values.append(v)
+    return values
+
+
+def _decode_rings(geometry):
+    rings, ring, x, y, i = [], [], 0, 0, 0
+    while i < len(geometry):
+        cmd, count = geometry[i] & 7, geometry[i] >> 3
+        i += 1
+        if cmd == 7:
+            rings.append(ring)
+            ring = []
+            continue
+        for _ in range(count):
+            dx, dy = geometry[i], geometry[i + 1]
+            x += (dx >> 1) ^ -(dx & 1)
+            y += (dy >> 1) ^ -(dy & 1)
+            ring.append((x, y))
+            i += 2
+    return rings
+
+
+def _decode_tile(data):
+    """MVT bytes -> {layer_name: [(id, rings)]}"""
+    layers = {}
+    for field, _, layer in _fields(data):
+        assert field == 3
+        parts = _fields(layer)
+        name = next(v for f, _, v in parts if f == 1).decode()
+        features = []
+        for f, _, feature in parts:
+            if f != 2:
+                continue
+            props = {ff: v for ff, _, v in _fields(feature)}
+            assert props[3] == 3  # POLYGON
+            features.append((props[1], _decode_rings(_packed(props[4]))))
+        layers[name] = features
+    return layers
+
+
+def _area(ring):
+    x = np.array([p[0] for p in ring], dtype=np.float64)
+    y = np.array([p[1] for p in ring], dtype=np.float64)
+    return (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2
+
+
+def _make_job(job_dir):
+    data = np.zeros((400, 400), dtype=np.float64)
+    data[40:60, 300:330] = 2001
+    data[100:180, 100:180] = 1995
+    data[130:150, 130:150] = 0  # hole
+    data[250:252, 20:22] = 2010
+    path = os.path.join(job_dir, VECTOR_LAYER_FILES["disturbance_year"])
+    with rasterio.open(path, "w", driver="GTiff", width=400, height=400, count=1, dtype="float64",
+                       crs="EPSG:32649", transform=from_origin(500000, 4000000, 30, 30),
+                       nodata=-9999) as dst:
+        dst.write(data, 1)
+    return path
+
+
+def test_vector_tiles(tmp_path, monkeypatch):
+    """Features stay within tile + buffer, exterior rings are positive, query matches brute force."""
+    monkeypatch.setattr(vector_tiles, "JOB_DIR", str(tmp_path))
+    os.makedirs(tmp_path / "job1")
+    tif = _make_job(str(tmp_path / "job1"))
+
+    index = vector_tiles.get_vector_index("job1", "disturbance_year")
+    assert len(index.values) == 3
+    bounds = raster_bounds_3857(tif)
+
+    n_features = 0
+    for z in range(index.index_zoom - 2, index.index_zoom + 5):
+        x0, y0, x1, y1 = tile_range(bounds, z)
+        for x in range(x0 - 1, x1 + 2):
+            for y in range(y0 - 1, y1 + 2):
+                minx, miny, maxx, maxy = vector_tiles.tile_bounds_3857(z, x, y)
+                m = BUFFER / EXTENT * (maxx - minx)
+                b = index.bboxes
+                brute = np.flatnonzero((b[:, 0] <= maxx + m) & (b[:, 2] >= minx - m)
+                                       & (b[:, 1] <= maxy + m) & (b[:, 3] >= miny - m))
+                assert sorted(index.query(z, x, y, m).tolist()) == brute.tolist()
+
+                data = vector_tiles.vector_tile("job1", "disturbance_year", z, x, y)
+                if not len(brute):
+                    assert data == b""
+                    continue
+                for _, rings in _decode_tile(data).get("disturbance_year", []):
+                    n_features += 1
+                    assert _area(rings[0]) > 0
+                    assert all(_area(r) < 0 for r in rings[1:])
+                    for ring in rings:
+                        for px, py in ring:
+                            assert -BUFFER <= px <= EXTENT + BUFFER
+                            assert -BUFFER <= py <= EXTENT + BUFFER
+    assert n_features > 0
+
+    # The large patch keeps its hole once zoomed in far enough
+    z = index.index_zoom + 4
+    big = np.argmax(index.bboxes[:, 2] - index.bboxes[:, 0])
+    cx = (index.bboxes[big, 0] + index.bboxes[big, 2]) / 2
+    cy = (index.bboxes[big, 1] + index.bboxes[big, 3]) / 2
+    x, y = vector_tiles._tile_index(np.array([cx]), z, "x")[0], vector_tiles._tile_index(np.array([cy]), z, "y")[0]
+    layers = _decode_tile(vector_tiles.vector_tile("job1", "disturbance_year", z, int(x), int(y)))
+    assert any(len(rings) == 2 for _, rings in layers["disturbance_year"])
+    print("  Vector tiles ✓")
+    return True
+
+
+def test_low_zoom_query_reads_covered_cells():
+    """Below index_zoom the query slices the covered rows of the grid, matching brute force."""
+    from services.tile_pyramid import ORIGIN_SHIFT
+
+    rng = np.random.default_rng(1)
+    lo = rng.uniform(-ORIGIN_SHIFT, ORIGIN_SHIFT * 0.9, size=(2000, 2))
+    size = rng.uniform(1e3, 2e6, size=(2000, 2))
+    bboxes = np.hstack([lo, np.minimum(lo + size, ORIGIN_SHIFT)])
+    iz = 6
+    keys, offsets, items = vector_tiles.build_grid(bboxes, iz)
+    index = vector_tiles.VectorIndex({
+        "values": np.zeros(len(bboxes)), "bboxes": bboxes, "cell_keys": keys,
+        "cell_offsets": offsets, "cell_items": items, "index_zoom": iz, "native_zoom": iz + 3,
+        "n_levels": 0,
+    })
+
+    # Only the cells under the queried tile may be sliced out of cell_items
+    sliced = []
+    real_items = index.cell_items
+
+    class Spy(np.ndarray):
+        def __getitem__(self, key):
+            if isinstance(key, slice):
+                sliced.append(key.stop - key.start)
+            return np.ndarray.__getitem__(self, key)
+
+    index.cell_items = real_items.view(Spy)
+    for z in range(0, iz + 2):
+        for x in range(2 ** z):
+            for y in range(2 ** z):
+                minx, miny, maxx, maxy = vector_tiles.tile_bounds_3857(z, x, y)
+                b = bboxes
+                brute = np.flatnonzero((b[:, 0] <= maxx) & (b[:, 2] >= minx)
+                                       & (b[:, 1] <= maxy) & (b[:, 3] >= miny))
+                sliced.clear()
+                assert sorted(index.query(z, x, y).tolist()) == brute.tolist()
+                assert sliced or not len(brute)
+                if z >= 2:
+                    assert sum(sliced) < len(real_items) / 2
+    print("  Low zoom query ✓")
+    return True
@@ -0,0 +1,137 @@
+"""
+Persistent worker pool and AOT kernel tests.
+
+Verifies that classification through the shared, pre-warmed pool matches
+the sequential path, and that ahead-of-time compiled kernels (when built)
+agree with the JIT versions.
+"""
+
+import sys
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runners.algorithm.dtw import _dtw_distance_only, _dtw_distance_matrix, _backtrack_path
+from runners.algorithm.bwlvbo import _spike_removal_numba
+from runners.algorithm.sample_generator import creat_sample
+from runners.algorithm.knn_dtw import knn_classify
+from runners.algorithm.aot import load_aot_kernels
+from runners.algorithm import placement
+from runners.algorithm.placement import parse_cpulist, plan_placement, available_cpus
+from runners.algorithm import worker_pool
+from runners.algorithm.worker_pool import (
+    start_worker_pool, get_worker_pool, get_worker_pools, shutdown_worker_pool,
+    configure_worker_pool,
+)
+
+
+def test_pool_matches_sequential():
+    """Shared pool results are identical to sequential classification."""
+    samples = creat_sample([0.15, 0.75], 12, 0.8, 0.6)
+    rng = np.random.default_rng(5)
+    test_data = rng.uniform(0.1, 0.8, size=(300, 12))
+    test_data[rng.random(test_data.shape) < 0.05] = np.nan
+
+    seq = knn_classify(samples[:, :-1], samples[:, -1], test_data, n_jobs=1)
+
+    pool = start_worker_pool(2)
+    try:
+        assert get_worker_pool() is pool
+        assert start_worker_pool(2) is pool  # idempotent
+        for _ in range(2):  # reused across jobs
+            par = knn_classify(samples[:, :-1], samples[:, -1], test_data,
+                               backend="processes", chunk_size=64)
+            for a, b in zip(seq, par):
+                assert np.array_equal(a, b)
+    finally:
+        shutdown_worker_pool()
+    assert get_worker_pool() is None
+    print("  Pool results match sequential ✓")
+    return True
+
+
+def test_pool_starts_on_first_job(monkeypatch):
+    """A configured pool is not started until a job uses the process backend."""
+    monkeypatch.setattr(worker_pool, "_pool_config", None)
+    samples = creat_sample([0.15, 0.75], 12, 0.8, 0.6)
+    test_data = np.random.default_rng(6).uniform(0.1, 0.8, size=(100, 12))
+
+    configure_worker_pool(2)
+    try:
+        assert get_worker_pool() is None
+        knn_classify(samples[:, :-1], samples[:, -1], test_data, n_jobs=1)
+        assert get_worker_pool() is None  # sequential jobs do not need it
+        knn_classify(samples[:, :-1], samples[:, -1], test_data,
+                     backend="processes", chunk_size=32)
+        assert get_worker_pool() is not None and len(get_worker_pools()) == 1
+    finally:
+        shutdown_worker_pool()
+    print("  Lazy pool start ✓")
+    return True
+
+
+def test_aot_kernels_match_jit():
+    """AOT kernels (if built) give the same results as the JIT kernels."""
+    aot = load_aot_kernels()
+    if aot is None:
+        print("  AOT kernels not built, skipping comparison")
+        return True
+
+    rng = np.random.default_rng(1)
+    for _ in range(10):
+        r = rng.random(rng.integers(3, 20))
+        t = rng.random(rng.integers(3, 20))
+        assert aot.dtw_distance_only(r, t) == _dtw_distance_only(r, t)
+        d1, D1 = aot.dtw_distance_matrix(r, t)
+        d2, D2 = _dtw_distance_matrix(r, t)
+        assert d1 == d2 and np.array_equal(D1, D2)
+        assert np.array_equal(aot.backtrack_path(D1), _backtrack_path(D2))
+        assert np.array_equal(aot.spike_removal(t), _spike_removal_numba(t))
+    print("  AOT kernels match JIT ✓")
+    return True
+
+
+def test_placement_plans():
+    """Placement plans cover every worker and respect the mode."""
+    assert parse_cpulist("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+
+    none = plan_placement(3, "none")
+    assert none == [(None, 3, [None, None, None])]
+
+    allowed = set(available_cpus())
+    (node, count, cpusets), = plan_placement(5, "cores")
+    assert count == 5 and all(len(c) == 1 and c <= allowed for c in cpusets)
+
+    numa = plan_placement(5, "numa")
+    assert sum(count for _, count, _ in numa) == 5
+    assert all(len(cpusets) == count for _, count, cpusets in numa)
+    print("  Placement plans ✓")
+    return True
+
+
+def test_numa_pools_match_sequential(monkeypatch):
+    """Per-node pools (two pseudo-nodes) keep pixel order and results."""
+    cpu = available_cpus()[0]
+    monkeypatch.setattr(placement, "numa_topology", lambda: [(0, [cpu]), (1, [cpu])])
+
+    samples = creat_sample([0.15, 0.75], 12, 0.8, 0.6)
+    rng = np.random.default_rng(6)
+    test_data = rng.uniform(0.1, 0.8, size=(200, 12))
+    test_data[rng.random(test_data.shape) < 0.05] = np.nan
+
+    seq = knn_classify(samples[:, :-1], samples[:, -1], test_data, n_jobs=1)
+
+    start_worker_pool(2, placement="numa")
+    try:
+        assert len(get_worker_pools()) == 2
+        stats = {}
+        par = knn_classify(samples[:, :-1], samples[:, -1], test_data,
+                           backend="processes", chunk_size=32, stats=stats)
+        for a, b in zip(seq, par):
+            assert np.array_equal(a, b)
+        assert stats["placement"]["mode"] == "numa"
+    finally:
+        shutdown_worker_pool()
+    print("  NUMA pools match sequential ✓")
+    return True
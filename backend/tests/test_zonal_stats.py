@@ -0,0 +1,142 @@
+"""
+Polygon and zonal statistics tests.
+"""
+
+import sys
+import os
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import zonal_stats
+from services.zonal_stats import polygon_timeseries
+from services.timeseries_store import build_timeseries_store
+
+
+def _write(path, data):
+    with rasterio.open(path, "w", driver="GTiff", width=data.shape[2], height=data.shape[1],
+                       count=data.shape[0], dtype=data.dtype, crs="EPSG:4326",
+                       transform=from_origin(110, 40, 0.001, 0.001), nodata=-9999) as dst:
+        dst.write(data)
+    return path
+
+
+def _ndvi(tmp_path):
+    rng = np.random.default_rng(0)
+    stack = rng.uniform(-0.2, 0.9, (6, 700, 900)).astype(np.float32)
+    stack[3, 100:200, 100:200] = -9999
+    return stack, _write(str(tmp_path / "ndvi.tif"), stack)
+
+
+def _ring(col0, row0, col1, row1):
+    """Pixel-edge rectangle as a closed lon/lat ring."""
+    x0, x1 = 110 + 0.001 * col0, 110 + 0.001 * col1
+    y0, y1 = 40 - 0.001 * row0, 40 - 0.001 * row1
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+
+def _expected(stack, mask, qs):
+    values = stack[:, mask].T.astype(np.float64)
+    values[values == -9999] = np.nan
+    return values, np.nanpercentile(values, qs, axis=0)
+
+
+def test_polygon_statistics(tmp_path, monkeypatch):
+    """Exact statistics match a full-array reference; holes and nodata are excluded."""
+    stack, path = _ndvi(tmp_path)
+    # Spans several 512-px chunks, with a hole
+    geometry = {"type": "Polygon", "coordinates": [_ring(50, 40, 650, 620), _ring(300, 300, 400, 350)]}
+    mask = np.zeros(stack.shape[1:], dtype=bool)
+    mask[40:620, 50:650] = True
+    mask[300:350, 300:400] = False
+    values, pct = _expected(stack, mask, [50, 10, 90])
+
+    for build_store in (False, True):
+        if build_store:
+            build_timeseries_store(path, block=64)
+        stats = polygon_timeseries(path, {"type": "Feature", "geometry": geometry}, [10, 90])
+        assert stats["pixel_count"] == mask.sum() and not stats["approximate"]
+        assert stats["count"].tolist() == (~np.isnan(values)).sum(axis=0).tolist()
+        assert np.allclose(stats["mean"], np.nanmean(values, axis=0))
+        assert np.allclose(stats["median"], pct[0])
+        assert np.allclose(stats["percentiles"][10.0], pct[1])
+        assert np.allclose(stats["percentiles"][90.0], pct[2])
+
+    # Over the memory budget: histogram percentiles within one bin width
+    monkeypatch.setattr(zonal_stats, "POLYGON_STATS_MAX_BYTES", 1024)
+    approx = polygon_timeseries(path, geometry, [10, 90])
+    assert approx["approximate"] and np.allclose(approx["mean"], np.nanmean(values, axis=0))
+    bin_width = (np.nanmax(values, axis=0) - np.nanmin(values, axis=0)) / zonal_stats.HIST_BINS
+    assert np.all(np.abs(approx["median"] - pct[0]) <= 2 * bin_width)
+    assert np.all(np.abs(approx["percentiles"][90.0] - pct[2]) <= 2 * bin_width)
+
+    # Outside the raster
+    outside = polygon_timeseries(path, {"type": "Polygon", "coordinates": [_ring(-50, -50, -10, -10)]})
+    assert outside["pixel_count"] == 0 and np.isnan(outside["mean"]).all()
+    print("  Polygon statistics ✓")
+    return True
+
+
+def _write_band(path, data, nodata=-9999):
+    with rasterio.open(path, "w", driver="GTiff", width=data.shape[1], height=data.shape[0], count=1,
+                       dtype=data.dtype, crs="EPSG:32649", transform=from_origin(500000, 4000000, 30, 30),
+                       nodata=nodata) as dst:
+        dst.write(data, 1)
+    return path
+
+
+def test_zonal_disturbance(tmp_path, monkeypatch):
+    """Per-zone yearly areas match a whole-array reference; GeoJSON and raster zones agree; cached."""
+    monkeypatch.setattr(zonal_stats, "JOB_DIR", str(tmp_path))
+    job_dir = tmp_path / "job1"
+    os.makedirs(job_dir)
+    rng = np.random.default_rng(3)
+    shape = (700, 600)
+    dist = np.where(rng.random(shape) < 0.3, rng.integers(2001, 2011, shape), 0).astype(np.int16)
+    recv = np.where((dist > 0) & (rng.random(shape) < 0.5), dist + 3, 0).astype(np.int16)
+    dist[0:5, :] = -9999
+    _write_band(str(job_dir / "mining_disturbance_year.tif"), dist)
+    _write_band(str(job_dir / "mining_recovery_year.tif"), recv)
+
+    from pyproj import Transformer
+    tfm = Transformer.from_crs("EPSG:32649", "EPSG:4326", always_xy=True)
+
+    def ring(col0, row0, col1, row1):
+        xs = [500000 + 30 * c for c in (col0, col1, col1, col0, col0)]
+        ys = [4000000 - 30 * r for r in (row0, row0, row1, row1, row0)]
+        return [list(tfm.transform(x, y)) for x, y in zip(xs, ys)]
+
+    boxes = {"north": (0, 0, 600, 300), "south": (100, 300, 500, 690)}
+    zones = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"name": name},
+         "geometry": {"type": "Polygon", "coordinates": [ring(*box)]}} for name, box in boxes.items()]}
+    result = zonal_stats.zonal_disturbance("job1", zones=zones)
+
+    labels = np.zeros(shape, dtype=np.int16)
+    for i, (c0, r0, c1, r1) in enumerate(boxes.values()):
+        labels[r0:r1, c0:c1] = i + 1
+    for i, zone in enumerate(result["zones"]):
+        inside = labels == i + 1
+        assert zone["id"] == list(boxes)[i]
+        assert zone["pixel_count"] == inside.sum()
+        for key, years in (("disturbed", dist), ("recovered", recv)):
+            expected = [int(((years == y) & inside).sum()) for y in result["years"]]
+            assert zone[f"{key}_pixels"] == expected
+            assert np.allclose(zone[f"{key}_ha"], np.array(expected) * 0.09)
+    assert result["years"] == sorted(set(np.unique(dist[dist > 0])) | set(np.unique(recv[recv > 0])))
+
+    # The same zones as a label raster
+    zone_tif = _write_band(str(tmp_path / "zones.tif"), labels, nodata=0)
+    with open(zone_tif, "rb") as f:
+        by_raster = zonal_stats.zonal_disturbance("job1", zone_raster=f.read())
+    assert [z["id"] for z in by_raster["zones"]] == [1, 2]
+    for a, b in zip(result["zones"], by_raster["zones"]):
+        assert a["disturbed_pixels"] == b["disturbed_pixels"] and a["recovered_ha"] == b["recovered_ha"]
+
+    # Cached per zone set
+    monkeypatch.setattr(zonal_stats, "compute_zonal_disturbance", None)
+    assert zonal_stats.zonal_disturbance("job1", zones=zones) == result
+    print("  Zonal disturbance ✓")
+    return True
@@ -1,6 +1,6 @@
 import { useEffect, useRef, useCallback, useState } from 'react'
 
-export default function MapView({ bounds, jobId, onMapClick, onLayersLoaded }) {
+export default function MapView({ bounds, jobId, layerVersions, onMapClick, onLayersLoaded }) {
   const mapRef = useRef(null)
   const viewRef = useRef(null)
   const layersRef = useRef({ vector: [], raster: [] })
@@ -181,9 +181,9 @@ export default function MapView({ bounds, jobId, onMapClick, onLayersLoaded }) {
     }
   }, [bounds, viewReady])
 
-  // 当 jobId 变化时，加载结果图层
+  // 当 jobId 变化时，加载结果图层（等待图层版本，URL 带 ?v= 以便浏览器长期缓存）
   useEffect(() => {
-    if (!jobId || !viewRef.current || !viewReady) return
+    if (!jobId || !layerVersions || !viewRef.current || !viewReady) return
 
     const map = window.arcgisMap
     const view = viewRef.current
@@ -217,10 +217,11 @@ export default function MapView({ bounds, jobId, onMapClick, onLayersLoaded }) {
     }
 
     const baseUrl = window.location.origin
+    const versionQuery = (name) => layerVersions[name] ? `?v=${layerVersions[name]}` : ''
 
     // 矢量图层 - 扰动区域 (红色)
     const disturbanceMaskLayer = new GeoJSONLayer({
-      url: `${baseUrl}/api/result-geojson/${jobId}/disturbance_mask`,
+      url: `${baseUrl}/api/result-geojson/${jobId}/disturbance_mask${versionQuery('disturbance_mask')}`,
       title: "扰动区域 (矢量)",
       renderer: new SimpleRenderer({
         symbol: new SimpleFillSymbol({
@@ -236,7 +237,7 @@ export default function MapView({ bounds, jobId, onMapClick, onLayersLoaded }) {
 
     // 矢量图层 - 扰动年份 (按年份渐变)
     const disturbanceYearLayer = new GeoJSONLayer({
-      url: `${baseUrl}/api/result-geojson/${jobId}/disturbance_year`,
+      url: `${baseUrl}/api/result-geojson/${jobId}/disturbance_year${versionQuery('disturbance_year')}`,
       title: "扰动年份 (矢量)",
       visible: false,
       renderer: new UniqueValueRenderer({
@@ -255,7 +256,7 @@ export default function MapView({ bounds, jobId, onMapClick, onLayersLoaded }) {
 
     // 矢量图层 - 恢复年份 (绿色渐变)
     const recoveryYearLayer = new GeoJSONLayer({
-      url: `${baseUrl}/api/result-geojson/${jobId}/recovery_year`,
+      url: `${baseUrl}/api/result-geojson/${jobId}/recovery_year${versionQuery('recovery_year')}`,
       title: "恢复年份 (矢量)",
       visible: false,
       renderer: new UniqueValueRenderer({
@@ -284,7 +285,7 @@ export default function MapView({ bounds, jobId, onMapClick, onLayersLoaded }) {
 
     rasterConfigs.forEach(config => {
       const layer = new WebTileLayer({
-        urlTemplate: `${baseUrl}/api/tiles/${jobId}/${config.name}/{level}/{col}/{row}.png`,
+        urlTemplate: `${baseUrl}/api/tiles/${jobId}/${config.name}/{level}/{col}/{row}.png${versionQuery(config.name)}`,
         title: config.title,
         visible: false,
         copyright: "Mining Detection Platform"
@@ -329,7 +330,7 @@ export default function MapView({ bounds, jobId, onMapClick, onLayersLoaded }) {
       console.warn('部分图层加载失败:', err)
     })
 
-  }, [jobId, viewReady, onLayersLoaded])
+  }, [jobId, layerVersions, viewReady, onLayersLoaded])
 
   return (
     <div
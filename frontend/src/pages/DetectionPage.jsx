@@ -16,6 +16,7 @@ export default function DetectionPage() {
   const [status, setStatus] = useState({ text: '等待上传文件...', type: 'info' })
   const [processing, setProcessing] = useState(false)
   const [jobId, setJobId] = useState(existingJobId)
+  const [layerVersions, setLayerVersions] = useState(null)
   const [bounds, setBounds] = useState(null)
   const [crsInfo, setCrsInfo] = useState(null)
   const [ndviData, setNdviData] = useState(null)
@@ -37,8 +38,10 @@ export default function DetectionPage() {
       if (job.bounds) setBounds(job.bounds)
       if (job.crs_info) setCrsInfo(job.crs_info)
       if (job.startyear) setStartyear(job.startyear)
+      setLayerVersions(job.layer_versions || {})
       setStatus({ text: '历史任务加载完成，点击地图查看 NDVI 曲线', type: 'success' })
     } catch (err) {
+      setLayerVersions({})
       setStatus({ text: `加载失败: ${err.response?.data?.error || err.message}`, type: 'error' })
     }
   }
@@ -105,6 +108,7 @@ export default function DetectionPage() {
       setStatus({ text: '加载结果图层 (4/4)...', type: 'loading' })
 
       setJobId(newJobId)
+      setLayerVersions(runRes.data.layer_versions || {})
       setBounds(runRes.data.bounds)
       setCrsInfo(runRes.data.crs_info)
 
@@ -249,6 +253,7 @@ export default function DetectionPage() {
         <MapView
           bounds={bounds}
           jobId={jobId}
+          layerVersions={layerVersions}
           onMapClick={handleMapClick}
           onLayersLoaded={handleLayersLoaded}
         />